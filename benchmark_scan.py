@@ -0,0 +1,213 @@
+"""
+Benchmark do ciclo de scan (MonitorService + repositórios reais) contra a frota simulada.
+
+Reporta por tamanho de frota: tempo de ciclo (médio/p95/máx), CPU, memória e
+corretude das transições de estado. Ex:
+    python benchmark_scan.py --tamanhos 10,100,1000,5000 --ciclos 5 --concorrente
+    python benchmark_scan.py --modo opc --tamanhos 10,100
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+try :
+	import resource
+except ImportError :  # Windows
+	resource = None
+
+from src.application.services.monitor_service import MonitorService
+from src.domain.enums import CommunicationType, MachineStatus
+from src.infrastructure.database.connection import DatabaseConnection
+from src.infrastructure.database.repositories import MachineRepository, DowntimeRepository, EventRepository
+from src.infrastructure.database.write_behind import WriteBehindQueue
+
+import simulador_frota
+
+def memoria_mb() :
+	"""Memória residente atual (psutil) ou pico (resource); None se indisponível"""
+	try :
+		import psutil
+		return psutil.Process().memory_info().rss / 1024 / 1024
+	except ImportError :
+		pass
+	if resource is not None :
+		pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		return pico / 1024 if os.uname().sysname != "Darwin" else pico / 1024 / 1024
+	return None
+
+def percentil(valores, p) :
+	ordenados = sorted(valores)
+	return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def criar_protocolo(args, perfis, pasta) :
+	"""Monta o protocolo e o config.json da frota no modo escolhido"""
+	frota = None
+	if args.modo == "opc" :
+		from src.infrastructure.communication.opc_client import OPCUAClient
+
+		# Logs de sessão do client python-opcua a cada conexão
+		logging.getLogger("opcua").setLevel(logging.ERROR)
+
+		frota = simulador_frota.FrotaOPC(perfis, porta_inicial=args.porta_inicial, maquinas_por_servidor=args.maquinas_por_servidor)
+		portas = frota.iniciar()
+		config = simulador_frota.gerar_config(perfis, portas=portas, node_ids=frota.node_ids)
+		protocolo = OPCUAClient(timeout=args.timeout, porta_rede=None)
+	else :
+		config = simulador_frota.gerar_config(perfis)
+		protocolo = simulador_frota.ProtocoloSimulado(perfis, espera_morta=args.espera_morta)
+
+	with open(os.path.join(pasta, "config.json"), "w", encoding="utf-8") as f :
+		json.dump(config, f)
+	return protocolo, frota
+
+def verificar_transicoes(perfis, machine_repo, db, ciclos, limite_falhas) :
+	"""
+	Corretude:
+	- máquinas estáveis (sem falha transitória) terminam no status esperado
+	- máquinas mortas terminam SEM_REDE (após limite_falhas ciclos)
+	- a cadeia de eventos de cada máquina é consistente (anterior == novo do evento anterior)
+	- máquinas vivas não geram SEM_REDE por falha transitória isolada
+	"""
+	# Ordem de inserção (o timestamp dos eventos tem resolução de segundos)
+	eventos = db.fetch_all("SELECT maquina, status_anterior, status_novo FROM eventos ORDER BY id")
+	ultimo_por_maquina = { }
+	cadeia_quebrada = 0
+	quedas_falsas = 0
+	vivas = { p["nome"] for p in perfis if not p["morta"] }
+
+	for evento in eventos :
+		anterior = ultimo_por_maquina.get(evento["maquina"])
+		if anterior is not None and anterior != evento["status_anterior"] :
+			cadeia_quebrada += 1
+		ultimo_por_maquina[evento["maquina"]] = evento["status_novo"]
+		if evento["maquina"] in vivas and evento["status_novo"] == MachineStatus.SEM_REDE.value :
+			quedas_falsas += 1
+
+	verificadas = 0
+	corretas = 0
+	for perfil in perfis :
+		if perfil["morta"] :
+			if ciclos < limite_falhas :
+				continue
+			esperado = MachineStatus.SEM_REDE
+		elif perfil["padrao"] == "estavel" and not perfil["taxa_falha"] :
+			esperado = MachineStatus.PRODUZINDO if perfil["rodando"] else MachineStatus.PARADA
+		else :
+			continue
+
+		verificadas += 1
+		maquina = machine_repo.get_by_id(perfil["api_id"])
+		if maquina is not None and maquina.status == esperado :
+			corretas += 1
+
+	return {
+		"eventos" : len(eventos),
+		"verificadas" : verificadas,
+		"corretas" : corretas,
+		"cadeia_quebrada" : cadeia_quebrada,
+		"quedas_falsas" : quedas_falsas,
+	}
+
+def executar_tamanho(n, args) :
+	pasta = tempfile.mkdtemp(prefix=f"bench_{n}_")
+	perfis = simulador_frota.gerar_perfis(
+		n, latencia_ms=args.latencia_ms, taxa_falha=args.taxa_falha,
+		taxa_mortas=args.taxa_mortas, taxa_flapping=args.taxa_flapping
+	)
+	protocolo, frota = criar_protocolo(args, perfis, pasta)
+
+	try :
+		db = DatabaseConnection(os.path.join(pasta, "bench.db"))
+		db.init_schema()
+		fila = WriteBehindQueue(db, intervalo_flush=None) if args.write_behind else None
+		machine_repo = MachineRepository(
+			config_file=os.path.join(pasta, "config.json"),
+			state_file=os.path.join(pasta, "estado_atual.json")
+		)
+		monitor = MonitorService(
+			machine_repo, DowntimeRepository(db, write_behind=fila), EventRepository(db, write_behind=fila),
+			{ CommunicationType.OPC_UA.value : protocolo },
+			limite_falhas=args.limite_falhas,
+			tempo_estabilidade=0,
+			scan_concorrente=args.concorrente,
+			max_concorrencia=args.max_concorrencia,
+			timeout_maquina=args.timeout
+		)
+
+		duracoes = []
+		cpu_inicio = time.process_time()
+		parede_inicio = time.perf_counter()
+		for _ in range(args.ciclos) :
+			inicio = time.perf_counter()
+			monitor.scan_machines()
+			duracoes.append(time.perf_counter() - inicio)
+		cpu = time.process_time() - cpu_inicio
+		parede = time.perf_counter() - parede_inicio
+		memoria = memoria_mb()
+
+		resultado = {
+			"maquinas" : n,
+			"modo" : args.modo + ("/concorrente" if args.concorrente else "/sequencial") + ("/write-behind" if args.write_behind else ""),
+			"ciclo_medio_s" : round(statistics.mean(duracoes), 3),
+			"ciclo_p95_s" : round(percentil(duracoes, 95), 3),
+			"ciclo_max_s" : round(max(duracoes), 3),
+			"cpu_pct" : round(100 * cpu / parede, 1) if parede else 0.0,
+			"memoria_mb" : round(memoria, 1) if memoria is not None else None,
+		}
+		resultado.update(verificar_transicoes(perfis, machine_repo, db, args.ciclos, args.limite_falhas))
+
+		monitor.shutdown()
+		if fila is not None :
+			fila.close()
+		if hasattr(protocolo, "disconnect_all") :
+			protocolo.disconnect_all()
+		db.close()
+		return resultado
+	finally :
+		if frota is not None :
+			frota.parar()
+		shutil.rmtree(pasta, ignore_errors=True)
+
+def imprimir_tabela(resultados) :
+	colunas = ["maquinas", "modo", "ciclo_medio_s", "ciclo_p95_s", "ciclo_max_s", "cpu_pct", "memoria_mb", "corretas", "verificadas", "cadeia_quebrada", "quedas_falsas"]
+	larguras = [max(len(c), *(len(str(r[c])) for r in resultados)) for c in colunas]
+	print("  ".join(c.ljust(l) for c, l in zip(colunas, larguras)))
+	for r in resultados :
+		print("  ".join(str(r[c]).ljust(l) for c, l in zip(colunas, larguras)))
+
+if __name__ == "__main__" :
+	parser = argparse.ArgumentParser(description="Benchmark do ciclo de scan contra a frota simulada")
+	parser.add_argument("--tamanhos", default="10,100,1000,5000")
+	parser.add_argument("--modo", choices=["memoria", "opc"], default="memoria")
+	parser.add_argument("--ciclos", type=int, default=5)
+	parser.add_argument("--concorrente", action="store_true")
+	parser.add_argument("--write-behind", action="store_true", help="Eventos e paradas gravados em lote ao fim de cada ciclo")
+	parser.add_argument("--max-concorrencia", type=int, default=50)
+	parser.add_argument("--timeout", type=float, default=2.0)
+	parser.add_argument("--limite-falhas", type=int, default=3)
+	parser.add_argument("--latencia-ms", type=float, default=5.0)
+	parser.add_argument("--taxa-falha", type=float, default=0.0)
+	parser.add_argument("--taxa-mortas", type=float, default=0.05)
+	parser.add_argument("--taxa-flapping", type=float, default=0.05)
+	parser.add_argument("--espera-morta", type=float, default=0.0, help="Segundos que uma máquina morta leva para falhar (modo memória)")
+	parser.add_argument("--porta-inicial", type=int, default=48400)
+	parser.add_argument("--maquinas-por-servidor", type=int, default=50, help="Máquinas por servidor OPC UA simulado (modo opc)")
+	parser.add_argument("--json", help="Salva os resultados neste arquivo")
+	args = parser.parse_args()
+
+	resultados = []
+	for n in (int(t) for t in args.tamanhos.split(",")) :
+		print(f"⏱️ {n} máquinas ({args.modo})...")
+		resultados.append(executar_tamanho(n, args))
+
+	print()
+	imprimir_tabela(resultados)
+
+	if args.json :
+		with open(args.json, "w", encoding="utf-8") as f :
+			json.dump(resultados, f, indent=2)
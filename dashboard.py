@@ -1,6 +1,7 @@
 import streamlit as st
 import sys
 import os
+import tempfile
 from datetime import datetime, timedelta
 import pandas as pd
 
@@ -8,8 +9,13 @@ import pandas as pd
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Importações da nova arquitetura
+from src.domain.enums import Turno
+from src.domain.models import HistoryFilter
 from src.infrastructure.database.connection import DatabaseConnection
 from src.infrastructure.database.repositories import MachineRepository, DowntimeRepository, EventRepository
+from src.infrastructure.database.live_state_store import LiveStateStore
+from src.infrastructure.database.metrics_rollup import DailyMetricsRepository
+from src.infrastructure.database.duckdb_analytics import DuckDBAnalyticsEngine
 from src.application.services.analytics_service import AnalyticsService
 from src.presentation.components.metrics_card import render_kpi_row, render_status_badge, render_progress_bar
 from src.presentation.components.machine_card import render_machine_card
@@ -27,6 +33,12 @@ CACHE_TTL_HISTORY = 60  # TTL cache de histórico (segundos)
 INACTIVITY_THRESHOLD_MIN = 30  # Threshold de inatividade em minutos
 MAX_INACTIVE_DISPLAY = 5  # Máximo de máquinas inativas a exibir
 TOP_OFFENDERS_LIMIT = 10  # Limite de top offenders no Pareto
+LIVE_STATE_FILE = "estado_vivo.bin"  # Estado ao vivo publicado pelo serviço de monitoramento
+HISTORY_COLUMNS = ["equipamento", "data_inicial", "data_final", "minutos_parado", "tempo_formatado", "motivo", "turno", "setor"]  # Colunas da aba de histórico
+HISTORY_PAGE_SIZE = 100  # Paradas por página na aba de histórico
+HISTORY_EXPORT_BATCH = 5000  # Paradas por lote na exportação CSV
+HISTORY_EXPORT_MAX_ROWS = 200000  # Máximo de paradas por exportação CSV (o download é entregue de uma vez ao navegador)
+ANALYTICS_DUCKDB_FILE = None  # Espelho DuckDB para KPIs/Pareto/turnos (ex: "analytics.duckdb", requer duckdb); None = rollup diário
 
 st.set_page_config(
     page_title="Monitoramento Industrial 4.0",
@@ -97,16 +109,30 @@ css_rules = """
 st.markdown(f"<style>{css_rules}</style>", unsafe_allow_html=True)
 
 # ============== INICIALIZAÇÃO ==============
+def abrir_estado_vivo():
+    """Abre o estado ao vivo do serviço (None se o serviço ainda não o publicou)"""
+    try:
+        return LiveStateStore(LIVE_STATE_FILE)
+    except (OSError, ValueError):
+        return None
+
 @st.cache_resource
 def init_services():
     """Inicializa serviços (singleton)"""
     db = DatabaseConnection()
     db.init_schema()
 
-    machine_repo = MachineRepository()
+    machine_repo = MachineRepository(live_state=abrir_estado_vivo())
     downtime_repo = DowntimeRepository(db)
     event_repo = EventRepository(db)
-    analytics_service = AnalyticsService(downtime_repo)
+
+    motor_analitico = None
+    if ANALYTICS_DUCKDB_FILE:
+        try:
+            motor_analitico = DuckDBAnalyticsEngine(db, ANALYTICS_DUCKDB_FILE, intervalo_sync=CACHE_TTL_HISTORY)
+        except Exception as e:
+            print(f"⚠️ Motor analítico DuckDB indisponível, usando o rollup diário: {e}")
+    analytics_service = AnalyticsService(downtime_repo, DailyMetricsRepository(db), motor_analitico)
 
     return {
         'machine_repo': machine_repo,
@@ -134,7 +160,11 @@ if 'last_load_time' not in st.session_state:
 # ============== CARREGA DADOS (COM CACHE) ==============
 @st.cache_data(ttl=CACHE_TTL_MACHINES, show_spinner=False)
 def load_machines(_machine_repo):
-    """Carrega máquinas com cache"""
+    """Carrega máquinas com cache (estado ao vivo ou, sem ele, o último snapshot)"""
+    if _machine_repo.live_state is None:
+        _machine_repo.live_state = abrir_estado_vivo()
+    if _machine_repo.live_state is None:
+        _machine_repo.recarregar_estado()
     return _machine_repo.get_all()
 
 @st.cache_data(ttl=CACHE_TTL_ANALYTICS, show_spinner=False)
@@ -152,16 +182,38 @@ def get_downtime_by_turno(_analytics_service, data_inicio, data_fim):
     """Carrega distribuição por turno com cache"""
     return _analytics_service.get_downtime_by_turno(data_inicio, data_fim)
 
-@st.cache_data(ttl=CACHE_TTL_ANALYTICS, show_spinner=False)
-def get_historical_data(_downtime_repo, equipamento, data_inicio, data_fim, min_duracao=0):
-    """Carrega histórico com cache"""
-    if equipamento == "Todos":
-        historico = _downtime_repo.get_by_period(data_inicio, data_fim)
-    else:
-        historico = _downtime_repo.get_by_machine(equipamento, data_inicio, data_fim)
-
-    # Filtra por duração
-    return [h for h in historico if h.minutos_parado >= min_duracao and not h.is_ativo()]
+@st.cache_data(ttl=CACHE_TTL_HISTORY, show_spinner=False)
+def get_historical_count(_downtime_repo, _filtro, chave_filtro):
+    """Total do histórico com cache (recontado ao mudar os filtros ou após o TTL)"""
+    return _downtime_repo.count_history(_filtro)
+
+def formatar_historico(colunas):
+    """Colunas do repositório -> tabela exibida/exportada (datas tipadas, sem objetos por linha)"""
+    df = pd.DataFrame(colunas)
+    return pd.DataFrame({
+        'Equipamento': df['equipamento'],
+        'Data/Hora Inicial': df['data_inicial'],
+        'Data/Hora Final': df['data_final'],
+        'Duração (min)': df['minutos_parado'].fillna(0.0).round(2),
+        'Tempo Formatado': df['tempo_formatado'].fillna(''),
+        'Motivo': df['motivo'].fillna(''),
+        'Turno': df['turno'].fillna(''),
+        'Setor': df['setor'].fillna('Geral')
+    })
+
+def exportar_historico_csv(_downtime_repo, filtro, limite=HISTORY_EXPORT_MAX_ROWS):
+    """Grava o CSV do histórico filtrado em um arquivo temporário, lote a lote, até `limite` paradas; retorna o caminho"""
+    gravadas = 0
+    with tempfile.NamedTemporaryFile('wb', prefix='historico_paradas_', suffix='.csv', delete=False) as arquivo:
+        for pagina in _downtime_repo.iter_history(filtro, HISTORY_COLUMNS, HISTORY_EXPORT_BATCH):
+            df = formatar_historico(pagina).head(limite - gravadas)
+            arquivo.write(df.to_csv(
+                index=False, header=(gravadas == 0), date_format='%d/%m/%Y %H:%M'
+            ).encode('utf-8'))
+            gravadas += len(df)
+            if gravadas >= limite:
+                break
+    return arquivo.name
 
 maquinas = load_machines(machine_repo)
 
@@ -415,43 +467,79 @@ with tab4:
     with col_f2:
         min_duracao = st.number_input("Duração mínima (min):", min_value=0, value=0)
 
-    # Busca histórico (com cache)
-    historico_filtrado = get_historical_data(downtime_repo, equipamento_filter, data_inicio, data_fim, min_duracao)
-
-    st.metric("Total de Paradas no Período", len(historico_filtrado))
-
-    if historico_filtrado:
-        # Converte para DataFrame
-        df_hist = []
-        for h in historico_filtrado:
-            df_hist.append({
-                'Equipamento': h.equipamento,
-                'Data/Hora Inicial': h.data_inicial.strftime('%d/%m/%Y %H:%M'),
-                'Data/Hora Final': h.data_final.strftime('%d/%m/%Y %H:%M') if h.data_final else '-',
-                'Duração (min)': round(h.minutos_parado, 2),
-                'Tempo Formatado': h.tempo_formatado,
-                'Motivo': h.motivo,
-                'Turno': h.turno.value,
-                'Setor': h.hierarquia.setor
-            })
+    col_f3, col_f4 = st.columns(2)
+
+    with col_f3:
+        turno_filter = st.selectbox("Turno:", options=["Todos"] + [t.value for t in Turno])
 
-        df_historico = pd.DataFrame(df_hist)
+    with col_f4:
+        motivo_filter = st.text_input("Motivo contém:")
+
+    # Filtros aplicados na consulta; só uma página fica em memória
+    filtro_historico = HistoryFilter(
+        data_inicio=data_inicio,
+        data_fim=data_fim,
+        equipamentos=[] if equipamento_filter == "Todos" else [equipamento_filter],
+        turno=None if turno_filter == "Todos" else Turno(turno_filter),
+        motivo=motivo_filter.strip() or None,
+        min_minutos=min_duracao,
+        apenas_encerradas=True
+    )
+
+    # Filtros mudaram: volta para a primeira página
+    chave_filtro = (equipamento_filter, min_duracao, turno_filter, motivo_filter, periodo_dias)
+    if st.session_state.get('historico_filtro') != chave_filtro:
+        st.session_state.historico_filtro = chave_filtro
+        st.session_state.historico_cursores = [None]
+    cursores = st.session_state.historico_cursores
+
+    total_historico = get_historical_count(downtime_repo, filtro_historico, chave_filtro)
+    st.metric("Total de Paradas no Período", total_historico)
+
+    if total_historico:
+        pagina, proximo_cursor = downtime_repo.fetch_page(
+            filtro_historico, HISTORY_COLUMNS, HISTORY_PAGE_SIZE, cursores[-1]
+        )
 
         st.dataframe(
-            df_historico,
+            formatar_historico(pagina),
             use_container_width=True,
             height=500,
-            hide_index=True
+            hide_index=True,
+            column_config={
+                'Data/Hora Inicial': st.column_config.DatetimeColumn(format="DD/MM/YYYY HH:mm"),
+                'Data/Hora Final': st.column_config.DatetimeColumn(format="DD/MM/YYYY HH:mm")
+            }
         )
 
-        # Botão de export
-        csv = df_historico.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="📥 Download CSV",
-            data=csv,
-            file_name=f"historico_paradas_{datetime.now().strftime('%Y%m%d')}.csv",
-            mime='text/csv'
-        )
+        # Navegação: pilha de cursores (o topo é a página atual)
+        col_ant, col_pag, col_prox = st.columns([1, 2, 1])
+        with col_ant:
+            st.button("◀ Anterior", on_click=cursores.pop, disabled=len(cursores) == 1, use_container_width=True)
+        with col_pag:
+            st.caption(f"Página {len(cursores)} de {-(-total_historico // HISTORY_PAGE_SIZE)}")
+        with col_prox:
+            st.button("Próxima ▶", on_click=cursores.append, args=(proximo_cursor,),
+                      disabled=proximo_cursor is None, use_container_width=True)
+
+        # Export sob demanda, gravado lote a lote em arquivo temporário e limitado a HISTORY_EXPORT_MAX_ROWS
+        linhas_export = min(total_historico, HISTORY_EXPORT_MAX_ROWS)
+        st.caption(f"O CSV terá {linhas_export:,} paradas".replace(',', '.'))
+        if total_historico > HISTORY_EXPORT_MAX_ROWS:
+            st.warning(f"⚠️ Período com {total_historico:,} paradas: apenas as {HISTORY_EXPORT_MAX_ROWS:,} mais recentes "
+                       "serão exportadas. Reduza o período ou use filtros para exportar o restante.".replace(',', '.'))
+        if st.button("📄 Gerar CSV do período"):
+            caminho_csv = exportar_historico_csv(downtime_repo, filtro_historico)
+            try:
+                with open(caminho_csv, 'rb') as arquivo_csv:
+                    st.download_button(
+                        label="📥 Download CSV",
+                        data=arquivo_csv,
+                        file_name=f"historico_paradas_{datetime.now().strftime('%Y%m%d')}.csv",
+                        mime='text/csv'
+                    )
+            finally:
+                os.remove(caminho_csv)
     else:
         st.info("Nenhuma parada encontrada com os filtros selecionados")
 
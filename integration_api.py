@@ -1,36 +1,177 @@
-import requests
+import threading
+import time
+from src.infrastructure.communication.rest_client import ConditionalSession
 
 API_URL = "http://10.243.67.248:3000/proxy/integracao-metris/v1/classificacao-maquina?codigoRecurso=all&fake=false&estabelecimento=1&setor=tecelagem"
 
+# Conexão keep-alive reaproveitada entre ciclos + requisição condicional (ETag/If-Modified-Since)
+_sessao_metris = ConditionalSession(timeout=3)
+_ultimo_payload = None
+_ultimo_mapa = { }
+
+# Valores usados quando o campo nunca foi recebido da API
+_PADROES = { "descricao" : "AGUARDANDO CLASSIFICAÇÃO", "codigo" : 0, "status_bin" : 0, "cor" : "#808080" }
+
+def _converter_item(item) :
+	"""Extrai do item da API apenas os campos presentes (ausentes não sobrescrevem o último valor bom)"""
+	campos = { }
+	
+	# Tratamento de Cor (A API manda FF007B38, precisamos de #007B38)
+	cor_raw = item.get('corStatus')
+	if cor_raw :
+		campos["cor"] = f"#{cor_raw[2 :]}" if len(cor_raw) == 8 else "#808080"
+	
+	if item.get('aguardandoClassificacao') :
+		campos["descricao"] = "AGUARDANDO CLASSIFICAÇÃO"
+	elif item.get('descricao') is not None :
+		campos["descricao"] = item['descricao']
+	
+	if item.get('codigo') is not None :
+		campos["codigo"] = item['codigo']
+	if item.get('status') is not None :
+		campos["status_bin"] = item['status']  # 1=Rodando, 0=Parado
+	
+	return campos
+
+def _buscar_mapa_metris() :
+	"""
+	Busca o feed Metris e retorna {recurso: {campo: valor}} só com os campos recebidos.
+	Levanta exceção em caso de erro (timeout, HTTP, JSON inválido)
+	"""
+	global _ultimo_payload, _ultimo_mapa
+	
+	dados_raw = _sessao_metris.get_json(API_URL)
+	
+	# 304 Not Modified: mesmo payload, reaproveita o mapa já montado
+	if dados_raw is _ultimo_payload :
+		return _ultimo_mapa
+	
+	mapa_status = { }
+	for item in dados_raw :
+		recurso = item.get('recurso', '').upper()
+		mapa_status[recurso] = _converter_item(item)
+	
+	_ultimo_payload = dados_raw
+	_ultimo_mapa = mapa_status
+	return mapa_status
+
 def fetch_metris_status() :
 	"""
-	Busca o status de produção da API Metris.
+	Busca o status de produção da API Metris (chamada bloqueante).
 	Retorna um Dicionário indexado pelo nome do recurso para busca rápida.
 	Ex: {'LOOM01': {'descricao': 'MÁQUINA OPERANDO', 'cor': '#007B38'}}
 	"""
 	try :
-		response = requests.get(API_URL, timeout=3)
-		if response.status_code == 200 :
-			dados_raw = response.json()
-			mapa_status = { }
-			
-			for item in dados_raw :
-				recurso = item.get('recurso', '').upper()
-				
-				# Tratamento de Cor (A API manda FF007B38, precisamos de #007B38)
-				cor_raw = item.get('corStatus', 'FF808080')  # Cinza padrão se falhar
-				cor_hex = f"#{cor_raw[2 :]}" if len(cor_raw) == 8 else "#808080"
-				
-				descricao = item.get('descricao', 'AGUARDANDO CLASSIFICAÇÃO')
-				if item.get('aguardandoClassificacao') :
-					descricao = "AGUARDANDO CLASSIFICAÇÃO"
-				
-				mapa_status[recurso] = {
-					"descricao" : descricao, "codigo" : item.get('codigo', 0), "status_bin" : item.get('status', 0),  # 1=Rodando, 0=Parado
-					"cor" : cor_hex
-				}
-			return mapa_status
+		return { recurso : { **_PADROES, **campos } for recurso, campos in _buscar_mapa_metris().items() }
 	except Exception as e :
 		print(f"⚠️ Erro ao consultar API Metris: {e}")
 	
 	return { }  # Retorna vazio em caso de erro, para não quebrar o sistema
+
+class MetrisFeedCache :
+	"""
+	Cache em memória do feed Metris, atualizado por uma thread própria.
+	
+	- O loop de scan lê o cache (snapshot) sem nunca esperar a API
+	- Cada campo guarda o último valor bom e quando foi recebido: erro ou campo
+	  ausente na resposta não apaga o que já se sabia
+	- Stale-while-revalidate: dados mais velhos que o TTL continuam sendo
+	  servidos (marcados como expirados). Um feed (último sucesso) mais velho
+	  que o TTL dispara uma atualização imediata, no máximo uma por intervalo;
+	  recursos e campos que não vieram no último feed envelhecem sem disparar
+	"""
+	
+	def __init__(self, intervalo = 10, ttl = 60, buscar = None) :
+		self.intervalo = intervalo
+		self.ttl = ttl
+		self._buscar = buscar or _buscar_mapa_metris
+		
+		self._campos = { }  # recurso -> {campo: (valor, instante monotônico)}
+		self._lock = threading.Lock()
+		self._revalidar = threading.Event()
+		self._parar = threading.Event()
+		self._thread = None
+		
+		self.ultima_atualizacao = None  # instante monotônico do último sucesso
+		self.ultimo_erro = None
+		self.falhas_seguidas = 0
+	
+	def iniciar(self) :
+		"""Inicia a thread de atualização (idempotente)"""
+		if self._thread is not None and self._thread.is_alive() :
+			return
+		self._parar.clear()
+		self._thread = threading.Thread(target=self._loop, name="metris-feed", daemon=True)
+		self._thread.start()
+	
+	def parar(self) :
+		self._parar.set()
+		self._revalidar.set()
+		if self._thread is not None :
+			self._thread.join(timeout=5)
+	
+	def _loop(self) :
+		while not self._parar.is_set() :
+			self._revalidar.clear()
+			self.atualizar()
+			self._revalidar.wait(self.intervalo)
+	
+	def atualizar(self) :
+		"""Busca o feed e mescla no cache. Retorna True em caso de sucesso"""
+		try :
+			mapa = self._buscar()
+		except Exception as e :
+			self.falhas_seguidas += 1
+			self.ultimo_erro = str(e)
+			print(f"⚠️ Erro ao consultar API Metris (mantendo últimos valores): {e}")
+			return False
+		
+		agora = time.monotonic()
+		with self._lock :
+			for recurso, campos in mapa.items() :
+				campos_cache = self._campos.setdefault(recurso, { })
+				for campo, valor in campos.items() :
+					campos_cache[campo] = (valor, agora)
+		
+		self.ultima_atualizacao = agora
+		self.ultimo_erro = None
+		self.falhas_seguidas = 0
+		return True
+	
+	def idade(self) :
+		"""Segundos desde a última atualização bem-sucedida (None se nunca atualizou)"""
+		if self.ultima_atualizacao is None :
+			return None
+		return time.monotonic() - self.ultima_atualizacao
+	
+	def snapshot(self) :
+		"""
+		Retorna o mapa no formato de fetch_metris_status, sem bloquear, com a idade de cada campo:
+		{'LOOM01': {'descricao': ..., 'cor': ..., 'idades': {'descricao': 4.2, ...}, 'expirado': False}}
+		"""
+		agora = time.monotonic()
+		mapa = { }
+		
+		with self._lock :
+			for recurso, campos in self._campos.items() :
+				info = dict(_PADROES)
+				idades = { }
+				for campo, (valor, recebido_em) in campos.items() :
+					info[campo] = valor
+					idades[campo] = round(agora - recebido_em, 1)
+				info["idades"] = idades
+				info["expirado"] = any(idade > self.ttl for idade in idades.values())
+				mapa[recurso] = info
+		
+		# Stale-while-revalidate: serve o valor antigo e pede atualização já.
+		# Só a idade do feed conta (um recurso que saiu do feed ficaria expirado
+		# para sempre) e nunca antes de um intervalo desde o último sucesso; com
+		# a API falhando, as tentativas seguem no intervalo normal
+		idade_feed = self.idade()
+		if self.falhas_seguidas == 0 and idade_feed is not None and idade_feed > max(self.ttl, self.intervalo) :
+			self._revalidar.set()
+		
+		return mapa
+
+# Instância usada pelo serviço de monitoramento
+metris_cache = MetrisFeedCache()
@@ -1,5 +1,6 @@
 import time
 from datetime import datetime
+import concurrent.futures
 import json
 import os
 
@@ -9,6 +10,8 @@ import network_utils
 import notifications
 import integration_api
 import opc_utils
+from src.domain.enums import MachineStatus
+from src.infrastructure.database.live_state_store import LiveStateStore
 
 # REMOVIDO: import opc_config (Não usamos mais, dados vêm do config.json)
 
@@ -16,6 +19,14 @@ import opc_utils
 LIMITE_FALHAS = 3
 INTERVALO_SCAN = 5
 TEMPO_ESTABILIDADE = 60  # Para confirmar que VOLTOU a produzir
+ORCAMENTO_CICLO = 4.0  # Tempo máximo (s) aguardando as coletas em cada ciclo
+ARQUIVO_ESTADO_VIVO = "estado_vivo.bin"  # Estado ao vivo (memória compartilhada) lido pelo dashboard
+
+# Coletas rodam em paralelo; a que estourar o orçamento continua rodando e
+# seu resultado é aproveitado no ciclo seguinte (não é disparada de novo)
+_executor_coletas = concurrent.futures.ThreadPoolExecutor(max_workers=3, thread_name_prefix="coleta")
+_coletas_em_andamento = { }
+_ultimos_resultados = { "rede" : [], "opc" : { } }
 
 def carregar_maquinas() :
 	try :
@@ -32,9 +43,85 @@ def salvar_dados_completos(estado_maquinas) :
 	}
 	database.salvar_estado_persistente(dados)
 
+def abrir_estado_vivo() :
+	"""Abre o estado ao vivo como escritor (None se não for possível: o dashboard usa o JSON)"""
+	try :
+		return LiveStateStore(ARQUIVO_ESTADO_VIVO, escrita=True)
+	except (OSError, ValueError) as e :
+		print(f"⚠️ Estado ao vivo indisponível: {e}")
+		return None
+
+def status_estado_vivo(status_texto) :
+	"""Status do ciclo ("PARADA | Setup", "⚠️ FALHA PORTA OPC"...) -> MachineStatus"""
+	texto = status_texto.replace("⚠️", "").strip()
+	for prefixo, status in (("PRODUZINDO", MachineStatus.PRODUZINDO), ("PARADA", MachineStatus.PARADA),
+	                        ("SEM REDE", MachineStatus.SEM_REDE), ("FALHA PORTA OPC", MachineStatus.FALHA_OPC),
+	                        ("ERRO LEITURA", MachineStatus.ERRO_LEITURA)) :
+		if texto.startswith(prefixo) :
+			return status
+	return MachineStatus.DESCONHECIDO
+
+def publicar_estado_vivo(estado_vivo, maquinas, estado_persistente) :
+	"""Copia o estado do ciclo para os slots do estado ao vivo (um por api_id)"""
+	if estado_vivo is None :
+		return
+	estado_vivo.registrar(m['api_id'] for m in maquinas if m.get('api_id'))
+	for m in maquinas :
+		memoria = estado_persistente.get(m['nome'])
+		if not m.get('api_id') or not memoria :
+			continue
+		try :
+			desde = datetime.strptime(memoria.get('desde', ''), '%Y-%m-%d %H:%M:%S')
+		except ValueError :
+			desde = None
+		estado_vivo.atualizar_estado(m['api_id'], status_estado_vivo(memoria.get('status', '')), memoria.get('cor'),
+		                             desde, memoria.get('contador', 0), memoria.get('desatualizado', False))
+
+def _disparar_coleta(nome, funcao, *args) :
+	"""Dispara a coleta, a menos que a do ciclo anterior ainda esteja rodando"""
+	if nome not in _coletas_em_andamento :
+		_coletas_em_andamento[nome] = _executor_coletas.submit(funcao, *args)
+	return _coletas_em_andamento[nome]
+
+def _resultado_coleta(nome) :
+	"""
+	Retorna (resultado, atrasada). Coleta fora do prazo devolve o último
+	resultado conhecido e fica pendente para o próximo ciclo.
+	"""
+	futuro = _coletas_em_andamento.get(nome)
+	if futuro is None or not futuro.done() :
+		return _ultimos_resultados[nome], True
+	
+	_coletas_em_andamento.pop(nome, None)
+	try :
+		_ultimos_resultados[nome] = futuro.result()
+	except Exception as e :
+		print(f"⚠️ Erro na coleta {nome}: {e}")
+	return _ultimos_resultados[nome], False
+
+def coletar_com_orcamento(maquinas, opc_map_config) :
+	"""
+	Executa as coletas de rede e OPC em paralelo com deadline único (ORCAMENTO_CICLO).
+	O feed Metris vem do cache atualizado em background (leitura não bloqueante)
+	"""
+	futuros = [
+		_disparar_coleta("rede", network_utils.scan_machines, maquinas),
+		_disparar_coleta("opc", opc_utils.check_opc_batch, maquinas, opc_map_config)
+	]
+	concurrent.futures.wait(futuros, timeout=ORCAMENTO_CICLO)
+	
+	dados_rede, rede_atrasada = _resultado_coleta("rede")
+	mapa_opc, opc_atrasada = _resultado_coleta("opc")
+	dados_api = integration_api.metris_cache.snapshot()
+	
+	atrasadas = [nome for nome, atrasada in (("rede", rede_atrasada), ("opc", opc_atrasada)) if atrasada]
+	return dados_rede, dados_api, mapa_opc, atrasadas
+
 def loop_principal() :
 	print(f"🚀 Serviço Monitoramento (DB + Filtros) - {datetime.now()}")
 	database.init_db()
+	integration_api.metris_cache.iniciar()
+	estado_vivo = abrir_estado_vivo()
 	
 	json_completo = database.carregar_estado_persistente()
 	estado_persistente = json_completo.get("maquinas", { }) if "maquinas" in json_completo else json_completo
@@ -45,6 +132,10 @@ def loop_principal() :
 	
 	primeira_execucao = True
 	
+	# Agendamento por deadline (sem drift): o próximo ciclo parte do deadline anterior
+	proximo_ciclo = time.monotonic()
+	deadlines_perdidos = 0
+	
 	while True :
 		inicio_scan = time.time()
 		maquinas = carregar_maquinas()
@@ -58,15 +149,25 @@ def loop_principal() :
 				opc_map_config[m["api_id"]] = m["opc_config"]
 		# -----------------------------------------------
 		
-		# Coletas
-		dados_rede = network_utils.scan_machines(maquinas)
-		dados_api = integration_api.fetch_metris_status()
-		mapa_resultados_opc = opc_utils.check_opc_batch(maquinas, opc_map_config)
+		# Coletas (com orçamento de tempo por ciclo)
+		dados_rede, dados_api, mapa_resultados_opc, coletas_atrasadas = coletar_com_orcamento(maquinas, opc_map_config)
 		
 		houve_mudanca = False
 		timestamp_agora = datetime.now()
 		str_agora = timestamp_agora.strftime('%Y-%m-%d %H:%M:%S')
 		
+		# Coleta fora do prazo: só as máquinas que dependem dela mantêm o estado anterior,
+		# marcadas como desatualizadas (o Metris sempre responde do cache, com os últimos valores bons)
+		if coletas_atrasadas :
+			print(f"⏳ Coletas fora do prazo: {', '.join(coletas_atrasadas)}", end=" ")
+		if "rede" in coletas_atrasadas :
+			# Sem o status de rede deste ciclo nenhuma máquina pode ser avaliada
+			for memoria in estado_persistente.values() :
+				if not memoria.get('desatualizado') :
+					memoria['desatualizado'] = True
+					houve_mudanca = True
+			dados_rede = []
+		
 		for item_rede in dados_rede :
 			nome_config = item_rede['Máquina']
 			ip_maquina = item_rede['IP']
@@ -75,6 +176,15 @@ def loop_principal() :
 			maq_config = next((m for m in maquinas if m['nome'] == nome_config), None)
 			api_id = maq_config.get('api_id', '') if maq_config else ''
 			
+			# OPC atrasado: máquina online com leitura OPC configurada fica com o estado anterior
+			depende_opc = api_id in opc_map_config and "SEM CONEXÃO" not in status_infra and "FALHA OPC" not in status_infra
+			if "opc" in coletas_atrasadas and depende_opc :
+				memoria = estado_persistente.get(nome_config)
+				if memoria and not memoria.get('desatualizado') :
+					memoria['desatualizado'] = True
+					houve_mudanca = True
+				continue
+			
 			# Dados API e Config
 			info_api = dados_api.get(api_id, { })
 			status_api_desc = info_api.get('descricao', 'DESCONHECIDO')
@@ -164,9 +274,12 @@ def loop_principal() :
 				'ip' : ip_maquina,
 				'unidade' : unidade,
 				'planta' : planta,
-				'setor' : setor
+				'setor' : setor,
+				'desatualizado' : False
 			}
 		
+		publicar_estado_vivo(estado_vivo, maquinas, estado_persistente)
+		
 		if primeira_execucao :
 			notifications.enviar_notificacao_inteligente("🚀 Sistema Reiniciado (Nova Lógica DB)", "SISTEMA", 0)
 			primeira_execucao = False
@@ -178,8 +291,17 @@ def loop_principal() :
 			if houve_mudanca : print("💾 JSON Atualizado.")
 		
 		tempo_gasto = time.time() - inicio_scan
-		print(f"⏱️ {tempo_gasto:.2f}s")
-		time.sleep(max(0.0, INTERVALO_SCAN - tempo_gasto))
+		
+		proximo_ciclo += INTERVALO_SCAN
+		atraso = time.monotonic() - proximo_ciclo
+		if atraso > 0 :
+			# Ciclo estourou o deadline: conta e pula os deadlines que já passaram
+			perdidos = 1 + int(atraso // INTERVALO_SCAN)
+			deadlines_perdidos += perdidos
+			proximo_ciclo += perdidos * INTERVALO_SCAN
+		
+		print(f"⏱️ {tempo_gasto:.2f}s" + (f" | ⚠️ Deadlines perdidos: {deadlines_perdidos}" if deadlines_perdidos else ""))
+		time.sleep(max(0.0, proximo_ciclo - time.monotonic()))
 
 if __name__ == "__main__" :
 	loop_principal()
\ No newline at end of file
@@ -0,0 +1,379 @@
+"""
+Simulador de frota de CLPs para testes de carga (sem tocar na rede de produção).
+
+- Modo OPC: sobe servidores OPC UA locais (asyncua), cada um atrás de um relay
+  TCP que injeta latência e quedas de conexão
+- Modo memória: protocolo em memória com o mesmo comportamento, para milhares
+  de máquinas sem o custo de um servidor por endpoint
+- Feed Metris falso (HTTP/JSON com ETag) no formato da API real
+
+O valor de running de cada máquina é função determinística do tempo, então o
+benchmark consegue saber qual status era esperado.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from src.domain.interfaces import ICommunicationProtocol
+
+PADROES = ("estavel", "ciclo", "flapping")
+INICIO_SIMULACAO = time.time()
+
+# ---------- Perfis das máquinas ----------
+
+def gerar_perfis(n, seed = 42, taxa_mortas = 0.05, taxa_flapping = 0.05, taxa_ciclo = 0.10, latencia_ms = 5.0, taxa_falha = 0.0, periodo_ciclo = 60.0, periodo_flapping = 4.0) :
+	"""
+	Gera n perfis de máquina. Cada perfil define:
+	- padrao: 'estavel' (valor fixo), 'ciclo' (alterna a cada periodo) ou 'flapping' (alterna rápido)
+	- morta: host não responde
+	- latencia_ms / taxa_falha: atraso por requisição e probabilidade de falha transitória
+	"""
+	rnd = random.Random(seed)
+	perfis = []
+	for i in range(n) :
+		sorteio = rnd.random()
+		if sorteio < taxa_flapping :
+			padrao, periodo = "flapping", periodo_flapping
+		elif sorteio < taxa_flapping + taxa_ciclo :
+			padrao, periodo = "ciclo", periodo_ciclo
+		else :
+			padrao, periodo = "estavel", 0.0
+
+		perfis.append({
+			"api_id" : f"SIM{i:05d}",
+			"nome" : f"SIM{i:05d}",
+			"padrao" : padrao,
+			"periodo" : periodo,
+			"fase" : rnd.random() * max(periodo, 1.0),
+			"rodando" : rnd.random() < 0.8,
+			"morta" : rnd.random() < taxa_mortas,
+			"latencia_ms" : latencia_ms,
+			"taxa_falha" : taxa_falha,
+		})
+	return perfis
+
+def valor_running(perfil, instante = None) :
+	"""Valor da tag de running no instante (epoch)"""
+	if perfil["padrao"] == "estavel" :
+		return perfil["rodando"]
+
+	t = (instante if instante is not None else time.time()) - INICIO_SIMULACAO + perfil["fase"]
+	return int(t / perfil["periodo"]) % 2 == 0
+
+def gerar_config(perfis, host = "127.0.0.1", portas = None, node_ids = None, node_id = "ns=2;s=machine running") :
+	"""
+	Gera as entradas do config.json para os perfis
+	(modo OPC: portas e node_ids por api_id, vindos da FrotaOPC)
+	"""
+	config = []
+	for i, perfil in enumerate(perfis) :
+		config.append({
+			"nome" : perfil["nome"],
+			"api_id" : perfil["api_id"],
+			"ip" : host if portas else f"10.{200 + i // 65025}.{(i // 255) % 255}.{i % 255 + 1}",
+			"porta" : portas[perfil["api_id"]] if portas else 4840,
+			"node_id" : node_ids[perfil["api_id"]] if node_ids else node_id,
+			"unidade" : "Simulada",
+			"planta" : f"P{i % 4}",
+			"setor" : f"S{i % 10}",
+		})
+	return config
+
+# ---------- Modo memória ----------
+
+class ProtocoloSimulado(ICommunicationProtocol) :
+	"""Protocolo em memória: mesma latência, falhas e padrões do modo OPC"""
+
+	def __init__(self, perfis, seed = 7, espera_morta = 0.0) :
+		self.perfis = { p["api_id"] : p for p in perfis }
+		self.espera_morta = espera_morta  # Simula o timeout de conexão de um host morto
+		self._rnd = random.Random(seed)
+		self._lock = threading.Lock()
+		self.requisicoes = 0
+
+	def _requisicao(self, perfil) :
+		"""Simula o round-trip; retorna False se a requisição falhou"""
+		with self._lock :
+			self.requisicoes += 1
+			falhou = self._rnd.random() < perfil["taxa_falha"]
+		if perfil["latencia_ms"] :
+			time.sleep(perfil["latencia_ms"] / 1000)
+		return not falhou
+
+	def check_connection(self, machine) :
+		perfil = self.perfis.get(machine.api_id)
+		if perfil is None or perfil["morta"] :
+			if self.espera_morta :
+				time.sleep(self.espera_morta)
+			return False
+		return self._requisicao(perfil)
+
+	def read_value(self, machine, tag) :
+		return self.read_values(machine, [tag])[tag]
+
+	def read_values(self, machine, tags) :
+		perfil = self.perfis.get(machine.api_id)
+		if perfil is None or perfil["morta"] or not self._requisicao(perfil) :
+			return { tag : None for tag in tags }
+		valor = valor_running(perfil)
+		return { tag : valor for tag in tags }
+
+	def write_value(self, machine, tag, value) :
+		return False
+
+# ---------- Modo OPC UA ----------
+
+async def _relay(leitor, escritor, latencia, taxa_falha, rnd) :
+	"""Copia bytes de um lado para o outro com atraso e queda aleatória"""
+	try :
+		while True :
+			dados = await leitor.read(65536)
+			if not dados :
+				break
+			if taxa_falha and rnd.random() < taxa_falha :
+				break
+			if latencia :
+				await asyncio.sleep(latencia)
+			escritor.write(dados)
+			await escritor.drain()
+	except (ConnectionError, OSError) :
+		pass
+	finally :
+		escritor.close()
+
+async def _iniciar_relay(porta_publica, porta_interna, latencia, taxa_falha, rnd) :
+	async def conexao(leitor_cliente, escritor_cliente) :
+		try :
+			leitor_srv, escritor_srv = await asyncio.open_connection("127.0.0.1", porta_interna)
+		except OSError :
+			escritor_cliente.close()
+			return
+		await asyncio.gather(
+			_relay(leitor_cliente, escritor_srv, latencia, taxa_falha, rnd),
+			_relay(leitor_srv, escritor_cliente, latencia, taxa_falha, rnd)
+		)
+
+	return await asyncio.start_server(conexao, "127.0.0.1", porta_publica)
+
+class FrotaOPC :
+	"""
+	Servidores OPC UA locais (asyncua) para os perfis.
+
+	Cada servidor atende maquinas_por_servidor máquinas (um servidor asyncua
+	custa dezenas de MB; 1 por máquina só é viável para frotas pequenas), cada
+	uma com seu próprio NodeId. Máquinas mortas recebem uma porta sem nada escutando.
+	"""
+
+	def __init__(self, perfis, porta_inicial = 48400, node_id = "machine running", maquinas_por_servidor = 1, intervalo_atualizacao = 0.2, seed = 7) :
+		self.perfis = perfis
+		self.porta_inicial = porta_inicial
+		self.node_id = node_id
+		self.maquinas_por_servidor = max(1, maquinas_por_servidor)
+		self.intervalo_atualizacao = intervalo_atualizacao
+		self.portas = { }
+		self.node_ids = { }
+		self._rnd = random.Random(seed)
+		self._loop = None
+		self._thread = None
+		self._pronto = threading.Event()
+		self._erro = None
+		self._servidores = []
+		self._relays = []
+		self._tarefa_valores = None
+
+		# Avisos de segurança/sessão do asyncua poluem a saída do benchmark
+		logging.getLogger("asyncua").setLevel(logging.ERROR)
+
+	def iniciar(self, timeout = 300) :
+		"""Sobe os servidores em uma thread com event loop próprio e aguarda ficarem prontos"""
+		self._thread = threading.Thread(target=self._executar, name="frota-opc", daemon=True)
+		self._thread.start()
+		if not self._pronto.wait(timeout) :
+			raise TimeoutError("Servidores OPC não subiram a tempo")
+		if self._erro :
+			raise self._erro
+		return self.portas
+
+	def parar(self, timeout = 30) :
+		"""Para relays e servidores e encerra o event loop da frota"""
+		if self._loop is None or not self._loop.is_running() :
+			return
+		try :
+			asyncio.run_coroutine_threadsafe(self._encerrar(), self._loop).result(timeout)
+		except Exception as e :
+			print(f"⚠️ Erro ao encerrar a frota simulada: {e!r}")
+		self._loop.call_soon_threadsafe(self._loop.stop)
+		self._thread.join(timeout)
+
+	def _executar(self) :
+		self._loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(self._loop)
+		try :
+			self._loop.run_until_complete(self._subir())
+		except Exception as e :
+			self._erro = e
+			self._pronto.set()
+			return
+		self._pronto.set()
+		self._loop.run_forever()
+		self._loop.close()
+
+	async def _subir(self) :
+		porta = self.porta_inicial
+		vivas = []
+		for perfil in self.perfis :
+			if perfil["morta"] :
+				self.portas[perfil["api_id"]] = porta
+				self.node_ids[perfil["api_id"]] = f"ns=2;s={perfil['nome']}.{self.node_id}"
+				porta += 1
+			else :
+				vivas.append(perfil)
+
+		variaveis = []
+		for i in range(0, len(vivas), self.maquinas_por_servidor) :
+			grupo = vivas[i : i + self.maquinas_por_servidor]
+			porta_publica, porta_interna = porta, porta + 1
+			porta += 2
+			variaveis.extend(await self._subir_servidor(grupo, porta_publica, porta_interna))
+
+		self._tarefa_valores = self._loop.create_task(self._atualizar_valores(variaveis))
+
+	async def _subir_servidor(self, grupo, porta_publica, porta_interna) :
+		from asyncua import Server, ua
+
+		servidor = Server()
+		await servidor.init()
+		servidor.set_endpoint(f"opc.tcp://127.0.0.1:{porta_interna}/")
+		servidor.set_security_policy([ua.SecurityPolicyType.NoSecurity])
+		idx = await servidor.register_namespace("urn:simulador-frota")
+
+		variaveis = []
+		for perfil in grupo :
+			nome_no = f"{perfil['nome']}.{self.node_id}"
+			objeto = await servidor.nodes.objects.add_object(idx, perfil["nome"])
+			variavel = await objeto.add_variable(ua.NodeId(nome_no, idx), self.node_id, valor_running(perfil))
+			variaveis.append((perfil, variavel))
+			self.portas[perfil["api_id"]] = porta_publica
+			self.node_ids[perfil["api_id"]] = f"ns={idx};s={nome_no}"
+
+		await servidor.start()
+		self._servidores.append(servidor)
+
+		perfil = grupo[0]
+		relay = await _iniciar_relay(porta_publica, porta_interna, perfil["latencia_ms"] / 1000, perfil["taxa_falha"], self._rnd)
+		self._relays.append(relay)
+		return variaveis
+
+	async def _encerrar(self) :
+		if self._tarefa_valores is not None :
+			self._tarefa_valores.cancel()
+		for relay in self._relays :
+			relay.close()
+		for servidor in self._servidores :
+			try :
+				await asyncio.wait_for(servidor.stop(), 5)
+			except Exception :
+				pass
+
+		# Tarefas restantes (conexões dos relays, sessões do asyncua)
+		pendentes = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+		for tarefa in pendentes :
+			tarefa.cancel()
+		if pendentes :
+			await asyncio.wait(pendentes, timeout=5)
+
+	async def _atualizar_valores(self, variaveis) :
+		while True :
+			agora = time.time()
+			for perfil, variavel in variaveis :
+				if perfil["padrao"] != "estavel" :
+					await variavel.write_value(valor_running(perfil, agora))
+			await asyncio.sleep(self.intervalo_atualizacao)
+
+# ---------- Metris falso ----------
+
+def _payload_metris(perfis) :
+	itens = []
+	for perfil in perfis :
+		rodando = not perfil["morta"] and valor_running(perfil)
+		itens.append({
+			"recurso" : perfil["api_id"],
+			"descricao" : "MÁQUINA OPERANDO" if rodando else "PARADA NÃO CLASSIFICADA",
+			"corStatus" : "FF007B38" if rodando else "FFDC3545",
+			"status" : 1 if rodando else 0,
+			"codigo" : 0 if rodando else 99,
+			"aguardandoClassificacao" : False,
+		})
+	return json.dumps(itens).encode("utf-8")
+
+def iniciar_metris_falso(perfis, porta = 18300, latencia_ms = 50.0) :
+	"""Sobe o endpoint HTTP do Metris falso (com ETag). Retorna (servidor, url)"""
+
+	class Handler(BaseHTTPRequestHandler) :
+		protocol_version = "HTTP/1.1"
+
+		def log_message(self, *args) :
+			pass
+
+		def do_GET(self) :
+			time.sleep(latencia_ms / 1000)
+			corpo = _payload_metris(perfis)
+			etag = '"%s"' % hashlib.md5(corpo).hexdigest()
+
+			if self.headers.get("If-None-Match") == etag :
+				self.send_response(304)
+				self.send_header("ETag", etag)
+				self.send_header("Content-Length", "0")
+				self.end_headers()
+				return
+
+			self.send_response(200)
+			self.send_header("Content-Type", "application/json")
+			self.send_header("ETag", etag)
+			self.send_header("Content-Length", str(len(corpo)))
+			self.end_headers()
+			self.wfile.write(corpo)
+
+	servidor = ThreadingHTTPServer(("127.0.0.1", porta), Handler)
+	servidor.daemon_threads = True
+	threading.Thread(target=servidor.serve_forever, name="metris-falso", daemon=True).start()
+	return servidor, f"http://127.0.0.1:{porta}/classificacao-maquina?codigoRecurso=all"
+
+# ---------- Execução avulsa ----------
+
+if __name__ == "__main__" :
+	parser = argparse.ArgumentParser(description="Simulador local de frota OPC UA + Metris")
+	parser.add_argument("--maquinas", type=int, default=10)
+	parser.add_argument("--porta-inicial", type=int, default=48400)
+	parser.add_argument("--maquinas-por-servidor", type=int, default=1)
+	parser.add_argument("--porta-metris", type=int, default=18300)
+	parser.add_argument("--latencia-ms", type=float, default=5.0)
+	parser.add_argument("--taxa-falha", type=float, default=0.0)
+	parser.add_argument("--taxa-mortas", type=float, default=0.05)
+	parser.add_argument("--taxa-flapping", type=float, default=0.05)
+	parser.add_argument("--config", default="config_simulado.json", help="Arquivo config.json gerado para a frota")
+	args = parser.parse_args()
+
+	perfis = gerar_perfis(args.maquinas, latencia_ms=args.latencia_ms, taxa_falha=args.taxa_falha, taxa_mortas=args.taxa_mortas, taxa_flapping=args.taxa_flapping)
+	frota = FrotaOPC(perfis, porta_inicial=args.porta_inicial, maquinas_por_servidor=args.maquinas_por_servidor)
+	portas = frota.iniciar()
+	_, url_metris = iniciar_metris_falso(perfis, porta=args.porta_metris)
+
+	with open(args.config, "w", encoding="utf-8") as f :
+		json.dump(gerar_config(perfis, portas=portas, node_ids=frota.node_ids), f, indent=2, ensure_ascii=False)
+
+	print(f"🏭 {len(perfis)} máquinas simuladas ({sum(p['morta'] for p in perfis)} mortas)")
+	print(f"📄 Config: {args.config}")
+	print(f"🌐 Metris falso: {url_metris}")
+	print("Ctrl+C para encerrar")
+	try :
+		while True :
+			time.sleep(1)
+	except KeyboardInterrupt :
+		frota.parar()
@@ -1,14 +1,31 @@
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from ...domain.models import KPIData, Downtime
-from ...domain.interfaces import IDowntimeRepository, IAnalyticsService
+from ...domain.interfaces import IDowntimeRepository, IAnalyticsService, IDailyMetricsRepository, IAnalyticsEngine
 
 
 class AnalyticsService(IAnalyticsService):
-    """Serviço para cálculo de KPIs e análises"""
+    """
+    Serviço para cálculo de KPIs e análises
 
-    def __init__(self, downtime_repository: IDowntimeRepository):
+    Com metricas_repository, os KPIs e as visões por período leem o rollup
+    diário (uma linha por máquina por dia, granularidade de dias inteiros)
+    em vez de percorrer todas as paradas do período.
+
+    Com motor_analitico (ex: DuckDB), as mesmas consultas rodam sobre as
+    paradas brutas no motor colunar (períodos com hora, sem arredondar para
+    dias). Tem prioridade sobre o rollup.
+    """
+
+    def __init__(
+        self,
+        downtime_repository: IDowntimeRepository,
+        metricas_repository: Optional[IDailyMetricsRepository] = None,
+        motor_analitico: Optional[IAnalyticsEngine] = None
+    ):
         self.downtime_repo = downtime_repository
+        self.metricas_repo = metricas_repository
+        self.motor_analitico = motor_analitico
 
     def calculate_kpis(
         self,
@@ -30,21 +47,43 @@ class AnalyticsService(IAnalyticsService):
         if not data_fim:
             data_fim = datetime.now()
 
-        # Busca paradas do período
-        if equipamento:
-            paradas = self.downtime_repo.get_by_machine(equipamento, data_inicio, data_fim)
+        # Intervalo usado no denominador (o período pedido, exceto no rollup)
+        inicio_periodo, fim_periodo = data_inicio, data_fim
+
+        if self.motor_analitico is not None:
+            # Paradas finalizadas que começaram no período, somadas no motor analítico
+            totais = self.motor_analitico.get_totais(data_inicio, data_fim, equipamento)
+            total_paradas = totais['numero_paradas']
+            tempo_total_parado = totais['minutos_parado']
+        elif self.metricas_repo is not None:
+            # Rollup diário: paradas finalizadas, já divididas por dia
+            totais = self.metricas_repo.get_totais(data_inicio.date(), data_fim.date(), equipamento)
+            total_paradas = totais['numero_paradas']
+            tempo_total_parado = totais['minutos_parado']
+            # O rollup soma dias inteiros: o período vira os mesmos dias (até agora,
+            # se o último ainda não terminou), senão uma janela de horas dividiria um
+            # dia inteiro de parada por poucos minutos
+            inicio_periodo = datetime.combine(data_inicio.date(), datetime.min.time())
+            fim_periodo = datetime.combine(data_fim.date() + timedelta(days=1), datetime.min.time())
+            agora = datetime.now()
+            if inicio_periodo < agora < fim_periodo:
+                fim_periodo = agora
         else:
-            paradas = self.downtime_repo.get_by_period(data_inicio, data_fim)
+            # Busca paradas do período
+            if equipamento:
+                paradas = self.downtime_repo.get_by_machine(equipamento, data_inicio, data_fim)
+            else:
+                paradas = self.downtime_repo.get_by_period(data_inicio, data_fim)
 
-        # Filtra apenas paradas finalizadas
-        paradas_finalizadas = [p for p in paradas if not p.is_ativo()]
+            # Filtra apenas paradas finalizadas
+            paradas_finalizadas = [p for p in paradas if not p.is_ativo()]
 
-        # Cálculos
-        total_paradas = len(paradas_finalizadas)
-        tempo_total_parado = sum(p.minutos_parado for p in paradas_finalizadas)
+            # Cálculos
+            total_paradas = len(paradas_finalizadas)
+            tempo_total_parado = sum(p.minutos_parado for p in paradas_finalizadas)
 
         # Tempo total do período em minutos
-        periodo_total_minutos = (data_fim - data_inicio).total_seconds() / 60
+        periodo_total_minutos = (fim_periodo - inicio_periodo).total_seconds() / 60
 
         # Disponibilidade
         tempo_produzindo = periodo_total_minutos - tempo_total_parado
@@ -79,6 +118,11 @@ class AnalyticsService(IAnalyticsService):
         """
         # Busca todas as paradas dos últimos 30 dias
         data_inicio = datetime.now() - timedelta(days=30)
+        if self.motor_analitico is not None:
+            return self.motor_analitico.get_por_equipamento(data_inicio, datetime.now(), limit)
+        if self.metricas_repo is not None:
+            return self.metricas_repo.get_por_equipamento(data_inicio.date(), datetime.now().date(), limit)
+
         paradas = self.downtime_repo.get_by_period(data_inicio, datetime.now())
 
         # Agrupa por equipamento
@@ -110,6 +154,11 @@ class AnalyticsService(IAnalyticsService):
         """
         Agrupa tempo de parada por turno
         """
+        if self.motor_analitico is not None:
+            return self.motor_analitico.get_totais(data_inicio, data_fim)['turnos']
+        if self.metricas_repo is not None:
+            return self.metricas_repo.get_totais(data_inicio.date(), data_fim.date())['turnos']
+
         paradas = self.downtime_repo.get_by_period(data_inicio, data_fim)
 
         tempo_por_turno = {
@@ -1,9 +1,16 @@
 from datetime import datetime
-from typing import List, Dict, Any
+from collections import deque
+from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, Future
+import asyncio
+import threading
 import time
 from ...domain.models import Machine, Downtime, Event
-from ...domain.enums import MachineStatus, StatusColor, Turno
-from ...domain.interfaces import IMachineRepository, IDowntimeRepository, IEventRepository, ICommunicationProtocol
+from ...domain.enums import MachineStatus, StatusColor, Turno, AcquisitionMode
+from ...domain.interfaces import (
+    IMachineRepository, IDowntimeRepository, IEventRepository,
+    ICommunicationProtocol, ISubscriptionProtocol
+)
 
 
 class MonitorService:
@@ -16,7 +23,12 @@ class MonitorService:
         event_repo: IEventRepository,
         communication_protocols: Dict[str, ICommunicationProtocol],
         limite_falhas: int = 3,
-        tempo_estabilidade: int = 60
+        tempo_estabilidade: int = 60,
+        scan_concorrente: bool = False,
+        max_concorrencia: int = 50,
+        timeout_maquina: float = 5.0,
+        subscription_protocols: Dict[str, ISubscriptionProtocol] = None,
+        orcamento_ciclo: Optional[float] = None
     ):
         self.machine_repo = machine_repo
         self.downtime_repo = downtime_repo
@@ -25,49 +37,370 @@ class MonitorService:
         self.limite_falhas = limite_falhas
         self.tempo_estabilidade = tempo_estabilidade
 
+        # Scan concorrente
+        self.scan_concorrente = scan_concorrente
+        self.max_concorrencia = max_concorrencia
+        self.timeout_maquina = timeout_maquina
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.ultimo_ciclo: Dict[str, Any] = {}
+
+        # Orçamento de tempo por ciclo: máquinas que não respondem a tempo mantêm o
+        # estado anterior (marcadas como desatualizadas) e a coleta em andamento é
+        # aproveitada no ciclo seguinte
+        self.orcamento_ciclo = orcamento_ciclo
+        self._coletas_em_andamento: Dict[str, Future] = {}
+
+        # Aquisição por push (subscriptions): notificações chegam em outras threads
+        self.subscriptions = subscription_protocols or {}
+        self._maquinas_push: Dict[str, Machine] = {}
+        self._ultimos_push: Dict[str, Tuple[Optional[Any], bool]] = {}
+        # Última notificação com conexão (monotonic), para o timeout de silêncio
+        self._ultima_notificacao: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
         # Controle de estado
         self.inicio_paradas: Dict[str, datetime] = {}
         self.estabilidade_recuperacao: Dict[str, float] = {}
+        self.historico_transicoes: Dict[str, deque] = {}
 
-    def scan_machines(self) -> List[Machine]:
+    def scan_machines(self, maquinas: List[Machine] = None) -> List[Machine]:
         """
-        Executa scan de todas as máquinas e atualiza status
+        Executa scan das máquinas (todas, se não informadas) e atualiza status
         """
-        maquinas = self.machine_repo.get_all()
+        if self.scan_concorrente:
+            return self.scan_machines_concorrente(maquinas)
+
+        inicio_ciclo = time.perf_counter()
+        if maquinas is None:
+            maquinas = self.machine_repo.get_all()
         timestamp_agora = datetime.now()
+        atrasadas = 0
 
         for maquina in maquinas:
+            if maquina.api_id in self._maquinas_push:
+                continue
+
             # Verifica conectividade
             protocol = self.protocols.get(maquina.comunicacao.tipo.value)
             if not protocol:
                 continue
 
+            # Orçamento do ciclo esgotado: mantém o estado anterior
+            if self.orcamento_ciclo and time.perf_counter() - inicio_ciclo >= self.orcamento_ciclo:
+                self._marcar_desatualizada(maquina)
+                atrasadas += 1
+                continue
+
+            novo_status = self._coletar_status(maquina, protocol)
+            self._atualizar_maquina(maquina, novo_status, timestamp_agora)
+
+        self._gravar_pendentes()
+        self._registrar_ciclo('sequencial', len(maquinas), inicio_ciclo, timeouts=0, atrasadas=atrasadas)
+        return maquinas
+
+    def scan_machines_concorrente(self, maquinas: List[Machine] = None) -> List[Machine]:
+        """
+        Executa scan concorrente: dispara conexão + leitura de todas as máquinas
+        em paralelo (limitado por max_concorrencia e timeout_maquina) e depois
+        aplica filtros e mudanças de status na ordem do repositório
+        """
+        inicio_ciclo = time.perf_counter()
+        if maquinas is None:
+            maquinas = self.machine_repo.get_all()
+
+        resultados, atrasadas = asyncio.run(self._coletar_concorrente(maquinas))
+        timestamp_agora = datetime.now()
+
+        # Fase sequencial: ordem determinística (mesma ordem de get_all)
+        timeouts = 0
+        for maquina in maquinas:
+            if maquina.api_id in atrasadas:
+                self._marcar_desatualizada(maquina)
+                continue
+
+            if maquina.api_id not in resultados:
+                continue
+
+            novo_status = resultados[maquina.api_id]
+            if novo_status is None:
+                # Estourou o timeout: tratado como falha de rede (passa pelo debounce)
+                timeouts += 1
+                novo_status = MachineStatus.SEM_REDE
+
+            self._atualizar_maquina(maquina, novo_status, timestamp_agora)
+
+        self._gravar_pendentes()
+        self._registrar_ciclo(
+            'concorrente', len(maquinas), inicio_ciclo, timeouts=timeouts, atrasadas=len(atrasadas)
+        )
+        return maquinas
+
+    async def _coletar_concorrente(self, maquinas: List[Machine]):
+        """
+        Fan-out das verificações de conexão e leituras de tag.
+        Retorna ({api_id: status}, {api_ids atrasados}). Status None indica que
+        a máquina estourou o timeout individual (contado a partir do início da
+        coleta na thread) ou esperou mais que ele por uma thread livre; atrasadas são as que não terminaram, ou
+        nem começaram, dentro do orçamento do ciclo
+        """
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        semaforo = asyncio.Semaphore(self.max_concorrencia)
+        resultados: Dict[str, Optional[MachineStatus]] = {}
+        atrasadas = set()
+        disparadas = set()
+
+        def liberar_vaga(_futuro):
+            # A vaga só volta quando a thread termina de fato: uma coleta que estourou
+            # o timeout continua ocupando a thread do pool
+            try:
+                loop.call_soon_threadsafe(semaforo.release)
+            except RuntimeError:
+                pass  # Ciclo já encerrado (loop fechado)
+
+        async def coletar(maquina: Machine, protocol: ICommunicationProtocol):
+            iniciou = loop.create_future()
+            futuro = None
+
+            def executar():
+                loop.call_soon_threadsafe(lambda: iniciou.done() or iniciou.set_result(None))
+                return self._coletar_status(maquina, protocol)
+
+            async def iniciar():
+                nonlocal futuro
+                await semaforo.acquire()
+                futuro = executor.submit(executar)
+                futuro.add_done_callback(liberar_vaga)
+                self._coletas_em_andamento[maquina.api_id] = futuro
+                await iniciou
+
+            # A espera por uma thread livre também é limitada: com todas as threads
+            # presas em leituras bloqueantes a máquina não ficaria na fila para sempre
+            try:
+                await asyncio.wait_for(iniciar(), timeout=self.timeout_maquina or self.orcamento_ciclo)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as erro:
+                # Não começou a tempo: a máquina não foi consultada
+                if futuro is not None and futuro.cancel():
+                    self._coletas_em_andamento.pop(maquina.api_id, None)
+                if isinstance(erro, asyncio.CancelledError):
+                    raise  # Orçamento do ciclo esgotado
+                return maquina.api_id, None
+
+            try:
+                status = await asyncio.wait_for(asyncio.wrap_future(futuro), timeout=self.timeout_maquina)
+            except asyncio.TimeoutError:
+                status = None
+            else:
+                self._coletas_em_andamento.pop(maquina.api_id, None)
+            return maquina.api_id, status
+
+        tarefas = []
+        for maquina in maquinas:
+            if maquina.api_id in self._maquinas_push:
+                continue
+            protocol = self.protocols.get(maquina.comunicacao.tipo.value)
+            if not protocol:
+                continue
+
+            # Coleta iniciada em ciclo anterior: aproveita o resultado ou aguarda
+            anterior = self._coletas_em_andamento.get(maquina.api_id)
+            if anterior is not None:
+                if not anterior.done():
+                    atrasadas.add(maquina.api_id)
+                    continue
+                self._coletas_em_andamento.pop(maquina.api_id, None)
+                if not anterior.cancelled() and anterior.exception() is None:
+                    resultados[maquina.api_id] = anterior.result()
+                    continue
+
+            disparadas.add(maquina.api_id)
+            tarefas.append(asyncio.ensure_future(coletar(maquina, protocol)))
+
+        if not tarefas:
+            return resultados, atrasadas
+
+        concluidas, pendentes = await asyncio.wait(tarefas, timeout=self.orcamento_ciclo)
+
+        for tarefa in concluidas:
+            api_id, status = tarefa.result()
+            resultados[api_id] = status
+
+        # Orçamento esgotado: cancela a espera (a thread em andamento fica para o
+        # próximo ciclo; as que nem começaram são retiradas da fila do pool)
+        for tarefa in pendentes:
+            tarefa.cancel()
+        if pendentes:
+            await asyncio.gather(*pendentes, return_exceptions=True)
+
+        # Sem resultado neste ciclo: mantém o estado anterior, não é falha de rede
+        atrasadas.update(api_id for api_id in disparadas if api_id not in resultados)
+
+        return resultados, atrasadas
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Retorna o pool de threads do scan concorrente (criado sob demanda)"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concorrencia,
+                thread_name_prefix="scan"
+            )
+        return self._executor
+
+    def _coletar_status(self, maquina: Machine, protocol: ICommunicationProtocol) -> MachineStatus:
+        """
+        Fase de I/O do scan: conexão + leitura. Roda nas threads do scan: o único
+        efeito no estado é gravar as tags extras em metadata (sob self._lock)
+        """
+        try:
             is_connected = protocol.check_connection(maquina)
+        except Exception:
+            is_connected = False
+
+        return self._determinar_status(maquina, is_connected, protocol)
+
+    def _atualizar_maquina(self, maquina: Machine, novo_status: MachineStatus, timestamp_agora: datetime):
+        """
+        Fase de estado do scan: debounce/histerese, eventos e atualização do repositório
+        """
+        with self._lock:
+            self._atualizar_maquina_locked(maquina, novo_status, timestamp_agora)
 
-            # Determina status
-            status_anterior = maquina.status
-            novo_status = self._determinar_status(maquina, is_connected, protocol)
+    def _atualizar_maquina_locked(self, maquina: Machine, novo_status: MachineStatus, timestamp_agora: datetime):
+        status_anterior = maquina.status
 
-            # Aplica lógica de debounce e histerese
-            status_final = self._aplicar_filtros(
-                maquina, status_anterior, novo_status, timestamp_agora
+        # Aplica lógica de debounce e histerese
+        status_final = self._aplicar_filtros(
+            maquina, status_anterior, novo_status, timestamp_agora
+        )
+
+        # Detecta mudanças e registra eventos
+        if status_final != status_anterior:
+            self._processar_mudanca_status(
+                maquina, status_anterior, status_final, timestamp_agora
             )
 
-            # Detecta mudanças e registra eventos
-            if status_final != status_anterior:
-                self._processar_mudanca_status(
-                    maquina, status_anterior, status_final, timestamp_agora
-                )
+        # Atualiza máquina
+        maquina.status = status_final
+        maquina.metadata['desatualizado'] = False
+        self.machine_repo.update_status(maquina.api_id, {
+            'status': status_final.value,
+            'desde': timestamp_agora if status_final != status_anterior else maquina.desde,
+            'contador_falhas': maquina.contador_falhas,
+            'desatualizado': False
+        })
+
+    def _marcar_desatualizada(self, maquina: Machine):
+        """Máquina sem resposta dentro do orçamento: mantém o estado anterior"""
+        with self._lock:
+            maquina.metadata['desatualizado'] = True
+            self.machine_repo.update_status(maquina.api_id, {'desatualizado': True})
+
+    def _registrar_ciclo(
+        self,
+        modo: str,
+        total_maquinas: int,
+        inicio_ciclo: float,
+        timeouts: int,
+        atrasadas: int = 0
+    ):
+        """Registra o tempo de parede do ciclo de scan"""
+        self.ultimo_ciclo = {
+            'modo': modo,
+            'total_maquinas': total_maquinas,
+            'duracao_segundos': round(time.perf_counter() - inicio_ciclo, 3),
+            'timeouts': timeouts,
+            'atrasadas': atrasadas,
+            'timestamp': datetime.now()
+        }
 
-            # Atualiza máquina
-            maquina.status = status_final
-            self.machine_repo.update_status(maquina.api_id, {
-                'status': status_final.value,
-                'desde': timestamp_agora if status_final != status_anterior else maquina.desde,
-                'contador_falhas': maquina.contador_falhas
-            })
+    def _gravar_pendentes(self):
+        """Fim de ciclo: grava eventos e paradas enfileirados (group commit) e publica o estado"""
+        self.event_repo.flush()
+        self.downtime_repo.flush()
+        self.machine_repo.flush()
 
-        return maquinas
+    def shutdown(self):
+        """Libera o pool de threads do scan concorrente, as subscriptions e grava as escritas pendentes"""
+        for subscription in self.subscriptions.values():
+            subscription.unsubscribe_all()
+
+        self._gravar_pendentes()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def iniciar_push(self) -> List[Machine]:
+        """
+        Assina as máquinas configuradas com modo_aquisicao PUSH. Essas máquinas
+        saem do ciclo de scan e passam a ser atualizadas pelas notificações
+        """
+        por_tipo: Dict[str, List[Machine]] = {}
+        for maquina in self.machine_repo.get_all():
+            if maquina.comunicacao.modo_aquisicao != AcquisitionMode.PUSH:
+                continue
+            if maquina.api_id in self._maquinas_push:
+                continue
+            if maquina.comunicacao.tipo.value not in self.subscriptions:
+                continue
+            por_tipo.setdefault(maquina.comunicacao.tipo.value, []).append(maquina)
+
+        assinadas = []
+        for tipo, maquinas in por_tipo.items():
+            # Registradas antes do subscribe: endpoints que falharem são
+            # reassinados por check_subscriptions e reportam SEM_REDE até lá
+            for maquina in maquinas:
+                self._maquinas_push[maquina.api_id] = maquina
+                self._ultima_notificacao.setdefault(maquina.api_id, time.monotonic())
+            assinadas.extend(self.subscriptions[tipo].subscribe(maquinas, self.processar_notificacao))
+
+        return assinadas
+
+    def processar_notificacao(self, maquina: Machine, valor: Optional[Any], conectado: bool = True):
+        """
+        Callback das subscriptions: aplica o valor recebido no mesmo pipeline
+        de status/filtros do scan
+        """
+        with self._lock:
+            self._ultimos_push[maquina.api_id] = (valor, conectado)
+            if conectado:
+                self._ultima_notificacao[maquina.api_id] = time.monotonic()
+            novo_status = self._status_por_valor(valor) if conectado else MachineStatus.SEM_REDE
+            self._atualizar_maquina_locked(maquina, novo_status, datetime.now())
+
+    def tick_push(self):
+        """
+        Chamado a cada ciclo no modo push: refaz assinaturas perdidas e reaplica
+        o último valor recebido, para que debounce e histerese avancem no tempo
+        mesmo sem novas notificações. Máquina sem notificação há mais que o
+        timeout_silencio da subscription (inclusive as que nunca publicaram)
+        passa a SEM_REDE
+        """
+        for subscription in self.subscriptions.values():
+            subscription.check_subscriptions()
+
+        timestamp_agora = datetime.now()
+        agora = time.monotonic()
+        with self._lock:
+            for api_id, maquina in list(self._maquinas_push.items()):
+                if self._push_silenciosa(maquina, agora):
+                    novo_status = MachineStatus.SEM_REDE
+                elif api_id in self._ultimos_push:
+                    valor, conectado = self._ultimos_push[api_id]
+                    novo_status = self._status_por_valor(valor) if conectado else MachineStatus.SEM_REDE
+                else:
+                    continue  # Ainda sem notificação, dentro do prazo
+                self._atualizar_maquina_locked(maquina, novo_status, timestamp_agora)
+
+        self._gravar_pendentes()
+
+    def _push_silenciosa(self, maquina: Machine, agora: float) -> bool:
+        """Máquina em push sem notificação dentro do timeout de silêncio do protocolo"""
+        subscription = self.subscriptions.get(maquina.comunicacao.tipo.value)
+        timeout = subscription.timeout_silencio(maquina) if subscription is not None else None
+        if timeout is None:
+            return False
+        return agora - self._ultima_notificacao.get(maquina.api_id, agora) > timeout
 
     def _determinar_status(
         self,
@@ -84,19 +417,30 @@ class MonitorService:
         # Tenta ler tag de running (se configurado)
         if maquina.comunicacao.node_id:
             try:
-                is_running = protocol.read_value(maquina, maquina.comunicacao.node_id)
+                # Running + tags extras em uma única requisição
+                node_id = maquina.comunicacao.node_id
+                tags_extras = maquina.comunicacao.tags
+                valores = protocol.read_values(maquina, [node_id] + list(tags_extras.values()))
 
-                if is_running is True:
-                    return MachineStatus.PRODUZINDO
-                elif is_running is False:
-                    return MachineStatus.PARADA
-                else:
-                    return MachineStatus.ERRO_LEITURA
+                if tags_extras:
+                    tags = {nome: valores.get(endereco) for nome, endereco in tags_extras.items()}
+                    with self._lock:
+                        maquina.metadata['tags'] = tags
+
+                return self._status_por_valor(valores.get(node_id))
             except Exception:
                 return MachineStatus.FALHA_OPC
 
         return MachineStatus.DESCONHECIDO
 
+    def _status_por_valor(self, is_running: Optional[Any]) -> MachineStatus:
+        """Converte o valor da tag de running em status"""
+        if is_running is True:
+            return MachineStatus.PRODUZINDO
+        elif is_running is False:
+            return MachineStatus.PARADA
+        return MachineStatus.ERRO_LEITURA
+
     def _aplicar_filtros(
         self,
         maquina: Machine,
@@ -115,8 +459,11 @@ class MonitorService:
         else:
             maquina.contador_falhas = 0
 
-        # 2. Histerese para retorno de produção
-        if novo_status == MachineStatus.PRODUZINDO and status_anterior != MachineStatus.PRODUZINDO:
+        # 2. Histerese para retorno de produção (a janela exige leituras
+        # PRODUZINDO seguidas: qualquer outra leitura encerra a recuperação)
+        if novo_status != MachineStatus.PRODUZINDO:
+            self.estabilidade_recuperacao.pop(maquina.api_id, None)
+        elif status_anterior != MachineStatus.PRODUZINDO:
             if maquina.api_id not in self.estabilidade_recuperacao:
                 self.estabilidade_recuperacao[maquina.api_id] = time.time()
 
@@ -139,6 +486,9 @@ class MonitorService:
         """
         Processa mudança de status, registrando eventos e paradas
         """
+        # Histórico recente de transições (detecção de flapping)
+        self.historico_transicoes.setdefault(maquina.api_id, deque(maxlen=50)).append(time.monotonic())
+
         # Registra evento
         event = Event(
             timestamp=timestamp,
@@ -181,6 +531,18 @@ class MonitorService:
                 # Salva no banco
                 self.downtime_repo.save(downtime)
 
+    def is_em_recuperacao(self, api_id: str) -> bool:
+        """Indica se a máquina está na janela de estabilidade de retorno à produção"""
+        return api_id in self.estabilidade_recuperacao
+
+    def contar_transicoes(self, api_id: str, janela_segundos: float) -> int:
+        """Número de mudanças de status da máquina nos últimos janela_segundos"""
+        transicoes = self.historico_transicoes.get(api_id)
+        if not transicoes:
+            return 0
+        limite = time.monotonic() - janela_segundos
+        return sum(1 for t in transicoes if t >= limite)
+
     def _calcular_turno(self, dt: datetime) -> Turno:
         """Calcula o turno baseado no horário"""
         t = dt.time()
@@ -224,5 +586,6 @@ class MonitorService:
             'maquinas_produzindo': produzindo,
             'maquinas_paradas': paradas,
             'maquinas_criticas': criticas,
-            'disponibilidade_geral': round(disponibilidade, 2)
+            'disponibilidade_geral': round(disponibilidade, 2),
+            'tempo_ultimo_scan': self.ultimo_ciclo.get('duracao_segundos')
         }
@@ -0,0 +1,158 @@
+from typing import List, Dict, Any, Optional, Tuple
+import heapq
+import itertools
+import threading
+import time
+from ...domain.models import Machine
+from ...domain.enums import MachineStatus
+from .monitor_service import MonitorService
+
+
+class AdaptivePollingScheduler:
+    """
+    Agendador de polling por deadline (fila de prioridade de próximos vencimentos)
+
+    Cada máquina tem seu próprio intervalo:
+    - rápido durante a janela de estabilidade (TEMPO_ESTABILIDADE) ou quando oscila (flapping)
+    - lento quando está estável há muito tempo ou SEM REDE
+    - padrão nos demais casos
+
+    Os vencimentos são calculados a partir do deadline anterior (sem drift) e
+    deadlines não cumpridos são contabilizados.
+    """
+
+    def __init__(
+        self,
+        monitor: MonitorService,
+        intervalo_padrao: float = 5.0,
+        intervalo_rapido: float = 1.0,
+        intervalo_estavel: float = 15.0,
+        intervalo_sem_rede: float = 30.0,
+        tempo_para_estavel: float = 1800.0,
+        janela_flapping: float = 600.0,
+        limite_flapping: int = 4,
+        tolerancia_atraso: float = 0.5
+    ):
+        self.monitor = monitor
+        self.intervalo_padrao = intervalo_padrao
+        self.intervalo_rapido = intervalo_rapido
+        self.intervalo_estavel = intervalo_estavel
+        self.intervalo_sem_rede = intervalo_sem_rede
+        self.tempo_para_estavel = tempo_para_estavel
+        self.janela_flapping = janela_flapping
+        self.limite_flapping = limite_flapping
+        self.tolerancia_atraso = tolerancia_atraso
+
+        # Heap de (vencimento, sequência, api_id)
+        self._fila: List[Tuple[float, int, str]] = []
+        self._agendadas: Dict[str, float] = {}
+        self._seq = itertools.count()
+
+        self.deadlines_perdidos = 0
+        self.deadlines_perdidos_por_maquina: Dict[str, int] = {}
+
+    def agendar_todas(self, agora: float = None):
+        """Agenda máquinas ainda não agendadas (vencimento imediato)"""
+        agora = time.monotonic() if agora is None else agora
+        for maquina in self.monitor.machine_repo.get_all():
+            if maquina.api_id not in self._agendadas:
+                self._push(maquina.api_id, agora)
+
+    def intervalo_para(self, maquina: Machine) -> float:
+        """Define o intervalo de polling conforme o estado da máquina"""
+        if self.monitor.is_em_recuperacao(maquina.api_id):
+            return self.intervalo_rapido
+
+        if self.monitor.contar_transicoes(maquina.api_id, self.janela_flapping) >= self.limite_flapping:
+            return self.intervalo_rapido
+
+        if maquina.status == MachineStatus.SEM_REDE:
+            return self.intervalo_sem_rede
+
+        if maquina.desde and (time.time() - maquina.desde.timestamp()) >= self.tempo_para_estavel:
+            return self.intervalo_estavel
+
+        return self.intervalo_padrao
+
+    def segundos_ate_proximo(self, agora: float = None) -> Optional[float]:
+        """Tempo até o próximo vencimento (None se a fila estiver vazia)"""
+        if not self._fila:
+            return None
+        agora = time.monotonic() if agora is None else agora
+        return max(0.0, self._fila[0][0] - agora)
+
+    def executar_ciclo(self) -> List[Machine]:
+        """
+        Executa o scan das máquinas vencidas e reagenda cada uma
+        """
+        inicio = time.monotonic()
+        devidas: List[Tuple[Machine, float]] = []
+
+        while self._fila and self._fila[0][0] <= inicio:
+            vencimento, _, api_id = heapq.heappop(self._fila)
+            if self._agendadas.get(api_id) != vencimento:
+                continue  # Entrada obsoleta
+            del self._agendadas[api_id]
+
+            maquina = self.monitor.machine_repo.get_by_id(api_id)
+            if maquina is None:
+                continue  # Removida da configuração
+            devidas.append((maquina, vencimento))
+
+        if not devidas:
+            return []
+
+        maquinas = [maquina for maquina, _ in devidas]
+        self.monitor.scan_machines(maquinas)
+
+        for maquina, vencimento in devidas:
+            self._reagendar(maquina, vencimento, inicio)
+
+        return maquinas
+
+    def executar(self, parar: threading.Event = None):
+        """Loop principal: aguarda o próximo vencimento e executa o ciclo"""
+        parar = parar or threading.Event()
+        self.agendar_todas()
+
+        while not parar.is_set():
+            espera = self.segundos_ate_proximo()
+            if espera is None:
+                espera = self.intervalo_padrao
+            if espera > 0 and parar.wait(espera):
+                break
+
+            self.executar_ciclo()
+            self.agendar_todas()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Estatísticas do agendador"""
+        return {
+            'maquinas_agendadas': len(self._agendadas),
+            'deadlines_perdidos': self.deadlines_perdidos,
+            'proximo_em': self.segundos_ate_proximo()
+        }
+
+    def _reagendar(self, maquina: Machine, vencimento: float, inicio: float):
+        """
+        Próximo vencimento = deadline anterior + intervalo. Se o poll começou
+        atrasado além da tolerância, conta os deadlines perdidos e pula os que
+        já passaram
+        """
+        intervalo = self.intervalo_para(maquina)
+        atraso = inicio - vencimento
+
+        saltos = int(atraso // intervalo) if atraso > 0 else 0
+
+        if atraso > self.tolerancia_atraso:
+            perdidos = 1 + saltos
+            self.deadlines_perdidos += perdidos
+            self.deadlines_perdidos_por_maquina[maquina.api_id] = (
+                self.deadlines_perdidos_por_maquina.get(maquina.api_id, 0) + perdidos
+            )
+
+        self._push(maquina.api_id, vencimento + intervalo * (1 + saltos))
+
+    def _push(self, api_id: str, vencimento: float):
+        self._agendadas[api_id] = vencimento
+        heapq.heappush(self._fila, (vencimento, next(self._seq), api_id))
@@ -0,0 +1,398 @@
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable, Tuple
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+from ...domain.models import Machine, Downtime, Event
+from ...domain.interfaces import (
+    IMachineRepository, IDowntimeRepository, IEventRepository, ICommunicationProtocol
+)
+from .monitor_service import MonitorService
+
+
+# Chaves de particionamento suportadas
+CHAVES_SHARD = ('hash', 'unidade', 'planta')
+
+
+def shard_for(machine: Machine, num_shards: int, chave: str = 'hash') -> int:
+    """
+    Define o shard da máquina. Usa CRC32 (estável entre processos, ao contrário de hash())
+    """
+    if chave == 'unidade':
+        valor = machine.hierarquia.unidade
+    elif chave == 'planta':
+        valor = f"{machine.hierarquia.unidade}/{machine.hierarquia.planta}"
+    else:
+        valor = machine.api_id
+    return zlib.crc32(valor.encode('utf-8')) % num_shards
+
+
+# ---------- Repositórios do worker (bufferizam e enviam ao coordenador) ----------
+
+class _ShardMachineRepository(IMachineRepository):
+    """Máquinas do shard em memória; registra as alterações de status para envio"""
+
+    def __init__(self, machines: List[Machine], saida: List[Tuple]):
+        self._machines = {m.api_id: m for m in machines}
+        self._saida = saida
+        self._ultimo_enviado: Dict[str, Tuple] = {}
+
+    def get_all(self) -> List[Machine]:
+        return list(self._machines.values())
+
+    def get_by_id(self, api_id: str) -> Optional[Machine]:
+        return self._machines.get(api_id)
+
+    def get_by_hierarquia(self, unidade: str = None, planta: str = None, setor: str = None) -> List[Machine]:
+        return [
+            m for m in self._machines.values()
+            if (not unidade or m.hierarquia.unidade == unidade)
+            and (not planta or m.hierarquia.planta == planta)
+            and (not setor or m.hierarquia.setor == setor)
+        ]
+
+    def save(self, machine: Machine) -> None:
+        self._machines[machine.api_id] = machine
+
+    def update_status(self, api_id: str, status: Dict[str, Any]) -> None:
+        machine = self._machines.get(api_id)
+        if machine is None:
+            return
+
+        if 'desde' in status:
+            machine.desde = status['desde']
+
+        # Envia apenas o que mudou desde a última atualização
+        registro = (
+            machine.status.value,
+            machine.desde.timestamp() if machine.desde else None,
+            machine.contador_falhas,
+            machine.metadata.get('desatualizado', False)
+        )
+        if self._ultimo_enviado.get(api_id) != registro:
+            self._ultimo_enviado[api_id] = registro
+            self._saida.append(('S', api_id) + registro)
+
+
+class _ShardEventRepository(IEventRepository):
+    """Eventos do worker: enviados ao coordenador"""
+
+    def __init__(self, saida: List[Tuple]):
+        self._saida = saida
+
+    def save(self, event: Event) -> None:
+        self._saida.append((
+            'E', event.timestamp.timestamp(), event.maquina, event.status_anterior, event.status_novo
+        ))
+
+    def get_recent(self, limit: int = 100, maquina: str = None) -> List[Event]:
+        return []
+
+
+class _ShardDowntimeRepository(IDowntimeRepository):
+    """Paradas do worker: enviadas ao coordenador"""
+
+    def __init__(self, saida: List[Tuple]):
+        self._saida = saida
+
+    def save(self, downtime: Downtime) -> str:
+        self._saida.append(('D', downtime))
+        return downtime.uuid
+
+    def get_by_machine(self, equipamento: str, data_inicio: datetime = None, data_fim: datetime = None) -> List[Downtime]:
+        return []
+
+    def get_active_downtimes(self) -> List[Downtime]:
+        return []
+
+    def get_by_period(self, data_inicio: datetime, data_fim: datetime) -> List[Downtime]:
+        return []
+
+    def finalize_downtime(self, uuid: str, data_final: datetime) -> None:
+        pass
+
+
+def _enviar_paradas_abertas(monitor: MonitorService, enviadas: Dict[str, datetime], saida: List[Tuple]):
+    """Início das paradas em aberto que mudaram (o coordenador repassa a um worker reiniciado)"""
+    for api_id in enviadas.keys() - monitor.inicio_paradas.keys():
+        saida.append(('P', api_id, None))
+    for api_id, inicio in monitor.inicio_paradas.items():
+        if enviadas.get(api_id) != inicio:
+            saida.append(('P', api_id, inicio.timestamp()))
+    enviadas.clear()
+    enviadas.update(monitor.inicio_paradas)
+
+
+def _aguardar(parar, segundos: float):
+    """Dorme até o prazo ou até o coordenador sinalizar a parada (conferida a cada 0,1 s)"""
+    limite = time.monotonic() + segundos
+    while not parar.value:
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            return
+        time.sleep(min(restante, 0.1))
+
+
+def _executar_worker(
+    indice: int,
+    machines: List[Machine],
+    fabrica_protocolos: Callable[[], Dict[str, ICommunicationProtocol]],
+    fila_saida,
+    parar,
+    intervalo_scan: float,
+    opcoes_monitor: Dict[str, Any],
+    inicio_paradas: Dict[str, float] = None
+):
+    """Processo worker: escaneia o shard e envia lotes compactos ao coordenador"""
+    saida: List[Tuple] = []
+    monitor = MonitorService(
+        _ShardMachineRepository(machines, saida),
+        _ShardDowntimeRepository(saida),
+        _ShardEventRepository(saida),
+        fabrica_protocolos(),
+        **opcoes_monitor
+    )
+    # Worker reiniciado: continua as paradas que o anterior tinha em aberto
+    monitor.inicio_paradas = {
+        api_id: datetime.fromtimestamp(inicio) for api_id, inicio in (inicio_paradas or {}).items()
+    }
+    enviadas = dict(monitor.inicio_paradas)
+
+    proximo_ciclo = time.monotonic()
+    try:
+        while not parar.value:
+            monitor.scan_machines()
+            _enviar_paradas_abertas(monitor, enviadas, saida)
+
+            fila_saida.put((indice, saida[:], monitor.ultimo_ciclo.get('duracao_segundos')))
+            saida.clear()
+
+            # Próximo ciclo a partir do deadline anterior (sem drift)
+            proximo_ciclo += intervalo_scan
+            atraso = time.monotonic() - proximo_ciclo
+            if atraso > 0:
+                proximo_ciclo += (1 + int(atraso // intervalo_scan)) * intervalo_scan
+            _aguardar(parar, proximo_ciclo - time.monotonic())
+    finally:
+        monitor.shutdown()
+
+
+class ShardedScanCoordinator:
+    """
+    Scanner multi-processo para frotas grandes
+
+    As máquinas são divididas em N shards (por hash do api_id, unidade ou
+    planta). Cada worker roda seu próprio MonitorService (aquisição, debounce
+    e histerese) e envia ao coordenador apenas as mudanças de status, eventos
+    e paradas. O coordenador é o único dono da persistência e das notificações.
+
+    fabrica_protocolos precisa ser uma função de módulo (picklable): cada
+    worker cria seus próprios clientes de comunicação.
+
+    Um worker que morre é reiniciado com o shard remontado a partir do
+    machine_repo (estado aplicado pelo coordenador) e com o início das paradas
+    em aberto que os workers enviam: a parada em curso é gravada inteira
+    quando a máquina volta a produzir.
+    """
+
+    def __init__(
+        self,
+        machine_repo: IMachineRepository,
+        downtime_repo: IDowntimeRepository,
+        event_repo: IEventRepository,
+        fabrica_protocolos: Callable[[], Dict[str, ICommunicationProtocol]],
+        num_workers: int = None,
+        chave_shard: str = 'hash',
+        intervalo_scan: float = 5.0,
+        opcoes_monitor: Dict[str, Any] = None,
+        ao_registrar_parada: Callable[[Downtime], None] = None
+    ):
+        if chave_shard not in CHAVES_SHARD:
+            raise ValueError(f"chave_shard inválida: {chave_shard} (use {', '.join(CHAVES_SHARD)})")
+
+        self.machine_repo = machine_repo
+        self.downtime_repo = downtime_repo
+        self.event_repo = event_repo
+        self.fabrica_protocolos = fabrica_protocolos
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        self.chave_shard = chave_shard
+        self.intervalo_scan = intervalo_scan
+        self.opcoes_monitor = opcoes_monitor or {}
+        self.ao_registrar_parada = ao_registrar_parada
+
+        # spawn: mesmo comportamento no Windows e no Linux
+        self._ctx = multiprocessing.get_context('spawn')
+        # Uma fila por worker: a Queue tem um lock de escrita entre processos e
+        # um worker morto durante o put() travaria os demais numa fila única
+        self._filas: Dict[int, Any] = {}
+        # Flag compartilhada sem lock: com um Event, um worker morto durante o
+        # wait() deixaria o set() do coordenador bloqueado para sempre
+        self._parar = self._ctx.RawValue('b', 0)
+        self._workers: Dict[int, multiprocessing.Process] = {}
+        self._shards: Dict[int, List[Machine]] = {}
+        # api_id -> início (epoch) da parada em aberto, enviado pelos workers
+        self._inicio_paradas: Dict[str, float] = {}
+        self.estatisticas_workers: Dict[int, Dict[str, Any]] = {}
+
+    def particionar(self) -> Dict[int, List[Machine]]:
+        """Divide as máquinas do repositório entre os shards"""
+        shards: Dict[int, List[Machine]] = {i: [] for i in range(self.num_workers)}
+        for machine in self.machine_repo.get_all():
+            shards[shard_for(machine, self.num_workers, self.chave_shard)].append(machine)
+        return {i: maquinas for i, maquinas in shards.items() if maquinas}
+
+    def iniciar(self):
+        """Inicia um processo worker por shard"""
+        self._shards = self.particionar()
+        for indice in self._shards:
+            self._iniciar_worker(indice)
+
+    def _maquinas_do_shard(self, indice: int) -> List[Machine]:
+        """Máquinas do shard com o estado atual do repositório"""
+        return [
+            machine for machine in self.machine_repo.get_all()
+            if shard_for(machine, self.num_workers, self.chave_shard) == indice
+        ]
+
+    def _iniciar_worker(self, indice: int):
+        maquinas = self._shards[indice]
+        inicio_paradas = {
+            machine.api_id: self._inicio_paradas[machine.api_id]
+            for machine in maquinas if machine.api_id in self._inicio_paradas
+        }
+        # Worker reiniciado recebe fila nova (a anterior pode ter ficado com o lock preso)
+        anterior = self._filas.pop(indice, None)
+        if anterior is not None:
+            anterior.close()
+        fila = self._ctx.Queue()
+        self._filas[indice] = fila
+        processo = self._ctx.Process(
+            target=_executar_worker,
+            args=(
+                indice, maquinas, self.fabrica_protocolos, fila,
+                self._parar, self.intervalo_scan, self.opcoes_monitor, inicio_paradas
+            ),
+            name=f"scan-shard-{indice}",
+            daemon=True
+        )
+        processo.start()
+        self._workers[indice] = processo
+
+    def processar_atualizacoes(self, timeout: float = 1.0) -> int:
+        """
+        Aplica os lotes recebidos dos workers. Retorna o número de lotes processados
+        """
+        lotes = 0
+        limite = time.monotonic() + timeout
+        while True:
+            for fila in list(self._filas.values()):
+                while True:
+                    try:
+                        lote = fila.get_nowait()
+                    except queue.Empty:
+                        break
+                    self._aplicar_lote(*lote)
+                    lotes += 1
+            if lotes or time.monotonic() >= limite:
+                break
+            time.sleep(0.01)
+
+        if not lotes:
+            return 0
+
+        # Um commit e um snapshot de estado para todos os lotes recebidos
+        self.event_repo.flush()
+        self.downtime_repo.flush()
+        self.machine_repo.flush()
+        return lotes
+
+    def _aplicar_lote(self, indice: int, atualizacoes: List[Tuple], duracao_ciclo: Optional[float]):
+        for item in atualizacoes:
+            tipo = item[0]
+            if tipo == 'S':
+                _, api_id, status, desde, contador, desatualizado = item
+                self.machine_repo.update_status(api_id, {
+                    'status': status,
+                    'desde': datetime.fromtimestamp(desde) if desde is not None else None,
+                    'contador_falhas': contador,
+                    'desatualizado': desatualizado
+                })
+            elif tipo == 'E':
+                _, timestamp, maquina, anterior, novo = item
+                self.event_repo.save(Event(
+                    timestamp=datetime.fromtimestamp(timestamp),
+                    maquina=maquina,
+                    status_anterior=anterior,
+                    status_novo=novo
+                ))
+            elif tipo == 'D':
+                downtime = item[1]
+                self.downtime_repo.save(downtime)
+                if self.ao_registrar_parada:
+                    self.ao_registrar_parada(downtime)
+            elif tipo == 'P':
+                _, api_id, inicio = item
+                if inicio is None:
+                    self._inicio_paradas.pop(api_id, None)
+                else:
+                    self._inicio_paradas[api_id] = inicio
+
+        self.estatisticas_workers[indice] = {
+            'maquinas': len(self._shards.get(indice, [])),
+            'duracao_ultimo_ciclo': duracao_ciclo,
+            'ultimo_lote': datetime.now()
+        }
+
+    def verificar_workers(self):
+        """
+        Reinicia workers que morreram, a partir do estado atual do shard (e não
+        das máquinas enviadas na primeira partida)
+        """
+        mortos = [
+            indice for indice, processo in self._workers.items()
+            if not processo.is_alive() and not self._parar.value
+        ]
+        if not mortos:
+            return
+
+        # Aplica o que o worker enviou antes de morrer
+        while self.processar_atualizacoes(timeout=0.1):
+            pass
+
+        for indice in mortos:
+            print(f"⚠️ Worker do shard {indice} parou (exit {self._workers[indice].exitcode}), reiniciando")
+            self._shards[indice] = self._maquinas_do_shard(indice)
+            self._iniciar_worker(indice)
+
+    def executar(self, parar: threading.Event = None):
+        """Loop do coordenador: aplica atualizações e supervisiona os workers"""
+        parar = parar or threading.Event()
+        self.iniciar()
+        try:
+            while not parar.is_set():
+                self.processar_atualizacoes(timeout=1.0)
+                self.verificar_workers()
+        finally:
+            self.encerrar()
+
+    def encerrar(self, timeout: float = 10.0):
+        """Sinaliza parada, aplica o que restou nas filas e finaliza os workers"""
+        self._parar.value = 1
+        # Esvazia as filas enquanto os workers encerram: um processo com dados
+        # pendentes na Queue só termina depois que o pipe é consumido
+        limite = time.monotonic() + timeout
+        while any(p.is_alive() for p in self._workers.values()) and time.monotonic() < limite:
+            self.processar_atualizacoes(timeout=0.1)
+        for processo in self._workers.values():
+            processo.join(max(0.0, limite - time.monotonic()))
+        while self.processar_atualizacoes(timeout=0.1):
+            pass
+        for processo in self._workers.values():
+            if processo.is_alive():
+                processo.terminate()
+        self._workers.clear()
+        for fila in self._filas.values():
+            fila.close()
+        self._filas.clear()
@@ -21,6 +21,19 @@ class CommunicationType(Enum):
     NETWORK_PING = "NETWORK_PING"
 
 
+class AcquisitionMode(Enum):
+    """Modos de aquisição do status de uma máquina"""
+    POLLING = "POLLING"  # Leitura periódica no ciclo de scan
+    PUSH = "PUSH"  # Notificações do dispositivo (subscription OPC UA, MQTT...)
+
+
+class CircuitState(Enum):
+    """Estados do circuit breaker de comunicação"""
+    CLOSED = "FECHADO"  # Operação normal
+    OPEN = "ABERTO"  # Host considerado morto: tentativas são puladas
+    HALF_OPEN = "SEMI_ABERTO"  # Uma tentativa de teste liberada
+
+
 class Turno(Enum):
     """Turnos de trabalho"""
     T1 = "TURNO 01"  # 06:00 - 14:30
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from typing import List, Optional, Dict, Any, Callable
+from datetime import datetime, date
 from .models import Machine, Downtime, Event, KPIData
 
 
@@ -12,6 +12,14 @@ class ICommunicationProtocol(ABC):
         """Lê um valor de uma tag"""
         pass
 
+    def read_values(self, machine: Machine, tags: List[str]) -> Dict[str, Optional[Any]]:
+        """
+        Lê várias tags de uma vez, retornando {tag: valor}.
+        Implementação padrão: uma leitura por tag (protocolos com leitura
+        em lote devem sobrescrever)
+        """
+        return {tag: self.read_value(machine, tag) for tag in tags}
+
     @abstractmethod
     def write_value(self, machine: Machine, tag: str, value: Any) -> bool:
         """Escreve um valor em uma tag"""
@@ -23,6 +31,40 @@ class ICommunicationProtocol(ABC):
         pass
 
 
+class ISubscriptionProtocol(ABC):
+    """Interface para protocolos de aquisição por push (notificações de mudança)"""
+
+    @abstractmethod
+    def subscribe(
+        self,
+        machines: List[Machine],
+        callback: Callable[[Machine, Optional[Any], bool], None]
+    ) -> List[Machine]:
+        """
+        Assina a tag de running das máquinas. O callback recebe
+        (máquina, valor, conectado). Retorna as máquinas assinadas com sucesso
+        """
+        pass
+
+    @abstractmethod
+    def check_subscriptions(self) -> None:
+        """Refaz assinaturas perdidas (queda de sessão/conexão)"""
+        pass
+
+    def timeout_silencio(self, machine: Machine) -> Optional[float]:
+        """
+        Segundos sem notificação após os quais a máquina é considerada sem
+        comunicação (publicador morto sem aviso). Implementação padrão: sem
+        limite (protocolos com keepalive de sessão detectam a queda sozinhos)
+        """
+        return None
+
+    @abstractmethod
+    def unsubscribe_all(self) -> None:
+        """Cancela todas as assinaturas"""
+        pass
+
+
 class IMachineRepository(ABC):
     """Interface para repositório de máquinas"""
 
@@ -51,6 +93,10 @@ class IMachineRepository(ABC):
         """Atualiza status de uma máquina"""
         pass
 
+    def flush(self) -> None:
+        """Publica o estado pendente (chamado ao fim de cada ciclo)"""
+        pass
+
 
 class IDowntimeRepository(ABC):
     """Interface para repositório de paradas"""
@@ -60,6 +106,17 @@ class IDowntimeRepository(ABC):
         """Salva uma parada e retorna UUID"""
         pass
 
+    def save_many(self, downtimes: List[Downtime]) -> List[str]:
+        """
+        Salva várias paradas de uma vez, retornando os UUIDs.
+        Implementação padrão: um save por parada
+        """
+        return [self.save(downtime) for downtime in downtimes]
+
+    def flush(self) -> None:
+        """Grava escritas pendentes (repositórios com write-behind)"""
+        pass
+
     @abstractmethod
     def get_by_machine(self, equipamento: str, data_inicio: datetime = None, data_fim: datetime = None) -> List[Downtime]:
         """Busca paradas de uma máquina"""
@@ -89,9 +146,54 @@ class IEventRepository(ABC):
         """Salva um evento"""
         pass
 
+    def save_many(self, events: List[Event]) -> None:
+        """
+        Salva vários eventos de uma vez.
+        Implementação padrão: um save por evento
+        """
+        for event in events:
+            self.save(event)
+
+    def flush(self) -> None:
+        """Grava escritas pendentes (repositórios com write-behind)"""
+        pass
+
+    @abstractmethod
+    def get_recent(self, limit: int = 100, maquina: str = None) -> List[Event]:
+        """Retorna eventos recentes (de todas as máquinas ou de uma)"""
+        pass
+
+
+class IDailyMetricsRepository(ABC):
+    """Interface para o rollup diário de paradas (uma linha por máquina por dia)"""
+
+    @abstractmethod
+    def registrar_parada(self, equipamento: str, data_inicial: datetime, data_final: datetime, turno: str) -> None:
+        """Soma uma parada encerrada aos dias que ela cobre"""
+        pass
+
+    @abstractmethod
+    def get_totais(self, data_inicio: date, data_fim: date, equipamento: str = None) -> Dict[str, Any]:
+        """Minutos parados, número de paradas e minutos por turno no período (dias inclusivos)"""
+        pass
+
+    @abstractmethod
+    def get_por_equipamento(self, data_inicio: date, data_fim: date, limit: int = None) -> List[Dict[str, Any]]:
+        """Totais por equipamento no período, ordenados por número de paradas"""
+        pass
+
+
+class IAnalyticsEngine(ABC):
+    """Interface para motor analítico sobre as paradas brutas (períodos com hora, sem rollup)"""
+
+    @abstractmethod
+    def get_totais(self, data_inicio: datetime, data_fim: datetime, equipamento: str = None) -> Dict[str, Any]:
+        """Minutos parados, número de paradas e minutos por turno das paradas encerradas que começaram no período"""
+        pass
+
     @abstractmethod
-    def get_recent(self, limit: int = 100) -> List[Event]:
-        """Retorna eventos recentes"""
+    def get_por_equipamento(self, data_inicio: datetime, data_fim: datetime, limit: int = None) -> List[Dict[str, Any]]:
+        """Totais por equipamento no período, ordenados por número de paradas"""
         pass
 
 
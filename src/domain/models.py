@@ -1,7 +1,7 @@
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional, Dict, Any
-from .enums import MachineStatus, CommunicationType, Turno
+from typing import Optional, Dict, Any, List
+from .enums import MachineStatus, CommunicationType, Turno, AcquisitionMode
 
 
 @dataclass
@@ -19,6 +19,8 @@ class CommunicationConfig:
     endpoint: str
     porta: Optional[int] = None
     node_id: Optional[str] = None
+    tags: Dict[str, str] = field(default_factory=dict)  # Tags extras: nome -> endereço
+    modo_aquisicao: AcquisitionMode = AcquisitionMode.POLLING
     parametros: Dict[str, Any] = field(default_factory=dict)
 
 
@@ -77,6 +79,20 @@ class Downtime:
         return 0.0
 
 
+@dataclass
+class HistoryFilter:
+    """Filtros do histórico de paradas (aplicados na consulta, não em memória)"""
+    data_inicio: Optional[datetime] = None
+    data_fim: Optional[datetime] = None
+    equipamentos: List[str] = field(default_factory=list)
+    planta: Optional[str] = None
+    setor: Optional[str] = None
+    turno: Optional[Turno] = None
+    motivo: Optional[str] = None  # Trecho do motivo
+    min_minutos: Optional[float] = None
+    apenas_encerradas: bool = False
+
+
 @dataclass
 class Event:
     """Evento de mudança de status"""
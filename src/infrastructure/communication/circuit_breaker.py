@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+from typing import Dict
+import threading
+import time
+from ...domain.enums import CircuitState
+
+
+@dataclass
+class _Circuito:
+    """Estado do circuito de um endpoint"""
+    estado: CircuitState = CircuitState.CLOSED
+    falhas_consecutivas: int = 0
+    aberturas_consecutivas: int = 0
+    aberto_ate: float = 0.0
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por endpoint/máquina
+
+    - CLOSED: tentativas normais; após limite_falhas falhas seguidas, abre
+    - OPEN: tentativas puladas (sem gastar timeout de socket/OPC) até o fim da janela
+    - HALF_OPEN: uma única tentativa de teste; sucesso fecha, falha reabre
+
+    A janela de abertura dobra a cada reabertura seguida, limitada a
+    janela_abertura_max, o que limita o tempo para detectar a recuperação.
+    """
+
+    def __init__(
+        self,
+        limite_falhas: int = 3,
+        janela_abertura: float = 30.0,
+        janela_abertura_max: float = 300.0
+    ):
+        self.limite_falhas = limite_falhas
+        self.janela_abertura = janela_abertura
+        self.janela_abertura_max = janela_abertura_max
+
+        self._circuitos: Dict[str, _Circuito] = {}
+        self._lock = threading.Lock()
+
+    def permitir(self, chave: str) -> bool:
+        """
+        Indica se uma tentativa pode ser feita. Ao fim da janela de abertura,
+        libera uma única tentativa de teste (HALF_OPEN)
+        """
+        with self._lock:
+            circuito = self._circuitos.get(chave)
+            if circuito is None or circuito.estado == CircuitState.CLOSED:
+                return True
+
+            if circuito.estado == CircuitState.OPEN and time.monotonic() >= circuito.aberto_ate:
+                circuito.estado = CircuitState.HALF_OPEN
+                return True
+
+            return False
+
+    def esta_aberto(self, chave: str) -> bool:
+        """Indica se o circuito está aberto (sem consumir a tentativa de teste)"""
+        with self._lock:
+            circuito = self._circuitos.get(chave)
+            return circuito is not None and circuito.estado == CircuitState.OPEN
+
+    def registrar_sucesso(self, chave: str):
+        """Tentativa bem sucedida: fecha o circuito"""
+        with self._lock:
+            circuito = self._circuitos.get(chave)
+            if circuito is None:
+                return
+            circuito.estado = CircuitState.CLOSED
+            circuito.falhas_consecutivas = 0
+            circuito.aberturas_consecutivas = 0
+
+    def registrar_falha(self, chave: str):
+        """Tentativa falhou: abre o circuito ao atingir o limite (ou no teste HALF_OPEN)"""
+        with self._lock:
+            circuito = self._circuitos.setdefault(chave, _Circuito())
+            circuito.falhas_consecutivas += 1
+
+            if circuito.estado == CircuitState.HALF_OPEN or circuito.falhas_consecutivas >= self.limite_falhas:
+                circuito.aberturas_consecutivas += 1
+                janela = min(
+                    self.janela_abertura_max,
+                    self.janela_abertura * 2 ** (circuito.aberturas_consecutivas - 1)
+                )
+                circuito.estado = CircuitState.OPEN
+                circuito.aberto_ate = time.monotonic() + janela
+
+    def estado(self, chave: str) -> CircuitState:
+        """Estado atual do circuito"""
+        with self._lock:
+            circuito = self._circuitos.get(chave)
+            return circuito.estado if circuito else CircuitState.CLOSED
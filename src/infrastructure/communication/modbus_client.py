@@ -0,0 +1,399 @@
+from dataclasses import dataclass, field
+from typing import Optional, Any, Dict, List, Tuple
+import itertools
+import socket
+import struct
+import threading
+from ...domain.models import Machine
+from ...domain.interfaces import ICommunicationProtocol
+from .circuit_breaker import CircuitBreaker
+
+
+PORTA_PADRAO = 502
+
+# Áreas de memória -> function code de leitura
+_FUNCOES_LEITURA = {'coil': 1, 'di': 2, 'hr': 3, 'ir': 4}
+_FUNCOES_BIT = {1, 2}
+
+# Limites do protocolo por requisição
+_MAX_QUANTIDADE = {1: 2000, 2: 2000, 3: 125, 4: 125}
+
+# Tipos de registrador: (nº de registradores, formato struct big-endian)
+_TIPOS = {
+    'u16': (1, '>H'),
+    'i16': (1, '>h'),
+    'u32': (2, '>I'),
+    'i32': (2, '>i'),
+    'f32': (2, '>f'),
+}
+
+
+class ModbusError(Exception):
+    """Resposta de exceção do dispositivo (endereço inválido, função não suportada...)"""
+
+    def __init__(self, funcao: int, codigo: int):
+        super().__init__(f"Exceção Modbus {codigo} na função {funcao}")
+        self.funcao = funcao
+        self.codigo = codigo
+
+
+@dataclass(frozen=True)
+class ModbusTag:
+    """
+    Endereço Modbus de uma tag
+
+    Sintaxe: "coil:10", "di:5", "hr:100", "ir:200", "hr:100.3" (bit 3 do
+    registrador) e "hr:100:u32" (tipos u16, i16, u32, i32, f32; big-endian)
+    """
+    funcao: int
+    endereco: int
+    bit: Optional[int] = None
+    tipo: str = 'u16'
+
+    @property
+    def quantidade(self) -> int:
+        if self.funcao in _FUNCOES_BIT:
+            return 1
+        return _TIPOS[self.tipo][0]
+
+
+def parse_tag(tag: str) -> ModbusTag:
+    """Converte a string da tag em ModbusTag (ValueError se inválida)"""
+    partes = tag.strip().lower().split(':')
+    if len(partes) not in (2, 3) or partes[0] not in _FUNCOES_LEITURA:
+        raise ValueError(f"Tag Modbus inválida: {tag}")
+
+    funcao = _FUNCOES_LEITURA[partes[0]]
+    tipo = partes[2] if len(partes) == 3 else 'u16'
+    if tipo not in _TIPOS or (funcao in _FUNCOES_BIT and len(partes) == 3):
+        raise ValueError(f"Tipo inválido na tag Modbus: {tag}")
+
+    endereco, _, bit = partes[1].partition('.')
+    if bit and (funcao in _FUNCOES_BIT or tipo != 'u16' or not 0 <= int(bit) <= 15):
+        raise ValueError(f"Bit inválido na tag Modbus: {tag}")
+
+    return ModbusTag(funcao=funcao, endereco=int(endereco), bit=int(bit) if bit else None, tipo=tipo)
+
+
+def agrupar_leituras(tags: List[ModbusTag], lacuna_max: int = 0) -> List[Tuple[int, int, int]]:
+    """
+    Junta endereços próximos da mesma área no menor número de leituras.
+    Retorna [(função, endereço inicial, quantidade)].
+
+    lacuna_max: endereços não usados que podem ser lidos para unir dois
+    blocos (0 = apenas contíguos; alguns dispositivos rejeitam leitura de
+    endereços não mapeados)
+    """
+    faixas_por_funcao: Dict[int, List[Tuple[int, int]]] = {}
+    for tag in tags:
+        faixas_por_funcao.setdefault(tag.funcao, []).append((tag.endereco, tag.endereco + tag.quantidade))
+
+    blocos = []
+    for funcao in sorted(faixas_por_funcao):
+        faixas = sorted(set(faixas_por_funcao[funcao]))
+        maximo = _MAX_QUANTIDADE[funcao]
+
+        inicio, fim = faixas[0]
+        for a, b in faixas[1:]:
+            if a <= fim + lacuna_max and max(fim, b) - inicio <= maximo:
+                fim = max(fim, b)
+            else:
+                blocos.append((funcao, inicio, fim - inicio))
+                inicio, fim = a, b
+        blocos.append((funcao, inicio, fim - inicio))
+
+    return blocos
+
+
+@dataclass
+class _Conexao:
+    """Conexão TCP persistente com um dispositivo"""
+    endpoint: str
+    sock: Optional[socket.socket] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    transacoes: Any = field(default_factory=lambda: itertools.count(1))
+
+
+class ModbusTCPClient(ICommunicationProtocol):
+    """
+    Cliente Modbus TCP implementando a interface de comunicação
+
+    - Uma conexão persistente por dispositivo (reconecta após erro de socket)
+    - Leitura em lote: endereços contíguos viram uma única requisição e as
+      requisições de áreas diferentes são enviadas em pipeline (todas de uma
+      vez, respostas casadas pelo transaction id), ou seja, um round-trip
+    - Circuit breaker por endpoint, como no cliente OPC
+    """
+
+    def __init__(
+        self,
+        timeout: float = 2.0,
+        lacuna_max: int = 0,
+        pipeline: bool = True,
+        circuit_breaker: Optional[CircuitBreaker] = None
+    ):
+        self.timeout = timeout
+        self.lacuna_max = lacuna_max
+        # Gateways seriais antigos podem não aceitar requisições em pipeline
+        self.pipeline = pipeline
+        self._breaker = circuit_breaker or CircuitBreaker()
+        self._conexoes: Dict[str, _Conexao] = {}
+        self._lock = threading.Lock()
+
+    # ---------- Interface ----------
+
+    def read_value(self, machine: Machine, tag: str) -> Optional[Any]:
+        """
+        Lê um valor de uma tag Modbus
+        """
+        return self.read_values(machine, [tag])[tag]
+
+    def read_values(self, machine: Machine, tags: List[str]) -> Dict[str, Optional[Any]]:
+        """
+        Lê várias tags Modbus no menor número de requisições possível
+        """
+        resultado: Dict[str, Optional[Any]] = {tag: None for tag in tags}
+
+        enderecos: Dict[str, ModbusTag] = {}
+        for tag in tags:
+            try:
+                enderecos[tag] = parse_tag(tag)
+            except ValueError as e:
+                print(f"Erro ao ler tag {tag} em {machine.nome}: {e}")
+        if not enderecos:
+            return resultado
+
+        blocos = agrupar_leituras(list(enderecos.values()), self.lacuna_max)
+        pdus = [struct.pack('>BHH', funcao, inicio, quantidade) for funcao, inicio, quantidade in blocos]
+
+        respostas = self._executar(machine, pdus)
+        if respostas is None:
+            return resultado
+
+        # Valores lidos por (função, endereço): bit ou registrador de 16 bits
+        memoria: Dict[Tuple[int, int], int] = {}
+        for (funcao, inicio, quantidade), resposta in zip(blocos, respostas):
+            if isinstance(resposta, ModbusError):
+                print(f"Erro ao ler {quantidade} endereço(s) a partir de {inicio} em {machine.nome}: {resposta}")
+                continue
+            memoria.update(self._decodificar_bloco(funcao, inicio, quantidade, resposta))
+
+        for tag, endereco in enderecos.items():
+            resultado[tag] = self._valor_da_tag(endereco, memoria)
+
+        return resultado
+
+    def write_value(self, machine: Machine, tag: str, value: Any) -> bool:
+        """
+        Escreve em uma coil (FC5) ou holding register (FC6/FC16)
+        """
+        try:
+            endereco = parse_tag(tag)
+        except ValueError as e:
+            print(f"Erro ao escrever tag {tag} em {machine.nome}: {e}")
+            return False
+
+        if endereco.funcao == 1:
+            pdu = struct.pack('>BHH', 5, endereco.endereco, 0xFF00 if value else 0x0000)
+        elif endereco.funcao == 3 and endereco.bit is None:
+            registros, formato = _TIPOS[endereco.tipo]
+            dados = struct.pack(formato, value)
+            if registros == 1:
+                pdu = struct.pack('>B', 6) + struct.pack('>H', endereco.endereco) + dados
+            else:
+                pdu = struct.pack('>BHHB', 16, endereco.endereco, registros, len(dados)) + dados
+        else:
+            print(f"Tag {tag} em {machine.nome} não permite escrita")
+            return False
+
+        respostas = self._executar(machine, [pdu])
+        if respostas is None or isinstance(respostas[0], ModbusError):
+            print(f"Erro ao escrever tag {tag} em {machine.nome}: {respostas[0] if respostas else 'sem conexão'}")
+            return False
+        return True
+
+    def check_connection(self, machine: Machine) -> bool:
+        """
+        Verifica se há conexão TCP com o dispositivo (reaproveita a conexão aberta)
+        """
+        endpoint = machine.comunicacao.endpoint
+        if not self._breaker.permitir(endpoint):
+            return False
+
+        conexao = self._get_conexao(endpoint)
+        with conexao.lock:
+            conectado = self._conectar(conexao)
+
+        if conectado:
+            self._breaker.registrar_sucesso(endpoint)
+        else:
+            self._breaker.registrar_falha(endpoint)
+        return conectado
+
+    def disconnect_all(self):
+        """Fecha todas as conexões"""
+        with self._lock:
+            conexoes = list(self._conexoes.values())
+            self._conexoes.clear()
+
+        for conexao in conexoes:
+            with conexao.lock:
+                self._fechar(conexao)
+
+    def __del__(self):
+        """Cleanup ao destruir o objeto"""
+        self.disconnect_all()
+
+    # ---------- Transporte ----------
+
+    def _get_conexao(self, endpoint: str) -> _Conexao:
+        with self._lock:
+            conexao = self._conexoes.get(endpoint)
+            if conexao is None:
+                conexao = _Conexao(endpoint=endpoint)
+                self._conexoes[endpoint] = conexao
+            return conexao
+
+    def _conectar(self, conexao: _Conexao) -> bool:
+        """Abre a conexão se necessário (chamar com conexao.lock)"""
+        if conexao.sock is not None:
+            return True
+
+        host, _, porta = conexao.endpoint.rpartition(':')
+        try:
+            sock = socket.create_connection((host, int(porta or PORTA_PADRAO)), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (OSError, ValueError) as e:
+            print(f"Erro ao conectar Modbus {conexao.endpoint}: {e}")
+            return False
+
+        conexao.sock = sock
+        return True
+
+    def _fechar(self, conexao: _Conexao):
+        """Fecha o socket da conexão (chamar com conexao.lock)"""
+        if conexao.sock is None:
+            return
+        try:
+            conexao.sock.close()
+        except OSError:
+            pass
+        conexao.sock = None
+
+    def _executar(self, machine: Machine, pdus: List[bytes]) -> Optional[List[Any]]:
+        """
+        Envia as requisições e retorna as respostas (PDU sem function code, ou
+        ModbusError) na mesma ordem. None se não houver conexão
+        """
+        endpoint = machine.comunicacao.endpoint
+        if self._breaker.esta_aberto(endpoint):
+            return None
+
+        unit_id = int(machine.comunicacao.parametros.get('unit_id', 1))
+        conexao = self._get_conexao(endpoint)
+
+        # Resultado vai para o circuit breaker, como no check_connection: um
+        # dispositivo que para de responder abre o circuito também nas leituras
+        # (exceção Modbus é resposta do dispositivo: conta como sucesso)
+        respostas = None
+        with conexao.lock:
+            if self._conectar(conexao):
+                try:
+                    if self.pipeline:
+                        respostas = self._trocar(conexao, unit_id, pdus)
+                    else:
+                        respostas = [resposta for pdu in pdus for resposta in self._trocar(conexao, unit_id, [pdu])]
+                except (OSError, ValueError) as e:
+                    # Conexão quebrada ou resposta inconsistente: reconecta na próxima leitura
+                    print(f"Erro de comunicação Modbus {endpoint}: {e}")
+                    self._fechar(conexao)
+
+        if respostas is None:
+            self._breaker.registrar_falha(endpoint)
+        else:
+            self._breaker.registrar_sucesso(endpoint)
+        return respostas
+
+    def _trocar(self, conexao: _Conexao, unit_id: int, pdus: List[bytes]) -> List[Any]:
+        """Envia os frames de uma vez e lê as respostas (casadas pelo transaction id)"""
+        pendentes: Dict[int, int] = {}
+        frames = []
+        for indice, pdu in enumerate(pdus):
+            transacao = next(conexao.transacoes) & 0xFFFF
+            pendentes[transacao] = indice
+            frames.append(struct.pack('>HHHB', transacao, 0, len(pdu) + 1, unit_id) + pdu)
+        conexao.sock.sendall(b''.join(frames))
+
+        respostas: List[Any] = [None] * len(pdus)
+        while pendentes:
+            transacao, _, tamanho, _ = struct.unpack('>HHHB', self._receber(conexao.sock, 7))
+            if tamanho < 2:
+                raise ValueError("PDU inválida")
+            pdu = self._receber(conexao.sock, tamanho - 1)
+
+            indice = pendentes.pop(transacao, None)
+            if indice is None:
+                continue  # Resposta atrasada de uma requisição anterior
+
+            funcao = pdu[0]
+            if funcao & 0x80:
+                if len(pdu) < 2:
+                    raise ValueError("PDU inválida")
+                respostas[indice] = ModbusError(funcao & 0x7F, pdu[1])
+            elif funcao != pdus[indice][0]:
+                raise ValueError(f"Resposta com função {funcao}, esperada {pdus[indice][0]}")
+            else:
+                respostas[indice] = self._validar_leitura(pdus[indice], pdu[1:])
+
+        return respostas
+
+    def _validar_leitura(self, requisicao: bytes, resposta: bytes) -> bytes:
+        """Confere o byte count da resposta de leitura com a quantidade pedida"""
+        funcao = requisicao[0]
+        if funcao not in _FUNCOES_LEITURA.values():
+            return resposta  # Escrita: a resposta é o eco da requisição
+
+        _, _, quantidade = struct.unpack('>BHH', requisicao)
+        esperado = (quantidade + 7) // 8 if funcao in _FUNCOES_BIT else 2 * quantidade
+        if not resposta or resposta[0] != len(resposta) - 1 or resposta[0] != esperado:
+            raise ValueError(f"PDU inválida: byte count {resposta[:1].hex() or 'ausente'}, esperado {esperado}")
+        return resposta
+
+    def _receber(self, sock: socket.socket, tamanho: int) -> bytes:
+        dados = b''
+        while len(dados) < tamanho:
+            parte = sock.recv(tamanho - len(dados))
+            if not parte:
+                raise ConnectionError("Conexão fechada pelo dispositivo")
+            dados += parte
+        return dados
+
+    # ---------- Decodificação ----------
+
+    def _decodificar_bloco(self, funcao: int, inicio: int, quantidade: int, resposta: bytes) -> Dict[Tuple[int, int], int]:
+        """Converte o payload da leitura em {(função, endereço): valor}"""
+        dados = resposta[1:1 + resposta[0]]
+
+        if funcao in _FUNCOES_BIT:
+            return {
+                (funcao, inicio + i): (dados[i // 8] >> (i % 8)) & 1
+                for i in range(min(quantidade, len(dados) * 8))
+            }
+
+        registros = struct.unpack(f'>{len(dados) // 2}H', dados)
+        return {(funcao, inicio + i): valor for i, valor in enumerate(registros)}
+
+    def _valor_da_tag(self, tag: ModbusTag, memoria: Dict[Tuple[int, int], int]) -> Optional[Any]:
+        if tag.funcao in _FUNCOES_BIT:
+            valor = memoria.get((tag.funcao, tag.endereco))
+            return None if valor is None else bool(valor)
+
+        registros, formato = _TIPOS[tag.tipo]
+        palavras = [memoria.get((tag.funcao, tag.endereco + i)) for i in range(registros)]
+        if None in palavras:
+            return None
+
+        if tag.bit is not None:
+            return bool((palavras[0] >> tag.bit) & 1)
+
+        return struct.unpack(formato, struct.pack(f'>{registros}H', *palavras))[0]
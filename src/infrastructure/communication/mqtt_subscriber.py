@@ -0,0 +1,270 @@
+from typing import Optional, Any, Dict, List, Callable, Tuple
+import json
+import threading
+import uuid
+import paho.mqtt.client as mqtt
+from ...domain.models import Machine
+from ...domain.interfaces import ISubscriptionProtocol
+
+
+PORTA_PADRAO = 1883
+TIMEOUT_SILENCIO_PADRAO = 300.0
+
+# Campos procurados em payloads JSON quando a máquina não define 'campo'
+_CAMPOS_PADRAO = ('running', 'rodando', 'estado', 'status', 'value', 'valor')
+_VERDADEIROS = {'1', 'true', 'on', 'running', 'rodando', 'produzindo'}
+_FALSOS = {'0', 'false', 'off', 'stopped', 'parada', 'parado'}
+# Payloads de Last Will: o publicador caiu (máquina sem comunicação)
+_OFFLINE = {'offline', 'desconectado', 'disconnected'}
+
+
+def payload_offline(payload: bytes) -> bool:
+    """Payload de Last Will publicado pelo broker quando o publicador cai"""
+    try:
+        return payload.decode('utf-8').strip().strip('"').lower() in _OFFLINE
+    except UnicodeDecodeError:
+        return False
+
+
+def parse_payload(payload: bytes, campo: Optional[str] = None) -> Optional[bool]:
+    """
+    Converte o payload MQTT no valor de running: JSON (objeto, bool ou número)
+    ou texto ("1"/"0", "true"/"false", "on"/"off"...). None se não reconhecido
+    """
+    try:
+        texto = payload.decode('utf-8').strip()
+    except UnicodeDecodeError:
+        return None
+
+    try:
+        valor = json.loads(texto)
+    except ValueError:
+        valor = texto
+
+    if isinstance(valor, dict):
+        campos = (campo,) if campo else _CAMPOS_PADRAO
+        valor = next((valor[c] for c in campos if c in valor), None)
+
+    if isinstance(valor, bool):
+        return valor
+    if isinstance(valor, (int, float)):
+        return valor != 0
+    if isinstance(valor, str):
+        valor = valor.strip().lower()
+        if valor in _VERDADEIROS:
+            return True
+        if valor in _FALSOS:
+            return False
+    return None
+
+
+class _Broker:
+    """Conexão com um broker e as máquinas que recebem mensagens dele"""
+
+    def __init__(self, endpoint: str, client: mqtt.Client):
+        self.endpoint = endpoint
+        self.client = client
+        self.maquinas: List[Machine] = []
+        # Tópico exato -> máquinas (caminho rápido); filtros com curinga à parte
+        self.por_topico: Dict[str, List[Machine]] = {}
+        self.por_filtro: List[Tuple[str, Machine]] = []
+        self.conectado = False
+        self.loop_iniciado = False
+
+
+class MQTTSubscriber(ISubscriptionProtocol):
+    """
+    Aquisição por push via MQTT
+
+    Uma conexão por broker (endpoint "mqtt://host:porta"). O node_id da máquina
+    é o tópico de estado, podendo usar curingas (+ e #). Se 'filtros' for
+    informado, assina apenas esses filtros (ex: "fabrica/+/+/estado") em vez de
+    um tópico por máquina, e cada mensagem é roteada para as máquinas cujo
+    tópico casa com o recebido.
+
+    A reconexão é feita pelo loop do paho; as assinaturas são refeitas no
+    on_connect e a queda é repassada ao callback como conectado=False.
+
+    Convenção para os publicadores (a queda do broker é detectada aqui, a do
+    publicador não):
+    - publicar o estado com retain e republicá-lo periodicamente (heartbeat),
+      com intervalo menor que o timeout de silêncio
+    - registrar como Last Will, no próprio tópico de estado, o payload
+      "offline" (com retain): o broker o publica quando o publicador cai e a
+      máquina vai na hora para sem comunicação
+    Publicador que some sem Last Will é pego pelo timeout de silêncio
+    (timeout_silencio, ou "timeout_silencio" da máquina no config.json): o
+    MonitorService passa a máquina a SEM REDE, inclusive se ela nunca publicou.
+    """
+
+    def __init__(
+        self,
+        filtros: Optional[List[str]] = None,
+        qos: int = 1,
+        keepalive: int = 30,
+        usuario: Optional[str] = None,
+        senha: Optional[str] = None,
+        prefixo_client_id: str = "ind4-monitor",
+        timeout_silencio: Optional[float] = TIMEOUT_SILENCIO_PADRAO
+    ):
+        self.filtros = list(filtros or [])
+        self.qos = qos
+        self.keepalive = keepalive
+        self.usuario = usuario
+        self.senha = senha
+        self.prefixo_client_id = prefixo_client_id
+        self._timeout_silencio = timeout_silencio
+
+        self._callback: Optional[Callable[[Machine, Optional[Any], bool], None]] = None
+        self._brokers: Dict[str, _Broker] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(
+        self,
+        machines: List[Machine],
+        callback: Callable[[Machine, Optional[Any], bool], None]
+    ) -> List[Machine]:
+        """
+        Registra as máquinas pelo tópico (node_id) e conecta aos brokers
+        """
+        self._callback = callback
+
+        assinadas = []
+        for maquina in machines:
+            topico = maquina.comunicacao.node_id
+            if not topico:
+                continue
+
+            broker = self._get_broker(maquina.comunicacao.endpoint)
+            with self._lock:
+                if any(m.api_id == maquina.api_id for m in broker.maquinas):
+                    continue
+                broker.maquinas.append(maquina)
+                if '+' in topico or '#' in topico:
+                    broker.por_filtro.append((topico, maquina))
+                else:
+                    broker.por_topico.setdefault(topico, []).append(maquina)
+
+            # Já conectado: assina o tópico novo (senão o on_connect assina tudo)
+            if broker.conectado and not self.filtros:
+                broker.client.subscribe(topico, self.qos)
+            assinadas.append(maquina)
+
+        for broker in list(self._brokers.values()):
+            self._conectar(broker)
+
+        return assinadas
+
+    def check_subscriptions(self) -> None:
+        """
+        Reabre brokers cuja conexão inicial falhou e reporta os desconectados
+        """
+        for broker in list(self._brokers.values()):
+            if not broker.conectado:
+                self._conectar(broker)
+                self._notificar_desconexao(broker)
+
+    def timeout_silencio(self, machine: Machine) -> Optional[float]:
+        """Timeout da máquina (config.json) ou o padrão do subscriber"""
+        return machine.comunicacao.parametros.get('timeout_silencio', self._timeout_silencio)
+
+    def unsubscribe_all(self) -> None:
+        """Desconecta de todos os brokers"""
+        with self._lock:
+            brokers = list(self._brokers.values())
+            self._brokers.clear()
+
+        for broker in brokers:
+            try:
+                broker.client.disconnect()
+                broker.client.loop_stop()
+            except Exception:
+                pass
+
+    def _get_broker(self, endpoint: str) -> _Broker:
+        with self._lock:
+            broker = self._brokers.get(endpoint)
+            if broker is not None:
+                return broker
+
+            client = mqtt.Client(
+                mqtt.CallbackAPIVersion.VERSION2,
+                client_id=f"{self.prefixo_client_id}-{uuid.uuid4().hex[:8]}"
+            )
+            if self.usuario:
+                client.username_pw_set(self.usuario, self.senha)
+            client.reconnect_delay_set(min_delay=1, max_delay=30)
+
+            broker = _Broker(endpoint, client)
+            client.on_connect = lambda c, u, flags, rc, props: self._on_connect(broker, rc)
+            client.on_disconnect = lambda c, u, flags, rc, props: self._on_disconnect(broker, rc)
+            client.on_message = lambda c, u, msg: self._on_message(broker, msg)
+
+            self._brokers[endpoint] = broker
+            return broker
+
+    def _conectar(self, broker: _Broker):
+        """Inicia a conexão assíncrona e o loop de rede do broker (uma vez; o loop reconecta sozinho)"""
+        if broker.loop_iniciado:
+            return
+
+        host, porta = self._endereco(broker.endpoint)
+        try:
+            broker.client.connect_async(host, porta, keepalive=self.keepalive)
+            broker.client.loop_start()
+            broker.loop_iniciado = True
+        except Exception as e:
+            print(f"Erro ao conectar MQTT {broker.endpoint}: {e}")
+
+    def _endereco(self, endpoint: str) -> Tuple[str, int]:
+        endereco = endpoint.split('://', 1)[-1]
+        host, _, porta = endereco.partition(':')
+        return host, int(porta or PORTA_PADRAO)
+
+    def _on_connect(self, broker: _Broker, reason_code):
+        if reason_code.is_failure:
+            print(f"Conexão MQTT recusada por {broker.endpoint}: {reason_code}")
+            return
+
+        with self._lock:
+            if self.filtros:
+                topicos = list(self.filtros)
+            else:
+                topicos = list(broker.por_topico) + [filtro for filtro, _ in broker.por_filtro]
+
+        if topicos:
+            broker.client.subscribe([(topico, self.qos) for topico in dict.fromkeys(topicos)])
+        broker.conectado = True
+
+    def _on_disconnect(self, broker: _Broker, reason_code):
+        if broker.conectado:
+            print(f"Conexão MQTT perdida com {broker.endpoint}: {reason_code}")
+        broker.conectado = False
+        self._notificar_desconexao(broker)
+
+    def _on_message(self, broker: _Broker, msg):
+        if self._callback is None:
+            return
+
+        with self._lock:
+            maquinas = list(broker.por_topico.get(msg.topic, []))
+            maquinas.extend(
+                maquina for filtro, maquina in broker.por_filtro
+                if mqtt.topic_matches_sub(filtro, msg.topic)
+            )
+
+        if payload_offline(msg.payload):
+            for maquina in maquinas:
+                self._callback(maquina, None, False)
+            return
+
+        for maquina in maquinas:
+            valor = parse_payload(msg.payload, maquina.comunicacao.parametros.get('campo'))
+            self._callback(maquina, valor, True)
+
+    def _notificar_desconexao(self, broker: _Broker):
+        """Informa ao callback que as máquinas do broker estão sem conexão"""
+        if self._callback is None:
+            return
+        for maquina in list(broker.maquinas):
+            self._callback(maquina, None, False)
@@ -1,16 +1,15 @@
-from typing import Optional, Any
-import socket
-import subprocess
-import platform
+from typing import Optional, Any, Dict, List
 from ...domain.models import Machine
 from ...domain.interfaces import ICommunicationProtocol
+from .reachability_prober import ReachabilityProber, ProbeResult
 
 
 class NetworkClient(ICommunicationProtocol):
     """Cliente para verificação de conectividade de rede"""
 
-    def __init__(self, timeout: int = 1):
+    def __init__(self, timeout: int = 1, prober: Optional[ReachabilityProber] = None):
         self.timeout = timeout
+        self.prober = prober or ReachabilityProber(timeout=timeout)
 
     def read_value(self, machine: Machine, tag: str) -> Optional[Any]:
         """
@@ -30,45 +29,22 @@ class NetworkClient(ICommunicationProtocol):
         """
         return self.ping(machine.ip)
 
-    def ping(self, host: str) -> bool:
+    def check_connections(self, machines: List[Machine]) -> Dict[str, bool]:
         """
-        Executa ping no host
+        Verifica a conectividade de várias máquinas em um único lote
+        Retorna {api_id: alcançável}
         """
-        # Método 1: Usando socket (mais rápido)
-        if self._check_socket(host):
-            return True
-
-        # Método 2: Ping via subprocess (fallback)
-        return self._check_ping(host)
+        resultados = self.probe([m.ip for m in machines])
+        return {m.api_id: resultados[m.ip].alcancavel for m in machines}
 
-    def _check_socket(self, host: str, port: int = 80) -> bool:
+    def ping(self, host: str) -> bool:
         """
-        Verifica conectividade usando socket
+        Verifica se o host responde (ICMP sem privilégio ou TCP não bloqueante)
         """
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(self.timeout)
-            result = sock.connect_ex((host, port))
-            sock.close()
-            return result == 0
-        except:
-            return False
+        return self.prober.probe([host])[host].alcancavel
 
-    def _check_ping(self, host: str) -> bool:
+    def probe(self, hosts: List[str]) -> Dict[str, ProbeResult]:
         """
-        Executa comando ping do sistema
+        Verifica vários hosts com um único deadline, retornando alcance e RTT
         """
-        try:
-            param = '-n' if platform.system().lower() == 'windows' else '-c'
-            command = ['ping', param, '1', '-w', str(self.timeout * 1000), host]
-
-            result = subprocess.run(
-                command,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                timeout=self.timeout + 1
-            )
-
-            return result.returncode == 0
-        except:
-            return False
+        return self.prober.probe(hosts)
@@ -1,61 +1,130 @@
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List
 from opcua import Client, ua
 import socket
 from ...domain.models import Machine
 from ...domain.interfaces import ICommunicationProtocol
+from .opc_session_pool import OPCSessionPool, is_session_error
+from .circuit_breaker import CircuitBreaker
+from ...domain.enums import CircuitState
 
 
 class OPCUAClient(ICommunicationProtocol):
     """Cliente OPC UA implementando a interface de comunicação"""
 
-    def __init__(self, timeout: int = 2):
+    def __init__(
+        self,
+        timeout: int = 2,
+        pool: Optional[OPCSessionPool] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        porta_rede: Optional[int] = 80
+    ):
         self.timeout = timeout
-        self._clients_cache: Dict[str, Client] = {}
+        # Porta do teste de rede antes do OPC (None: usa a porta do próprio endpoint OPC)
+        self.porta_rede = porta_rede
+        self._pool = pool or OPCSessionPool(timeout=timeout)
+        self._breaker = circuit_breaker or CircuitBreaker()
 
-    def _get_client(self, machine: Machine) -> Optional[Client]:
+    def _get_client(self, machine: Machine, ignorar_backoff: bool = False) -> Optional[Client]:
         """
-        Retorna um client OPC UA para a máquina (com cache)
+        Retorna um client OPC UA para a máquina (sessão persistente do pool)
         """
         endpoint = machine.comunicacao.endpoint
 
-        if endpoint in self._clients_cache:
-            return self._clients_cache[endpoint]
+        # Circuito aberto: host considerado morto, não gasta o timeout de conexão
+        if self._breaker.esta_aberto(endpoint):
+            return None
+
+        return self._pool.acquire(endpoint, ignorar_backoff=ignorar_backoff)
 
+    def _tratar_erro(self, machine: Machine, erro: Exception):
+        """Descarta a sessão se o erro indicar conexão perdida"""
+        if is_session_error(erro):
+            self._pool.invalidate(machine.comunicacao.endpoint)
+
+    def _parse_node_id(self, machine: Machine, tag: str) -> Optional[ua.NodeId]:
+        """NodeId da tag, ou None se mal formada (erro da tag: não derruba a sessão)"""
         try:
-            client = Client(endpoint, timeout=self.timeout)
-            client.connect()
-            self._clients_cache[endpoint] = client
-            return client
+            return ua.NodeId.from_string(tag)
         except Exception as e:
-            print(f"Erro ao conectar OPC {endpoint}: {e}")
+            print(f"Tag inválida {tag} em {machine.nome}: {e}")
             return None
 
     def read_value(self, machine: Machine, tag: str) -> Optional[Any]:
         """
         Lê um valor de uma tag OPC
         """
+        node_id = self._parse_node_id(machine, tag)
+        if node_id is None:
+            return None
+
         client = self._get_client(machine)
         if not client:
             return None
 
         try:
-            node = client.get_node(tag)
+            node = client.get_node(node_id)
             value = node.get_value()
             return value
         except Exception as e:
             print(f"Erro ao ler tag {tag} em {machine.nome}: {e}")
+            self._tratar_erro(machine, e)
             return None
 
+    def read_values(self, machine: Machine, tags: List[str]) -> Dict[str, Optional[Any]]:
+        """
+        Lê várias tags OPC em um único Read (um ReadValueId por tag)
+        """
+        resultado: Dict[str, Optional[Any]] = {tag: None for tag in tags}
+
+        # NodeIds inválidos ficam como None; erro de parsing não é erro de sessão
+        validas = []
+        params = ua.ReadParameters()
+        for tag in tags:
+            node_id = self._parse_node_id(machine, tag)
+            if node_id is None:
+                continue
+            rv = ua.ReadValueId()
+            rv.NodeId = node_id
+            rv.AttributeId = ua.AttributeIds.Value
+            params.NodesToRead.append(rv)
+            validas.append(tag)
+
+        if not validas:
+            return resultado
+
+        client = self._get_client(machine)
+        if not client:
+            return resultado
+
+        try:
+            data_values = client.uaclient.read(params)
+        except Exception as e:
+            print(f"Erro ao ler tags {validas} em {machine.nome}: {e}")
+            self._tratar_erro(machine, e)
+            return resultado
+
+        for tag, data_value in zip(validas, data_values):
+            if data_value.StatusCode.is_good():
+                resultado[tag] = data_value.Value.Value
+            else:
+                print(f"Erro ao ler tag {tag} em {machine.nome}: {data_value.StatusCode}")
+
+        return resultado
+
     def write_value(self, machine: Machine, tag: str, value: Any) -> bool:
         """
         Escreve um valor em uma tag OPC
         """
+        node_id = self._parse_node_id(machine, tag)
+        if node_id is None:
+            return False
+
         client = self._get_client(machine)
         if not client:
             return False
 
         try:
-            node = client.get_node(tag)
+            node = client.get_node(node_id)
 
             # Determina o tipo de dado
             data_type = node.get_data_type_as_variant_type()
@@ -74,19 +143,36 @@ class OPCUAClient(ICommunicationProtocol):
             return True
         except Exception as e:
             print(f"Erro ao escrever tag {tag} em {machine.nome}: {e}")
+            self._tratar_erro(machine, e)
             return False
 
     def check_connection(self, machine: Machine) -> bool:
         """
         Verifica se há conexão com a máquina (ping + OPC)
         """
-        # Primeiro faz ping na rede
-        if not self._check_network(machine.ip):
+        endpoint = machine.comunicacao.endpoint
+
+        # Circuito aberto: pula a verificação (máquina segue como SEM_REDE pelo debounce)
+        if not self._breaker.permitir(endpoint):
             return False
 
-        # Depois tenta conectar OPC
-        client = self._get_client(machine)
-        return client is not None
+        # Tentativa de teste (HALF_OPEN) não espera o backoff de reconexão do pool
+        em_teste = self._breaker.estado(endpoint) == CircuitState.HALF_OPEN
+
+        conectado = False
+        try:
+            # Primeiro faz ping na rede, depois tenta conectar OPC
+            conectado = (
+                self._check_network(machine.ip, self.porta_rede or machine.comunicacao.porta or 4840)
+                and self._get_client(machine, ignorar_backoff=em_teste) is not None
+            )
+        finally:
+            if conectado:
+                self._breaker.registrar_sucesso(endpoint)
+            else:
+                self._breaker.registrar_falha(endpoint)
+
+        return conectado
 
     def _check_network(self, ip: str, port: int = 80) -> bool:
         """
@@ -102,13 +188,8 @@ class OPCUAClient(ICommunicationProtocol):
             return False
 
     def disconnect_all(self):
-        """Desconecta todos os clients OPC em cache"""
-        for client in self._clients_cache.values():
-            try:
-                client.disconnect()
-            except:
-                pass
-        self._clients_cache.clear()
+        """Desconecta todas as sessões OPC do pool"""
+        self._pool.close_all()
 
     def __del__(self):
         """Cleanup ao destruir o objeto"""
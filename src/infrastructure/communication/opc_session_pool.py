@@ -0,0 +1,182 @@
+from dataclasses import dataclass, field
+from typing import Optional, Dict
+import concurrent.futures
+import threading
+import time
+from opcua import Client, ua
+
+
+# Status codes que indicam sessão/canal perdido (a sessão precisa ser recriada)
+_CODIGOS_SESSAO_PERDIDA = {
+    ua.StatusCodes.BadSessionIdInvalid,
+    ua.StatusCodes.BadSessionClosed,
+    ua.StatusCodes.BadSessionNotActivated,
+    ua.StatusCodes.BadSecureChannelIdInvalid,
+    ua.StatusCodes.BadSecureChannelClosed,
+    ua.StatusCodes.BadConnectionClosed,
+    ua.StatusCodes.BadServerNotConnected,
+    ua.StatusCodes.BadTimeout,
+}
+
+
+# Erros de transporte: socket fechado/recusado e timeout da requisição
+_ERROS_TRANSPORTE = (OSError, EOFError, concurrent.futures.TimeoutError)
+
+
+def is_session_error(erro: Exception) -> bool:
+    """
+    Indica se o erro invalida a sessão (rede/canal) ou é só da tag (ex: BadNodeIdUnknown,
+    NodeId mal formado)
+    """
+    if isinstance(erro, ua.UaStatusCodeError):
+        return getattr(erro, 'code', None) in _CODIGOS_SESSAO_PERDIDA
+    return isinstance(erro, _ERROS_TRANSPORTE)
+
+
+@dataclass
+class _Sessao:
+    """Estado de uma sessão OPC UA no pool"""
+    endpoint: str
+    client: Optional[Client] = None
+    ultimo_uso: float = 0.0
+    ultimo_health_check: float = 0.0
+    falhas: int = 0
+    proxima_tentativa: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class OPCSessionPool:
+    """
+    Pool de sessões OPC UA persistentes, indexado por endpoint
+
+    - Mantém uma sessão aberta por endpoint (o handshake só acontece na conexão)
+    - Health check periódico (leitura do ServerStatus) para detectar sessões mortas
+    - Reconexão com backoff exponencial limitado
+    - Descarta sessões ociosas
+    """
+
+    def __init__(
+        self,
+        timeout: int = 2,
+        intervalo_health_check: float = 30.0,
+        tempo_ocioso_max: float = 300.0,
+        backoff_inicial: float = 1.0,
+        backoff_max: float = 60.0
+    ):
+        self.timeout = timeout
+        self.intervalo_health_check = intervalo_health_check
+        self.tempo_ocioso_max = tempo_ocioso_max
+        self.backoff_inicial = backoff_inicial
+        self.backoff_max = backoff_max
+
+        self._sessoes: Dict[str, _Sessao] = {}
+        self._lock = threading.Lock()
+        self._ultima_limpeza = time.monotonic()
+
+    def acquire(self, endpoint: str, ignorar_backoff: bool = False) -> Optional[Client]:
+        """
+        Retorna um client conectado para o endpoint, ou None se indisponível
+        (falha de conexão ou aguardando o backoff)
+        """
+        self._evict_idle()
+
+        with self._lock:
+            sessao = self._sessoes.get(endpoint)
+            if sessao is None:
+                sessao = _Sessao(endpoint=endpoint, ultimo_uso=time.monotonic())
+                self._sessoes[endpoint] = sessao
+
+        with sessao.lock:
+            agora = time.monotonic()
+
+            # Health check da sessão existente
+            if sessao.client is not None and agora - sessao.ultimo_health_check >= self.intervalo_health_check:
+                if self._is_alive(sessao.client):
+                    sessao.ultimo_health_check = agora
+                else:
+                    print(f"Sessão OPC {endpoint} morta, reconectando")
+                    self._descartar(sessao)
+
+            if sessao.client is not None:
+                sessao.ultimo_uso = agora
+                return sessao.client
+
+            # Respeita o backoff entre tentativas de reconexão
+            if agora < sessao.proxima_tentativa and not ignorar_backoff:
+                return None
+
+            try:
+                client = Client(sessao.endpoint, timeout=self.timeout)
+                client.connect()
+            except Exception as e:
+                sessao.falhas += 1
+                espera = min(self.backoff_max, self.backoff_inicial * 2 ** (sessao.falhas - 1))
+                sessao.proxima_tentativa = agora + espera
+                # Tentativa conta como uso: a limpeza de ociosas não zera o backoff
+                sessao.ultimo_uso = agora
+                print(f"Erro ao conectar OPC {endpoint}: {e} (nova tentativa em {espera:.0f}s)")
+                return None
+
+            sessao.client = client
+            sessao.falhas = 0
+            sessao.proxima_tentativa = 0.0
+            sessao.ultimo_uso = agora
+            sessao.ultimo_health_check = agora
+            return client
+
+    def invalidate(self, endpoint: str):
+        """Descarta a sessão do endpoint (a próxima chamada a acquire reconecta)"""
+        with self._lock:
+            sessao = self._sessoes.get(endpoint)
+        if sessao is None:
+            return
+
+        with sessao.lock:
+            self._descartar(sessao)
+
+    def close_all(self):
+        """Desconecta todas as sessões do pool"""
+        with self._lock:
+            sessoes = list(self._sessoes.values())
+            self._sessoes.clear()
+
+        for sessao in sessoes:
+            with sessao.lock:
+                self._descartar(sessao)
+
+    def _evict_idle(self):
+        """Fecha sessões sem uso há mais de tempo_ocioso_max"""
+        agora = time.monotonic()
+        if agora - self._ultima_limpeza < min(self.tempo_ocioso_max, 60.0):
+            return
+        self._ultima_limpeza = agora
+
+        with self._lock:
+            ociosas = [
+                s for s in self._sessoes.values()
+                if agora - s.ultimo_uso > self.tempo_ocioso_max
+            ]
+            for sessao in ociosas:
+                self._sessoes.pop(sessao.endpoint, None)
+
+        for sessao in ociosas:
+            with sessao.lock:
+                self._descartar(sessao)
+
+    def _is_alive(self, client: Client) -> bool:
+        """Lê o estado do servidor (round-trip leve) para validar a sessão"""
+        try:
+            client.get_node(ua.NodeId(ua.ObjectIds.Server_ServerStatus_State)).get_value()
+            return True
+        except Exception:
+            return False
+
+    def _descartar(self, sessao: _Sessao):
+        """Desconecta e remove o client da sessão (chamar com sessao.lock)"""
+        if sessao.client is None:
+            return
+        try:
+            sessao.client.disconnect()
+        except:
+            pass
+        sessao.client = None
@@ -0,0 +1,176 @@
+from typing import Optional, Any, Dict, List, Callable
+import threading
+from opcua import Client
+from ...domain.models import Machine
+from ...domain.interfaces import ISubscriptionProtocol
+from .opc_session_pool import OPCSessionPool
+
+
+class _DataChangeHandler:
+    """Handler chamado pela thread de subscription do python-opcua"""
+
+    def __init__(self, manager: 'OPCSubscriptionManager', endpoint: str):
+        self.manager = manager
+        self.endpoint = endpoint
+
+    def datachange_notification(self, node, val, data):
+        self.manager._on_datachange(self.endpoint, node, val)
+
+    def event_notification(self, event):
+        pass
+
+    def status_change_notification(self, status):
+        # Keep-alive/publish falhou: sessão perdida
+        self.manager._on_session_lost(self.endpoint)
+
+
+class _Assinatura:
+    """Assinatura ativa de um endpoint (uma subscription por sessão)"""
+
+    def __init__(self, client: Client, subscription, maquinas_por_node: Dict[Any, List[Machine]]):
+        self.client = client
+        self.subscription = subscription
+        self.maquinas_por_node = maquinas_por_node
+        self.ativa = True
+
+
+class OPCSubscriptionManager(ISubscriptionProtocol):
+    """
+    Aquisição por push via subscriptions OPC UA (monitored items na tag de running)
+
+    Uma subscription por endpoint, com um monitored item por máquina. As
+    notificações de mudança são repassadas ao callback (mesmo pipeline de
+    status/filtros do MonitorService). Usa as sessões do OPCSessionPool.
+    """
+
+    def __init__(self, pool: OPCSessionPool, intervalo_publicacao_ms: int = 500):
+        self._pool = pool
+        self.intervalo_publicacao_ms = intervalo_publicacao_ms
+
+        self._callback: Optional[Callable[[Machine, Optional[Any], bool], None]] = None
+        self._maquinas_por_endpoint: Dict[str, List[Machine]] = {}
+        self._assinaturas: Dict[str, _Assinatura] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(
+        self,
+        machines: List[Machine],
+        callback: Callable[[Machine, Optional[Any], bool], None]
+    ) -> List[Machine]:
+        """
+        Cria monitored items para a tag de running de cada máquina
+        """
+        self._callback = callback
+
+        novos_endpoints = set()
+        for maquina in machines:
+            if not maquina.comunicacao.node_id:
+                continue
+            endpoint = maquina.comunicacao.endpoint
+            registradas = self._maquinas_por_endpoint.setdefault(endpoint, [])
+            if any(m.api_id == maquina.api_id for m in registradas):
+                continue
+            registradas.append(maquina)
+            novos_endpoints.add(endpoint)
+
+        assinadas = []
+        for endpoint in novos_endpoints:
+            if self._assinar_endpoint(endpoint):
+                assinadas.extend(self._maquinas_por_endpoint[endpoint])
+
+        return assinadas
+
+    def check_subscriptions(self) -> None:
+        """
+        Refaz a subscription dos endpoints cuja sessão caiu ou foi recriada pelo pool
+        """
+        for endpoint in list(self._maquinas_por_endpoint):
+            with self._lock:
+                assinatura = self._assinaturas.get(endpoint)
+
+            client = self._pool.acquire(endpoint)
+            if assinatura and assinatura.ativa and client is assinatura.client:
+                continue
+
+            if client is None:
+                self._notificar_desconexao(endpoint)
+                continue
+
+            self._assinar_endpoint(endpoint)
+
+    def unsubscribe_all(self) -> None:
+        """Remove todas as subscriptions"""
+        with self._lock:
+            assinaturas = list(self._assinaturas.values())
+            self._assinaturas.clear()
+
+        for assinatura in assinaturas:
+            try:
+                assinatura.subscription.delete()
+            except:
+                pass
+
+    def _assinar_endpoint(self, endpoint: str) -> bool:
+        """Cria a subscription e os monitored items de um endpoint"""
+        client = self._pool.acquire(endpoint)
+        if client is None:
+            return False
+
+        maquinas = self._maquinas_por_endpoint.get(endpoint, [])
+        try:
+            nodes = []
+            maquinas_por_node: Dict[Any, List[Machine]] = {}
+            for maquina in maquinas:
+                node = client.get_node(maquina.comunicacao.node_id)
+                if node.nodeid not in maquinas_por_node:
+                    nodes.append(node)
+                maquinas_por_node.setdefault(node.nodeid, []).append(maquina)
+
+            # Registra antes de assinar: a notificação inicial chega logo após o subscribe
+            handler = _DataChangeHandler(self, endpoint)
+            subscription = client.create_subscription(self.intervalo_publicacao_ms, handler)
+            assinatura = _Assinatura(client, subscription, maquinas_por_node)
+
+            with self._lock:
+                anterior = self._assinaturas.get(endpoint)
+                self._assinaturas[endpoint] = assinatura
+
+            if anterior is not None:
+                try:
+                    anterior.subscription.delete()
+                except:
+                    pass
+
+            subscription.subscribe_data_change(nodes)
+            return True
+        except Exception as e:
+            print(f"Erro ao assinar tags OPC em {endpoint}: {e}")
+            with self._lock:
+                self._assinaturas.pop(endpoint, None)
+            self._pool.invalidate(endpoint)
+            return False
+
+    def _on_datachange(self, endpoint: str, node, valor):
+        with self._lock:
+            assinatura = self._assinaturas.get(endpoint)
+        if assinatura is None or self._callback is None:
+            return
+
+        for maquina in assinatura.maquinas_por_node.get(node.nodeid, []):
+            self._callback(maquina, valor, True)
+
+    def _on_session_lost(self, endpoint: str):
+        with self._lock:
+            assinatura = self._assinaturas.get(endpoint)
+            if assinatura is not None:
+                assinatura.ativa = False
+
+        self._pool.invalidate(endpoint)
+        self._notificar_desconexao(endpoint)
+
+    def _notificar_desconexao(self, endpoint: str):
+        """Informa ao callback que as máquinas do endpoint estão sem conexão"""
+        if self._callback is None:
+            return
+        for maquina in self._maquinas_por_endpoint.get(endpoint, []):
+            self._callback(maquina, None, False)
@@ -0,0 +1,288 @@
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Tuple, Iterable
+import errno
+import itertools
+import math
+import os
+import selectors
+import socket
+import struct
+import time
+
+
+# Erros de connect que provam que o host respondeu (RST): host alcançável
+_ERROS_HOST_ATIVO = {errno.ECONNREFUSED, getattr(errno, 'WSAECONNREFUSED', errno.ECONNREFUSED)}
+_ERROS_EM_ANDAMENTO = {
+    errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY,
+    getattr(errno, 'WSAEWOULDBLOCK', errno.EWOULDBLOCK)
+}
+
+_ICMP_ECHO_REQUEST = 8
+_ICMP_ECHO_REPLY = 0
+
+
+@dataclass
+class ProbeResult:
+    """Resultado da verificação de alcance de um host"""
+    host: str
+    alcancavel: bool
+    rtt_ms: Optional[float] = None
+    metodo: str = ""  # "icmp", "tcp:<porta>" ou "" (sem resposta)
+
+
+class ReachabilityProber:
+    """
+    Verifica o alcance de muitos hosts em paralelo, em um único processo/thread
+
+    - ICMP echo via socket datagrama sem privilégio (Linux/macOS, quando permitido)
+    - TCP connect não bloqueante nas portas configuradas (conexão aceita ou
+      recusada com RST = host ativo)
+
+    Os dois métodos rodam no mesmo loop de selectors com um deadline único
+    para o lote inteiro. Cada connect TCP tem prazo próprio (o deadline
+    dividido pelo número de janelas de max_sockets necessárias): hosts que
+    não respondem liberam o socket a tempo de todos os pares (host, porta)
+    serem tentados.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 1.0,
+        portas_tcp: Iterable[int] = (80, 4840),
+        usar_icmp: bool = True,
+        max_sockets: int = 256,
+        recusa_conta_como_ativo: bool = True
+    ):
+        self.timeout = timeout
+        self.portas_tcp = tuple(portas_tcp)
+        self.usar_icmp = usar_icmp
+        self.max_sockets = max_sockets
+        # Conexão recusada (RST) prova que o host está ligado; desligar se houver
+        # firewall intermediário respondendo RST em nome dos hosts
+        self.recusa_conta_como_ativo = recusa_conta_como_ativo
+        self._icmp_seq = itertools.count(1)
+
+    def probe(self, hosts: List[str]) -> Dict[str, ProbeResult]:
+        """
+        Verifica todos os hosts dentro de um único deadline (self.timeout)
+        """
+        inicio = time.monotonic()
+        deadline = inicio + self.timeout
+        resultados: Dict[str, ProbeResult] = {}
+
+        enderecos: Dict[str, str] = {}
+        for host in dict.fromkeys(hosts):
+            endereco = self._resolver(host)
+            if endereco is None:
+                resultados[host] = ProbeResult(host=host, alcancavel=False)
+            else:
+                enderecos[host] = endereco
+
+        total_hosts = len(set(hosts))
+        seletor = selectors.DefaultSelector()
+        try:
+            icmp_sock, icmp_pendentes = self._iniciar_icmp(seletor, enderecos)
+
+            # Fila de tentativas TCP (host, porta); abertas em janela de max_sockets
+            fila_tcp: List[Tuple[str, int]] = [
+                (host, porta) for host in enderecos for porta in self.portas_tcp
+            ]
+            fila_tcp.reverse()
+            tcp_abertos: Dict[socket.socket, Tuple[str, int, float]] = {}
+            janelas = max(1, math.ceil(len(fila_tcp) / self.max_sockets))
+            prazo_tcp = self.timeout / janelas
+
+            while len(resultados) < total_hosts:
+                agora = time.monotonic()
+                if agora >= deadline:
+                    break
+
+                self._abrir_tcp(seletor, fila_tcp, tcp_abertos, enderecos, resultados, agora)
+
+                if not tcp_abertos and not fila_tcp and not icmp_pendentes:
+                    break
+
+                espera = deadline - agora
+                if tcp_abertos:
+                    primeiro = min(inicio_tcp for _, _, inicio_tcp in tcp_abertos.values())
+                    espera = min(espera, primeiro + prazo_tcp - agora)
+                for chave, _ in seletor.select(timeout=max(0.0, espera)):
+                    sock = chave.fileobj
+                    if sock is icmp_sock:
+                        self._ler_icmp(icmp_sock, icmp_pendentes, resultados)
+                    else:
+                        self._concluir_tcp(seletor, sock, tcp_abertos, resultados)
+
+                # Hosts já resolvidos não precisam das demais tentativas; connect
+                # sem resposta no prazo libera o socket para o próximo da fila
+                agora = time.monotonic()
+                for sock, (host, _, inicio_tcp) in list(tcp_abertos.items()):
+                    if host in resultados or agora - inicio_tcp >= prazo_tcp:
+                        self._fechar(seletor, sock, tcp_abertos)
+                fila_tcp[:] = [(h, p) for h, p in fila_tcp if h not in resultados]
+                for chave_icmp in [k for k, (h, _) in icmp_pendentes.items() if h in resultados]:
+                    icmp_pendentes.pop(chave_icmp, None)
+
+            for sock in list(tcp_abertos):
+                self._fechar(seletor, sock, tcp_abertos)
+            if icmp_sock is not None:
+                seletor.unregister(icmp_sock)
+                icmp_sock.close()
+        finally:
+            seletor.close()
+
+        for host in hosts:
+            if host not in resultados:
+                resultados[host] = ProbeResult(host=host, alcancavel=False)
+
+        return resultados
+
+    def _resolver(self, host: str) -> Optional[str]:
+        try:
+            socket.inet_aton(host)
+            return host
+        except OSError:
+            pass
+        try:
+            return socket.gethostbyname(host)
+        except OSError:
+            return None
+
+    # ---------- ICMP ----------
+
+    def _iniciar_icmp(self, seletor, enderecos: Dict[str, str]):
+        """
+        Envia um echo request para cada host por um socket ICMP datagrama.
+        Retorna (socket, {(endereço, seq): (host, instante_envio)})
+        """
+        pendentes: Dict[Tuple[str, int], Tuple[str, float]] = {}
+        if not self.usar_icmp or not enderecos:
+            return None, pendentes
+
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        except (OSError, AttributeError):
+            # Sem permissão (ping_group_range) ou plataforma sem suporte: só TCP
+            return None, pendentes
+
+        sock.setblocking(False)
+        identificador = os.getpid() & 0xFFFF
+        for host, endereco in enderecos.items():
+            seq = next(self._icmp_seq) & 0xFFFF
+            pacote = self._montar_echo(identificador, seq)
+            try:
+                sock.sendto(pacote, (endereco, 0))
+                pendentes[(endereco, seq)] = (host, time.monotonic())
+            except OSError:
+                continue
+
+        if not pendentes:
+            sock.close()
+            return None, pendentes
+
+        seletor.register(sock, selectors.EVENT_READ)
+        return sock, pendentes
+
+    def _ler_icmp(self, sock, pendentes, resultados: Dict[str, ProbeResult]):
+        while True:
+            try:
+                dados, (endereco, _) = sock.recvfrom(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+
+            # macOS entrega o cabeçalho IP junto; Linux entrega só o ICMP
+            if len(dados) >= 20 and dados[0] >> 4 == 4:
+                dados = dados[(dados[0] & 0x0F) * 4:]
+            if len(dados) < 8:
+                continue
+
+            tipo, _, _, _, seq = struct.unpack('!BBHHH', dados[:8])
+            if tipo != _ICMP_ECHO_REPLY:
+                continue
+
+            pendente = pendentes.pop((endereco, seq), None)
+            if pendente is None:
+                continue
+
+            host, enviado_em = pendente
+            if host not in resultados:
+                resultados[host] = ProbeResult(
+                    host=host,
+                    alcancavel=True,
+                    rtt_ms=round((time.monotonic() - enviado_em) * 1000, 2),
+                    metodo="icmp"
+                )
+
+    def _montar_echo(self, identificador: int, seq: int) -> bytes:
+        payload = b'ind4-probe'
+        cabecalho = struct.pack('!BBHHH', _ICMP_ECHO_REQUEST, 0, 0, identificador, seq)
+        checksum = self._checksum(cabecalho + payload)
+        cabecalho = struct.pack('!BBHHH', _ICMP_ECHO_REQUEST, 0, checksum, identificador, seq)
+        return cabecalho + payload
+
+    def _checksum(self, dados: bytes) -> int:
+        if len(dados) % 2:
+            dados += b'\x00'
+        soma = sum(struct.unpack(f'!{len(dados) // 2}H', dados))
+        soma = (soma >> 16) + (soma & 0xFFFF)
+        soma += soma >> 16
+        return ~soma & 0xFFFF
+
+    # ---------- TCP ----------
+
+    def _abrir_tcp(self, seletor, fila, abertos, enderecos, resultados, agora: float):
+        """Abre connects não bloqueantes até o limite de sockets simultâneos"""
+        while fila and len(abertos) < self.max_sockets:
+            host, porta = fila.pop()
+            if host in resultados:
+                continue
+
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            codigo = sock.connect_ex((enderecos[host], porta))
+
+            if self._tcp_respondeu(codigo):
+                sock.close()
+                resultados[host] = ProbeResult(
+                    host=host, alcancavel=True,
+                    rtt_ms=round((time.monotonic() - agora) * 1000, 2),
+                    metodo=f"tcp:{porta}"
+                )
+                continue
+
+            if codigo not in _ERROS_EM_ANDAMENTO:
+                sock.close()
+                continue
+
+            seletor.register(sock, selectors.EVENT_WRITE)
+            abertos[sock] = (host, porta, agora)
+
+    def _concluir_tcp(self, seletor, sock, abertos, resultados: Dict[str, ProbeResult]):
+        host, porta, inicio = abertos[sock]
+        codigo = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        self._fechar(seletor, sock, abertos)
+
+        if host in resultados:
+            return
+
+        if self._tcp_respondeu(codigo):
+            resultados[host] = ProbeResult(
+                host=host, alcancavel=True,
+                rtt_ms=round((time.monotonic() - inicio) * 1000, 2),
+                metodo=f"tcp:{porta}"
+            )
+
+    def _tcp_respondeu(self, codigo: int) -> bool:
+        if codigo == 0:
+            return True
+        return self.recusa_conta_como_ativo and codigo in _ERROS_HOST_ATIVO
+
+    def _fechar(self, seletor, sock, abertos):
+        abertos.pop(sock, None)
+        try:
+            seletor.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        sock.close()
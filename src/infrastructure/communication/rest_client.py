@@ -0,0 +1,227 @@
+from dataclasses import dataclass
+from typing import Optional, Any, Dict, List, Tuple
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from ...domain.models import Machine
+from ...domain.interfaces import ICommunicationProtocol
+from .circuit_breaker import CircuitBreaker
+
+
+@dataclass
+class _EntradaCache:
+    """Última resposta válida de uma URL e seus validadores HTTP"""
+    dados: Any
+    etag: Optional[str]
+    last_modified: Optional[str]
+    obtido_em: float
+
+
+class ConditionalSession:
+    """
+    Sessão HTTP com conexões keep-alive em pool e requisições condicionais
+
+    - Reaproveita conexões TCP entre ciclos (HTTPAdapter com pool por host)
+    - Envia If-None-Match / If-Modified-Since; resposta 304 devolve o JSON em cache
+    - max_idade: respostas mais novas que isso são servidas sem nova requisição
+      (várias máquinas lidas do mesmo documento no ciclo geram um único GET)
+    """
+
+    def __init__(self, timeout: float = 3.0, pool_maxsize: int = 32, headers: Optional[Dict[str, str]] = None):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept': 'application/json', **(headers or {})})
+
+        self._cache: Dict[str, _EntradaCache] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+        self.estatisticas = {'requisicoes': 0, 'nao_modificados': 0, 'cache': 0}
+
+    def get_json(self, url: str, max_idade: float = 0.0) -> Any:
+        """
+        GET condicional de um documento JSON.
+        Levanta requests.RequestException em erro de transporte ou HTTP
+        """
+        with self._lock:
+            lock_url = self._locks.setdefault(url, threading.Lock())
+
+        # Uma requisição por URL por vez: as demais threads aproveitam o resultado
+        with lock_url:
+            entrada = self._cache.get(url)
+            agora = time.monotonic()
+            if entrada is not None and max_idade and agora - entrada.obtido_em < max_idade:
+                self.estatisticas['cache'] += 1
+                return entrada.dados
+
+            headers = {}
+            if entrada is not None:
+                if entrada.etag:
+                    headers['If-None-Match'] = entrada.etag
+                if entrada.last_modified:
+                    headers['If-Modified-Since'] = entrada.last_modified
+
+            self.estatisticas['requisicoes'] += 1
+            resposta = self.session.get(url, headers=headers, timeout=self.timeout)
+
+            if resposta.status_code == 304 and entrada is not None:
+                self.estatisticas['nao_modificados'] += 1
+                entrada.obtido_em = agora
+                return entrada.dados
+
+            resposta.raise_for_status()
+            dados = resposta.json()
+            self._cache[url] = _EntradaCache(
+                dados=dados,
+                etag=resposta.headers.get('ETag'),
+                last_modified=resposta.headers.get('Last-Modified'),
+                obtido_em=agora
+            )
+            return dados
+
+    def close(self):
+        """Fecha as conexões do pool"""
+        self.session.close()
+
+
+class RestAPIClient(ICommunicationProtocol):
+    """
+    Cliente REST (gateways HTTP/JSON) implementando a interface de comunicação
+
+    Tags no formato "<caminho>#<campo>":
+    - caminho: relativo ao endpoint da máquina ou URL absoluta
+    - campo: caminho no JSON separado por pontos; índice numérico para listas
+      e "chave=valor" para o primeiro item da lista com item[chave] == valor
+    - {api_id}, {nome} e {ip} são substituídos pelos dados da máquina
+
+    Ex: "/api/maquinas/{api_id}#estado.running" (um documento por máquina) ou
+    "/api/maquinas#id={api_id}.running" (documento em lote: todas as máquinas
+    do gateway saem de um único GET por ciclo)
+    """
+
+    def __init__(
+        self,
+        timeout: float = 2.0,
+        max_idade: float = 1.0,
+        pool_maxsize: int = 32,
+        sessao: Optional[ConditionalSession] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None
+    ):
+        self.timeout = timeout
+        self.max_idade = max_idade
+        self.sessao = sessao or ConditionalSession(timeout=timeout, pool_maxsize=pool_maxsize)
+        self._breaker = circuit_breaker or CircuitBreaker()
+
+    def read_value(self, machine: Machine, tag: str) -> Optional[Any]:
+        """
+        Lê um valor de uma tag REST
+        """
+        return self.read_values(machine, [tag])[tag]
+
+    def read_values(self, machine: Machine, tags: List[str]) -> Dict[str, Optional[Any]]:
+        """
+        Lê várias tags com um GET por documento distinto
+        """
+        resultado: Dict[str, Optional[Any]] = {tag: None for tag in tags}
+
+        por_url: Dict[str, List[Tuple[str, str]]] = {}
+        for tag in tags:
+            url, campo = self._resolver_tag(machine, tag)
+            por_url.setdefault(url, []).append((tag, campo))
+
+        for url, itens in por_url.items():
+            try:
+                documento = self.sessao.get_json(url, self.max_idade)
+            except (requests.RequestException, ValueError) as e:
+                print(f"Erro ao ler {url} para {machine.nome}: {e}")
+                continue
+
+            for tag, campo in itens:
+                resultado[tag] = self._extrair(documento, campo)
+
+        return resultado
+
+    def write_value(self, machine: Machine, tag: str, value: Any) -> bool:
+        """
+        Não suportado: gateways REST são usados somente para leitura
+        """
+        return False
+
+    def check_connection(self, machine: Machine) -> bool:
+        """
+        Verifica se o gateway responde (qualquer resposta HTTP conta como conectado)
+        """
+        endpoint = machine.comunicacao.endpoint
+        if not self._breaker.permitir(endpoint):
+            return False
+
+        # Usa o documento da tag de running: a leitura logo em seguida sai do cache
+        if machine.comunicacao.node_id:
+            url, _ = self._resolver_tag(machine, machine.comunicacao.node_id)
+        else:
+            url = endpoint
+
+        try:
+            self.sessao.get_json(url, self.max_idade)
+            conectado = True
+        except requests.HTTPError:
+            conectado = True
+        except (requests.RequestException, ValueError):
+            conectado = False
+
+        if conectado:
+            self._breaker.registrar_sucesso(endpoint)
+        else:
+            self._breaker.registrar_falha(endpoint)
+        return conectado
+
+    def fetch_bulk(self, url: str, chave: str) -> Dict[Any, Any]:
+        """
+        Busca um documento em lote (lista de recursos) e indexa por item[chave]
+        """
+        documento = self.sessao.get_json(url, self.max_idade)
+        return {item.get(chave): item for item in documento if isinstance(item, dict)}
+
+    def disconnect_all(self):
+        """Fecha as conexões do pool"""
+        self.sessao.close()
+
+    def _resolver_tag(self, machine: Machine, tag: str) -> Tuple[str, str]:
+        """Separa a tag em (URL absoluta, campo), substituindo os dados da máquina"""
+        caminho, _, campo = tag.partition('#')
+        valores = {'api_id': machine.api_id, 'nome': machine.nome, 'ip': machine.ip}
+        caminho = caminho.format(**valores)
+        campo = campo.format(**valores)
+
+        if not caminho.startswith(('http://', 'https://')):
+            caminho = f"{machine.comunicacao.endpoint.rstrip('/')}/{caminho.lstrip('/')}"
+        return caminho, campo
+
+    def _extrair(self, documento: Any, campo: str) -> Optional[Any]:
+        """Percorre o JSON pelo caminho do campo (None se não existir)"""
+        valor = documento
+        for parte in filter(None, campo.split('.')):
+            if isinstance(valor, list):
+                if parte.isdigit():
+                    indice = int(parte)
+                    valor = valor[indice] if indice < len(valor) else None
+                elif '=' in parte:
+                    chave, _, esperado = parte.partition('=')
+                    valor = next(
+                        (item for item in valor if isinstance(item, dict) and str(item.get(chave)) == esperado),
+                        None
+                    )
+                else:
+                    return None
+            elif isinstance(valor, dict):
+                valor = valor.get(parte)
+            else:
+                return None
+
+            if valor is None:
+                return None
+        return valor
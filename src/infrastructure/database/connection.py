@@ -1,28 +1,92 @@
 import sqlite3
-from typing import Optional
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Iterable, List, Tuple
 import os
+import threading
+from .migrations import aplicar_migracoes
+
+
+# Aplicados em toda conexão (escritora e leitoras). Em WAL, synchronous=NORMAL
+# não corrompe o banco numa queda de energia (só perde os últimos commits)
+PRAGMAS_PADRAO: Dict[str, Any] = {
+    'synchronous': 'NORMAL',
+    'cache_size': -32000,        # KiB (negativo): ~32 MB por conexão
+    'mmap_size': 268435456,      # 256 MB de leitura via mmap
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,        # ms esperando o lock antes de "database is locked"
+}
 
 
 class DatabaseConnection:
-    """Gerenciador de conexão com SQLite"""
+    """
+    Gerenciador de conexões com SQLite: uma conexão escritora (compartilhada,
+    serializada pelo _write_lock) e uma conexão somente leitura por thread.
+    Em WAL, as leituras não esperam as escritas do scanner nem umas pelas outras
+    """
 
-    def __init__(self, db_name: str = "monitoramento.db"):
+    def __init__(self, db_name: str = "monitoramento.db", pragmas: Dict[str, Any] = None):
         self.db_name = db_name
+        self.pragmas = {**PRAGMAS_PADRAO, **(pragmas or {})}
         self._connection: Optional[sqlite3.Connection] = None
-    
+        # Serializa as escritas: uma transação em lote não pode ser intercalada com outro commit
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        # thread -> conexão leitora (para fechar as de threads que já terminaram)
+        self._leitores: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._leitores_lock = threading.Lock()
+
+    def _abrir(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma, valor in self.pragmas.items():
+            conn.execute(f"PRAGMA {pragma}={valor}")
+        return conn
+
+    def _em_memoria(self) -> bool:
+        """Banco em memória existe só na conexão que o criou: sem leitoras separadas"""
+        return self.db_name in ('', ':memory:') or 'mode=memory' in self.db_name
+
     def connect(self) -> sqlite3.Connection :
-        """Cria ou retorna conexão existente"""
+        """Cria ou retorna a conexão escritora (usar com o _write_lock / transaction())"""
         if self._connection is None :
-            self._connection = sqlite3.connect(self.db_name, check_same_thread=False)
-            self._connection.row_factory = sqlite3.Row
-            
-            # AXIOM HOTFIX: Ativa concorrência real
-            self._connection.execute("PRAGMA journal_mode=WAL;")
+            with self._write_lock:
+                if self._connection is None:
+                    conn = self._abrir()
+                    # AXIOM HOTFIX: Ativa concorrência real
+                    conn.execute("PRAGMA journal_mode=WAL;")
+                    self._connection = conn
         
         return self._connection
 
+    def reader(self) -> sqlite3.Connection:
+        """Conexão somente leitura da thread atual (criada na primeira leitura da thread)"""
+        if self._em_memoria():
+            return self.connect()
+
+        conn = getattr(self._local, 'leitor', None)
+        if conn is None:
+            self.connect()  # garante o arquivo criado e em WAL antes da primeira leitora
+            conn = self._abrir()
+            conn.execute("PRAGMA query_only=ON")
+            self._local.leitor = conn
+            with self._leitores_lock:
+                self._fechar_leitores_orfaos()
+                self._leitores[threading.current_thread()] = conn
+        return conn
+
+    def _fechar_leitores_orfaos(self):
+        """Threads de curta duração (ex: cada execução do Streamlit) deixam a leitora para trás"""
+        for thread in [t for t in self._leitores if not t.is_alive()]:
+            self._leitores.pop(thread).close()
+
     def close(self):
-        """Fecha a conexão"""
+        """Fecha a conexão escritora e as leitoras"""
+        with self._leitores_lock:
+            leitores, self._leitores = self._leitores, {}
+        for conn in leitores.values():
+            conn.close()
+        self._local = threading.local()
+
         if self._connection:
             self._connection.close()
             self._connection = None
@@ -52,22 +116,6 @@ class DatabaseConnection:
             )
         ''')
 
-        # Índices para performance
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_equipamento
-            ON historico_paradas(equipamento)
-        ''')
-
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_data_inicial
-            ON historico_paradas(data_inicial)
-        ''')
-
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_data_final
-            ON historico_paradas(data_final)
-        ''')
-
         # Tabela de eventos (log bruto)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS eventos (
@@ -79,11 +127,6 @@ class DatabaseConnection:
             )
         ''')
 
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_eventos_timestamp
-            ON eventos(timestamp)
-        ''')
-
         # Tabela de métricas diárias (nova)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS metricas_diarias (
@@ -101,31 +144,73 @@ class DatabaseConnection:
             )
         ''')
 
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_metricas_data
-            ON metricas_diarias(data)
-        ''')
-
         conn.commit()
 
+        # Índices e evolução do schema (versionada por PRAGMA user_version)
+        with self._write_lock:
+            aplicar_migracoes(conn)
+
     def execute_query(self, query: str, params: tuple = ()):
         """Executa uma query e retorna o cursor"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        conn.commit()
-        return cursor
+        with self._write_lock:
+            conn = self.connect()
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            conn.commit()
+            return cursor
+
+    @contextmanager
+    def transaction(self):
+        """Transação de escrita: commit ao final do bloco, rollback em caso de erro"""
+        with self._write_lock:
+            conn = self.connect()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def execute_many(self, query: str, params_list: Iterable[tuple]) -> int:
+        """Executa a mesma query para vários parâmetros em uma única transação"""
+        return self.execute_batch([(query, params) for params in params_list])
+
+    def execute_batch(self, comandos: List[Tuple[str, tuple]]) -> int:
+        """
+        Executa vários comandos (query, params) em uma única transação, na ordem.
+        Comandos consecutivos com a mesma query viram um executemany.
+        Retorna o número de comandos executados
+        """
+        if not comandos:
+            return 0
+
+        with self._write_lock:
+            conn = self.connect()
+            try:
+                inicio = 0
+                while inicio < len(comandos):
+                    query = comandos[inicio][0]
+                    fim = inicio
+                    while fim < len(comandos) and comandos[fim][0] == query:
+                        fim += 1
+                    conn.executemany(query, [params for _, params in comandos[inicio:fim]])
+                    inicio = fim
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return len(comandos)
 
     def fetch_all(self, query: str, params: tuple = ()):
-        """Executa query e retorna todos os resultados"""
-        conn = self.connect()
+        """Executa query (na leitora da thread) e retorna todos os resultados"""
+        conn = self.reader()
         cursor = conn.cursor()
         cursor.execute(query, params)
         return cursor.fetchall()
 
     def fetch_one(self, query: str, params: tuple = ()):
-        """Executa query e retorna um resultado"""
-        conn = self.connect()
+        """Executa query (na leitora da thread) e retorna um resultado"""
+        conn = self.reader()
         cursor = conn.cursor()
         cursor.execute(query, params)
         return cursor.fetchone()
\ No newline at end of file
@@ -0,0 +1,265 @@
+"""
+Motor analítico embutido (DuckDB) sobre o histórico de paradas e eventos.
+
+Mantém um espelho colunar de historico_paradas e eventos em um arquivo
+.duckdb local (sem servidor), atualizado de forma incremental a partir do
+SQLite: o serviço de monitoramento continua gravando só no SQLite. O
+AnalyticsService (motor_analitico) usa o espelho para KPIs, Pareto e turnos
+em qualquer período, com a frota inteira. Carga inicial / atualização avulsa:
+    python -m src.infrastructure.database.duckdb_analytics monitoramento.db --destino analytics.duckdb
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta
+import argparse
+import threading
+import time
+from .connection import DatabaseConnection
+from .migrations import _EXPR_EPOCH as _EXPR_EPOCH_TEXTO
+from .metrics_rollup import COLUNAS_TURNO
+from .repositories import DowntimeRepository
+from ...domain.interfaces import IAnalyticsEngine
+from ...domain.models import HistoryFilter
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+_COLUNAS_PARADAS = ['uuid', 'equipamento', 'planta', 'setor', 'data_inicial', 'data_final',
+                    'minutos_parado', 'motivo', 'turno']
+
+_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS paradas (
+        uuid VARCHAR PRIMARY KEY,
+        equipamento VARCHAR NOT NULL,
+        planta VARCHAR,
+        setor VARCHAR,
+        data_inicial TIMESTAMP NOT NULL,
+        data_final TIMESTAMP,
+        minutos_parado DOUBLE,
+        motivo VARCHAR,
+        turno VARCHAR
+    )
+    ''',
+    # Só recebe linhas novas (id crescente): sem chave primária, a carga é um append
+    '''
+    CREATE TABLE IF NOT EXISTS eventos (
+        id BIGINT NOT NULL,
+        timestamp TIMESTAMP,
+        maquina VARCHAR NOT NULL,
+        status_anterior VARCHAR,
+        status_novo VARCHAR NOT NULL
+    )
+    ''',
+]
+
+_SQL_EVENTOS = f'''
+    SELECT id, COALESCE(timestamp_ts, {_EXPR_EPOCH_TEXTO.format(coluna='timestamp')}),
+           maquina, status_anterior, status_novo
+    FROM eventos WHERE id > ? ORDER BY id LIMIT ?
+'''
+
+
+class DuckDBAnalyticsEngine(IAnalyticsEngine):
+    """
+    Espelho DuckDB do histórico e consultas analíticas vetorizadas.
+
+    A cada consulta, se a última sincronização tem mais de intervalo_sync
+    segundos, o espelho é atualizado antes: paradas a partir da mais recente
+    já espelhada (menos a margem, para gravações atrasadas) e as ainda abertas,
+    eventos a partir do último id. Paradas removidas do SQLite pela retenção
+    continuam no espelho.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseConnection,
+        caminho: str = 'analytics.duckdb',
+        intervalo_sync: Optional[float] = 60,
+        margem: timedelta = timedelta(hours=1),
+        tamanho_lote: int = 50000
+    ):
+        if duckdb is None:
+            raise RuntimeError("duckdb não instalado (pip install duckdb)")
+
+        self.db = db
+        self.downtime_repo = DowntimeRepository(db)
+        self.caminho = caminho
+        self.intervalo_sync = intervalo_sync
+        self.margem = margem
+        self.tamanho_lote = tamanho_lote
+        # Um único processo abre o arquivo para escrita; cada thread consulta por um cursor próprio
+        self._con = duckdb.connect(caminho)
+        for comando in _SCHEMA:
+            self._con.execute(comando)
+        self._sync_lock = threading.Lock()
+        self._ultima_sync: Optional[float] = None
+
+    # ============== Sincronização ==============
+
+    def sincronizar(self, completo: bool = False) -> Tuple[int, int]:
+        """
+        Copia do SQLite as paradas novas ou alteradas e os eventos novos.
+        completo=True relê todas as paradas do banco quente (ex: importação de
+        paradas antigas). Retorna (paradas, eventos) copiados
+        """
+        with self._sync_lock:
+            return self._sincronizar(completo)
+
+    def _sincronizar(self, completo: bool) -> Tuple[int, int]:
+        import pandas as pd
+
+        # Uma transação: uma carga interrompida não deixa o espelho adiantado
+        # (a janela da próxima sincronização parte do que foi confirmado)
+        self._con.execute('BEGIN TRANSACTION')
+        try:
+            paradas = 0
+            for lote in self._lotes_paradas(completo):
+                self._con.register('lote', pd.DataFrame(lote, columns=_COLUNAS_PARADAS))
+                self._con.execute(f'''
+                    INSERT OR REPLACE INTO paradas
+                    SELECT {", ".join(_COLUNAS_PARADAS)} FROM lote WHERE data_inicial IS NOT NULL
+                ''')
+                paradas += len(lote['uuid'])
+
+            eventos = 0
+            ultimo_id = self._con.execute('SELECT COALESCE(MAX(id), 0) FROM eventos').fetchone()[0]
+            while True:
+                cursor = self.db.reader().cursor()
+                cursor.row_factory = None
+                rows = cursor.execute(_SQL_EVENTOS, (ultimo_id, self.tamanho_lote)).fetchall()
+                if not rows:
+                    break
+                self._con.register('lote', pd.DataFrame(
+                    rows, columns=['id', 'timestamp_ts', 'maquina', 'status_anterior', 'status_novo']
+                ))
+                self._con.execute('''
+                    INSERT INTO eventos
+                    SELECT id, make_timestamp(CAST(timestamp_ts AS BIGINT) * 1000000),
+                           maquina, status_anterior, status_novo
+                    FROM lote
+                ''')
+                eventos += len(rows)
+                ultimo_id = rows[-1][0]
+
+            self._con.execute('COMMIT')
+        except Exception:
+            self._con.execute('ROLLBACK')
+            raise
+        finally:
+            self._con.unregister('lote')
+
+        self._ultima_sync = time.monotonic()
+        return paradas, eventos
+
+    def _lotes_paradas(self, completo: bool) -> Iterator[Dict[str, Any]]:
+        """
+        Paradas a copiar, em colunas: todas (completo ou espelho vazio) ou as que
+        começaram depois da mais recente espelhada (menos a margem) e as que o
+        espelho ainda tem como abertas, relidas pelo uuid (podem ter encerrado)
+        """
+        ultima = self._con.execute('SELECT MAX(data_inicial) FROM paradas').fetchone()[0]
+        if completo or ultima is None:
+            yield from self.downtime_repo.iter_history(HistoryFilter(), _COLUNAS_PARADAS, self.tamanho_lote)
+            return
+
+        yield from self.downtime_repo.iter_history(
+            HistoryFilter(data_inicio=ultima - self.margem), _COLUNAS_PARADAS, self.tamanho_lote
+        )
+        abertas = [row[0] for row in self._con.execute(
+            'SELECT uuid FROM paradas WHERE data_final IS NULL AND data_inicial < ?', [ultima - self.margem]
+        ).fetchall()]
+        yield from self.downtime_repo.fetch_by_uuids(abertas, _COLUNAS_PARADAS)
+
+    def _atualizar(self):
+        """Sincroniza se o espelho estiver velho; se outra thread já sincroniza, lê o estado atual"""
+        if self.intervalo_sync is None:
+            return
+        if self._ultima_sync is not None and time.monotonic() - self._ultima_sync < self.intervalo_sync:
+            return
+        if self._sync_lock.acquire(blocking=False):
+            try:
+                self._sincronizar(False)
+            finally:
+                self._sync_lock.release()
+
+    # ============== Consultas ==============
+
+    def _executar(self, query: str, params: List[Any]):
+        self._atualizar()
+        return self._con.cursor().execute(query, params)
+
+    def get_totais(self, data_inicio: datetime, data_fim: datetime, equipamento: str = None) -> Dict[str, Any]:
+        """Minutos parados, paradas e minutos por turno das paradas encerradas que começaram no período"""
+        por_turno = ', '.join('COALESCE(SUM(minutos_parado) FILTER (WHERE turno = ?), 0)' for _ in COLUNAS_TURNO)
+        query = f'''
+            SELECT COALESCE(SUM(minutos_parado), 0), COUNT(*), {por_turno}
+            FROM paradas
+            WHERE data_inicial BETWEEN ? AND ? AND data_final IS NOT NULL
+        '''
+        params: List[Any] = [*COLUNAS_TURNO, data_inicio, data_fim]
+        if equipamento:
+            query += ' AND equipamento = ?'
+            params.append(equipamento)
+
+        row = self._executar(query, params).fetchone()
+        return {
+            'minutos_parado': row[0],
+            'numero_paradas': row[1],
+            'turnos': dict(zip(COLUNAS_TURNO, row[2:]))
+        }
+
+    def get_por_equipamento(self, data_inicio: datetime, data_fim: datetime, limit: int = None) -> List[Dict[str, Any]]:
+        """Totais por equipamento no período, do que mais parou para o que menos parou"""
+        query = '''
+            SELECT equipamento, COUNT(*) AS total_paradas, COALESCE(SUM(minutos_parado), 0) AS tempo_total
+            FROM paradas
+            WHERE data_inicial BETWEEN ? AND ? AND data_final IS NOT NULL
+            GROUP BY equipamento
+            ORDER BY total_paradas DESC, tempo_total DESC
+        '''
+        params: List[Any] = [data_inicio, data_fim]
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+
+        cursor = self._executar(query, params)
+        colunas = [descricao[0] for descricao in cursor.description]
+        return [dict(zip(colunas, row)) for row in cursor.fetchall()]
+
+    def consultar(self, query: str, params: List[Any] = None):
+        """Consulta livre no espelho (tabelas paradas e eventos) como pandas.DataFrame"""
+        return self._executar(query, params or []).df()
+
+    def close(self):
+        self._con.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Atualiza o espelho DuckDB do histórico e mostra os totais do período")
+    parser.add_argument('banco', nargs='?', default='monitoramento.db')
+    parser.add_argument('--destino', default='analytics.duckdb')
+    parser.add_argument('--completo', action='store_true', help="relê todas as paradas do banco quente")
+    parser.add_argument('--dias', type=int, default=365, help="período do relatório de conferência")
+    args = parser.parse_args()
+
+    db = DatabaseConnection(args.banco)
+    motor = DuckDBAnalyticsEngine(db, args.destino, intervalo_sync=None)
+
+    inicio = time.perf_counter()
+    paradas, eventos = motor.sincronizar(args.completo)
+    print(f"🦆 Espelho atualizado: {paradas} parada(s), {eventos} evento(s) ({time.perf_counter() - inicio:.1f}s)")
+
+    inicio = time.perf_counter()
+    agora = datetime.now()
+    totais = motor.get_totais(agora - timedelta(days=args.dias), agora)
+    ranking = motor.get_por_equipamento(agora - timedelta(days=args.dias), agora, 5)
+    print(f"Últimos {args.dias} dias: {totais['numero_paradas']} paradas, {totais['minutos_parado']:.0f} min "
+          f"({time.perf_counter() - inicio:.3f}s)")
+    for linha in ranking:
+        print(f"  {linha['equipamento']}: {linha['total_paradas']} paradas, {linha['tempo_total']:.0f} min")
+
+    motor.close()
+    db.close()
@@ -0,0 +1,291 @@
+from typing import Dict, Any, Iterable, Optional
+from datetime import datetime
+import math
+import mmap
+import os
+import struct
+import time
+from ...domain.models import Machine
+from ...domain.enums import MachineStatus
+
+
+# Cabeçalho: magic, versão, tamanho do registro, capacidade, slots em uso,
+# geração (incrementada a cada slot registrado e a cada crescimento do arquivo)
+_CABECALHO = struct.Struct('<8sHHIII')
+_TAMANHO_CABECALHO = 32
+_MAGIC = b'IND4LIVE'
+_VERSAO = 1
+
+# Registro (um slot por máquina): seq, api_id, status, desatualizado, cor,
+# desde (epoch, NaN se vazio), contador de falhas, atualizado_em (epoch)
+_REGISTRO = struct.Struct('<I32sBB7sxdId')
+_SEQ = struct.Struct('<I')
+_TAMANHO_REGISTRO = 72
+
+# Códigos de status gravados no arquivo. Fixos: um status novo recebe o
+# próximo código livre, nunca se renumera (leitores e arquivos existentes
+# dependem deles). Código desconhecido (escritor mais novo) é lido como DESCONHECIDO
+_CODIGO_POR_STATUS = {
+    MachineStatus.PRODUZINDO: 0,
+    MachineStatus.PARADA: 1,
+    MachineStatus.SEM_REDE: 2,
+    MachineStatus.FALHA_OPC: 3,
+    MachineStatus.ERRO_LEITURA: 4,
+    MachineStatus.DESCONHECIDO: 5,
+    MachineStatus.AGUARDANDO: 6,
+}
+_STATUS_POR_CODIGO = {codigo: status for status, codigo in _CODIGO_POR_STATUS.items()}
+_CODIGO_DESCONHECIDO = 255
+
+_TENTATIVAS_LEITURA = 100
+
+
+class LiveStateStore:
+    """
+    Estado ao vivo das máquinas em arquivo mapeado em memória (mmap)
+
+    Tabela de registros fixos, um slot por máquina. O scanner (escritor)
+    atualiza o slot no lugar a cada update_status; dashboards e APIs (leitores,
+    em outros processos) leem sem parse de JSON.
+
+    Cada slot é protegido por um seqlock: o escritor incrementa o seq (ímpar =
+    escrita em andamento), grava os dados e incrementa de novo. O leitor
+    repete a leitura se o seq estava ímpar ou mudou durante a cópia.
+    Um único processo escritor por arquivo.
+
+    O arquivo nunca é substituído (no Windows não dá para trocar um arquivo
+    mapeado por outro processo): quando faltam slots, o escritor o aumenta no
+    lugar e grava a nova capacidade e a geração no cabeçalho; os leitores
+    remapeiam ao ver a geração mudar.
+    """
+
+    def __init__(self, path: str = "estado_vivo.bin", escrita: bool = False, capacidade: int = 1024):
+        self.path = path
+        self.escrita = escrita
+        self._slots: Dict[str, int] = {}
+        self._geracao_indice = -1
+        self._arquivo = None
+        self._mmap: Optional[mmap.mmap] = None
+
+        if escrita:
+            self._abrir_escrita(capacidade)
+        else:
+            self._abrir_leitura()
+
+    # ============== ARQUIVO ==============
+
+    def _abrir_escrita(self, capacidade: int):
+        """Reaproveita o arquivo existente (slots estáveis entre reinícios) ou cria um novo"""
+        if os.path.exists(self.path):
+            try:
+                self._mapear('r+b', mmap.ACCESS_WRITE)
+            except ValueError:
+                # Formato incompatível: reinicia no lugar (sem leitores, que também o recusam)
+                self.close()
+                self._inicializar('r+b', capacidade)
+                return
+            if self.capacidade < capacidade:
+                self._crescer(capacidade)
+            self._carregar_indice()
+            return
+
+        self._inicializar('wb', capacidade)
+
+    def _inicializar(self, modo: str, capacidade: int):
+        """Grava cabeçalho e slots vazios a partir do início do arquivo"""
+        with open(self.path, modo) as f:
+            f.write(_CABECALHO.pack(_MAGIC, _VERSAO, _TAMANHO_REGISTRO, capacidade, 0, 0))
+            f.write(b'\0' * (_TAMANHO_CABECALHO - _CABECALHO.size + capacidade * _TAMANHO_REGISTRO))
+        self._mapear('r+b', mmap.ACCESS_WRITE)
+
+    def _crescer(self, capacidade: int):
+        """
+        Escritor: aumenta o arquivo no lugar (slots existentes não mudam). Os
+        bytes novos entram antes do cabeçalho anunciar a capacidade: um leitor
+        que vê a geração nova sempre encontra o arquivo já aumentado
+        """
+        _, _, _, atual, usados, geracao = self._ler_cabecalho()
+        self.close()
+        with open(self.path, 'r+b') as f:
+            f.seek(0, os.SEEK_END)
+            faltam = _TAMANHO_CABECALHO + capacidade * _TAMANHO_REGISTRO - f.tell()
+            if faltam > 0:
+                f.write(b'\0' * faltam)
+
+        self._mapear('r+b', mmap.ACCESS_WRITE)
+        self._mmap[0:_CABECALHO.size] = _CABECALHO.pack(
+            _MAGIC, _VERSAO, _TAMANHO_REGISTRO, capacidade, usados, geracao + 1
+        )
+        self._geracao_indice = geracao + 1
+        print(f"📈 Estado ao vivo ampliado: {atual} -> {capacidade} slots")
+
+    def _abrir_leitura(self):
+        self._mapear('rb', mmap.ACCESS_READ)
+        self._carregar_indice()
+
+    def _mapear(self, modo: str, acesso: int):
+        self._arquivo = open(self.path, modo)
+        self._mmap = mmap.mmap(self._arquivo.fileno(), 0, access=acesso)
+
+        magic, versao, tamanho_registro, _, _, _ = self._ler_cabecalho()
+        if magic != _MAGIC or versao != _VERSAO or tamanho_registro != _TAMANHO_REGISTRO:
+            raise ValueError(f"Arquivo de estado ao vivo incompatível: {self.path}")
+
+    def _remapear_se_cresceu(self):
+        """Leitor: o escritor aumentou o arquivo (capacidade maior que a mapeada)"""
+        if _TAMANHO_CABECALHO + self.capacidade * _TAMANHO_REGISTRO > len(self._mmap):
+            self.close()
+            self._mapear('rb', mmap.ACCESS_READ)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+
+    def _ler_cabecalho(self):
+        return _CABECALHO.unpack_from(self._mmap, 0)
+
+    @property
+    def capacidade(self) -> int:
+        return self._ler_cabecalho()[3]
+
+    @property
+    def geracao(self) -> int:
+        """Incrementada a cada slot registrado ou crescimento (leitores refazem o índice)"""
+        return self._ler_cabecalho()[5]
+
+    def _carregar_indice(self):
+        """Monta api_id -> slot a partir dos registros"""
+        _, _, _, _, usados, geracao = self._ler_cabecalho()
+        slots = {}
+        for slot in range(usados):
+            api_id = self._mmap[self._offset(slot) + 4:self._offset(slot) + 36].rstrip(b'\0')
+            if api_id:
+                slots[api_id.decode('utf-8', 'ignore')] = slot
+        self._slots = slots
+        self._geracao_indice = geracao
+
+    def _offset(self, slot: int) -> int:
+        return _TAMANHO_CABECALHO + slot * _TAMANHO_REGISTRO
+
+    # ============== ESCRITA ==============
+
+    def registrar(self, api_ids: Iterable[str]) -> None:
+        """Reserva um slot para cada máquina ainda sem slot (aumenta o arquivo se preciso)"""
+        novos = [api_id for api_id in dict.fromkeys(api_ids) if api_id not in self._slots]
+        if not novos:
+            return
+
+        _, _, _, capacidade, usados, _ = self._ler_cabecalho()
+        if usados + len(novos) > capacidade:
+            self._crescer(max(capacidade * 2, usados + len(novos)))
+
+        _, _, _, capacidade, usados, geracao = self._ler_cabecalho()
+        for api_id in novos:
+            chave = api_id.encode('utf-8')[:32]
+            offset = self._offset(usados)
+            self._mmap[offset + _SEQ.size:offset + _SEQ.size + 32] = chave.ljust(32, b'\0')
+            self._slots[api_id] = usados
+            usados += 1
+
+        geracao += 1
+        self._mmap[0:_CABECALHO.size] = _CABECALHO.pack(_MAGIC, _VERSAO, _TAMANHO_REGISTRO, capacidade, usados, geracao)
+        self._geracao_indice = geracao
+
+    def atualizar(self, machine: Machine) -> None:
+        """Grava o estado da máquina no slot (seqlock)"""
+        self.atualizar_estado(
+            machine.api_id, machine.status, machine.cor, machine.desde,
+            machine.contador_falhas, bool(machine.metadata.get('desatualizado'))
+        )
+
+    def atualizar_estado(
+        self,
+        api_id: str,
+        status: MachineStatus,
+        cor: Optional[str] = None,
+        desde: Optional[datetime] = None,
+        contador_falhas: int = 0,
+        desatualizado: bool = False
+    ) -> None:
+        """Grava o estado no slot da máquina (escritores sem Machine, ex: service_monitor.py)"""
+        slot = self._slots.get(api_id)
+        if slot is None:
+            return
+
+        offset = self._offset(slot)
+        seq = _SEQ.unpack_from(self._mmap, offset)[0]
+        if seq % 2:
+            seq += 1  # escritor anterior morreu no meio da escrita
+
+        # Cópias por fatia (pack_into zera a área antes de escrever, o que
+        # mostraria um seq par no meio da escrita)
+        registro = _REGISTRO.pack(
+            (seq + 1) & 0xFFFFFFFF,
+            api_id.encode('utf-8')[:32],
+            _CODIGO_POR_STATUS.get(status, _CODIGO_DESCONHECIDO),
+            1 if desatualizado else 0,
+            (cor or '').encode('ascii', 'replace')[:7],
+            desde.timestamp() if desde else math.nan,
+            contador_falhas,
+            time.time()
+        )
+        self._mmap[offset:offset + _SEQ.size] = registro[:_SEQ.size]
+        self._mmap[offset + _SEQ.size:offset + _REGISTRO.size] = registro[_SEQ.size:]
+        self._mmap[offset:offset + _SEQ.size] = _SEQ.pack((seq + 2) & 0xFFFFFFFF)
+
+    # ============== LEITURA ==============
+
+    def ler(self, api_id: str) -> Optional[Dict[str, Any]]:
+        """Estado de uma máquina ou None se ela não tem slot"""
+        self._atualizar_indice()
+        slot = self._slots.get(api_id)
+        if slot is None:
+            return None
+        return self._ler_slot(slot)
+
+    def ler_todos(self) -> Dict[str, Dict[str, Any]]:
+        """Estado de todas as máquinas com slot: {api_id: {...}}"""
+        self._atualizar_indice()
+        estados = {}
+        for api_id, slot in self._slots.items():
+            estado = self._ler_slot(slot)
+            if estado is not None:
+                estados[api_id] = estado
+        return estados
+
+    def _atualizar_indice(self):
+        if not self.escrita and self.geracao != self._geracao_indice:
+            self._remapear_se_cresceu()
+            self._carregar_indice()
+
+    def _ler_slot(self, slot: int) -> Optional[Dict[str, Any]]:
+        offset = self._offset(slot)
+        for _ in range(_TENTATIVAS_LEITURA):
+            seq_inicio = _SEQ.unpack_from(self._mmap, offset)[0]
+            if seq_inicio % 2:
+                continue
+            dados = self._mmap[offset:offset + _REGISTRO.size]
+            seq_fim = _SEQ.unpack_from(self._mmap, offset)[0]
+            if seq_inicio == seq_fim:
+                break
+        else:
+            return None
+
+        _, _, codigo, desatualizado, cor, desde, contador, atualizado_em = _REGISTRO.unpack(dados)
+        if not atualizado_em:
+            return None  # slot registrado, ainda sem estado
+
+        status = _STATUS_POR_CODIGO.get(codigo, MachineStatus.DESCONHECIDO)
+        return {
+            'status': status,
+            'cor': cor.rstrip(b'\0').decode('ascii', 'replace') or '#808080',
+            'desde': datetime.fromtimestamp(desde) if not math.isnan(desde) else None,
+            'contador_falhas': contador,
+            'desatualizado': bool(desatualizado),
+            'atualizado_em': datetime.fromtimestamp(atualizado_em),
+            'seq': seq_inicio
+        }
@@ -0,0 +1,283 @@
+"""
+Rollup diário de paradas (tabela metricas_diarias): uma linha por máquina por dia.
+
+Mantido incrementalmente pelo DowntimeRepository a cada parada encerrada
+(paradas que atravessam a meia-noite são divididas entre os dias).
+Recálculo do histórico existente:
+    python -m src.infrastructure.database.metrics_rollup monitoramento.db [--desde 2024-01-01] [--ate 2024-12-31] [--arquivo arquivo]
+(as paradas já movidas pela retenção para a pasta do arquivo entram no recálculo)
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import date, datetime, timedelta
+import argparse
+import calendar
+import os
+import sqlite3
+import time
+from .connection import DatabaseConnection
+from ...domain.interfaces import IDailyMetricsRepository
+
+
+_SEGUNDOS_DIA = 86400
+_MINUTOS_DIA = 1440
+
+# Coluna de minutos parados por turno (turno gravado na parada)
+COLUNAS_TURNO = {
+    'TURNO 01': 'minutos_turno1',
+    'TURNO 02': 'minutos_turno2',
+    'TURNO 03': 'minutos_turno3',
+}
+
+_SQL_UPSERT = '''
+    INSERT INTO metricas_diarias
+    (equipamento, data, minutos_parado, numero_paradas, minutos_turno1, minutos_turno2, minutos_turno3)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(equipamento, data) DO UPDATE SET
+        minutos_parado = minutos_parado + excluded.minutos_parado,
+        numero_paradas = numero_paradas + excluded.numero_paradas,
+        minutos_turno1 = minutos_turno1 + excluded.minutos_turno1,
+        minutos_turno2 = minutos_turno2 + excluded.minutos_turno2,
+        minutos_turno3 = minutos_turno3 + excluded.minutos_turno3
+'''
+
+# Colunas derivadas (dia de 1440 min), recalculadas a partir das aditivas
+_SET_DERIVADOS = f'''
+    minutos_produzindo = MAX(0, {_MINUTOS_DIA} - minutos_parado),
+    disponibilidade = MAX(0, {_MINUTOS_DIA} - minutos_parado) * 100.0 / {_MINUTOS_DIA},
+    mttr = CASE WHEN numero_paradas > 0 THEN minutos_parado * 1.0 / numero_paradas ELSE 0 END,
+    mtbf = CASE WHEN numero_paradas > 0
+                THEN MAX(0, {_MINUTOS_DIA} - minutos_parado) * 1.0 / numero_paradas
+                ELSE MAX(0, {_MINUTOS_DIA} - minutos_parado) END
+'''
+
+_SQL_DERIVADOS = f'UPDATE metricas_diarias SET {_SET_DERIVADOS} WHERE equipamento = ? AND data = ?'
+
+
+def _epoch(dt: datetime) -> int:
+    """Mesma convenção das colunas *_ts (horário local, sem fuso)"""
+    return calendar.timegm(dt.timetuple())
+
+
+def _dia_str(epoch_dia: int) -> str:
+    return time.strftime('%Y-%m-%d', time.gmtime(epoch_dia))
+
+
+def dividir_por_dia(inicio_ts: int, fim_ts: int) -> Iterator[Tuple[str, float, int]]:
+    """
+    Divide o intervalo [inicio_ts, fim_ts] nos dias que ele cobre.
+    Gera (dia 'YYYY-MM-DD', minutos no dia, 1 se a parada começou nesse dia)
+    """
+    dia = inicio_ts - inicio_ts % _SEGUNDOS_DIA
+    while True:
+        fim_parte = min(fim_ts, dia + _SEGUNDOS_DIA)
+        minutos = max(0, fim_parte - max(inicio_ts, dia)) / 60
+        yield _dia_str(dia), minutos, 1 if dia <= inicio_ts < dia + _SEGUNDOS_DIA else 0
+        dia += _SEGUNDOS_DIA
+        if dia >= fim_ts:
+            return
+
+
+def recalcular(
+    conn: sqlite3.Connection,
+    desde: Optional[date] = None,
+    ate: Optional[date] = None,
+    arquivadas: Iterable[Tuple[str, str, str, int, int]] = ()
+) -> int:
+    """
+    Refaz o rollup dos dias [desde, ate] a partir de historico_paradas (SQL puro,
+    em uma transação). Sem datas, refaz tudo. arquivadas: paradas que a retenção
+    tirou do banco quente (uuid, equipamento, turno, início_ts, fim_ts), somadas
+    junto com as do banco (sem elas, os dias arquivados ficariam zerados).
+    Retorna o número de linhas geradas
+    """
+    inicio_ts = _epoch(datetime.combine(desde, datetime.min.time())) if desde else None
+    fim_ts = _epoch(datetime.combine(ate + timedelta(days=1), datetime.min.time())) if ate else None
+
+    filtro_paradas = ''
+    filtro_dias = ''
+    params: List[Any] = []
+    if inicio_ts is not None:
+        filtro_paradas += ' AND data_final_ts > ?'
+        filtro_dias += ' AND dia >= ?'
+        params.append(inicio_ts)
+    if fim_ts is not None:
+        filtro_paradas += ' AND data_inicial_ts < ?'
+        filtro_dias += ' AND dia < ?'
+        params.append(fim_ts)
+    params_dias = list(params)
+
+    # Paradas do arquivo em uma tabela temporária da conexão (as que ainda estão
+    # no banco quente, por um arquivamento interrompido, valem só uma vez)
+    conn.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS paradas_arquivadas
+        (uuid TEXT, equipamento TEXT, turno TEXT, data_inicial_ts INTEGER, data_final_ts INTEGER)
+    ''')
+    conn.execute('DELETE FROM temp.paradas_arquivadas')
+    conn.executemany('INSERT INTO temp.paradas_arquivadas VALUES (?, ?, ?, ?, ?)', arquivadas)
+
+    colunas_turno = ', '.join(
+        f"SUM(CASE WHEN turno = '{turno}' THEN minutos ELSE 0 END)" for turno in COLUNAS_TURNO
+    )
+
+    conn.execute('DELETE FROM metricas_diarias WHERE 1' +
+                 (' AND data >= ?' if desde else '') + (' AND data <= ?' if ate else ''),
+                 [d.isoformat() for d in (desde, ate) if d])
+
+    cursor = conn.execute(f'''
+        INSERT INTO metricas_diarias
+        (equipamento, data, minutos_parado, numero_paradas, minutos_turno1, minutos_turno2, minutos_turno3)
+        WITH RECURSIVE partes(equipamento, turno, inicio, fim, dia) AS (
+            SELECT equipamento, turno, data_inicial_ts, data_final_ts,
+                   data_inicial_ts - data_inicial_ts % {_SEGUNDOS_DIA}
+            FROM (
+                SELECT equipamento, turno, data_inicial_ts, data_final_ts FROM historico_paradas
+                UNION ALL
+                SELECT equipamento, turno, data_inicial_ts, data_final_ts FROM temp.paradas_arquivadas
+                WHERE uuid NOT IN (SELECT uuid FROM historico_paradas)
+            )
+            WHERE data_final_ts IS NOT NULL AND data_inicial_ts IS NOT NULL
+              AND data_final_ts >= data_inicial_ts {filtro_paradas}
+            UNION ALL
+            SELECT equipamento, turno, inicio, fim, dia + {_SEGUNDOS_DIA}
+            FROM partes WHERE dia + {_SEGUNDOS_DIA} < fim
+        ),
+        minutos_por_dia AS (
+            SELECT equipamento, turno, dia,
+                   MAX(0, MIN(fim, dia + {_SEGUNDOS_DIA}) - MAX(inicio, dia)) / 60.0 AS minutos,
+                   inicio >= dia AND inicio < dia + {_SEGUNDOS_DIA} AS comecou
+            FROM partes WHERE 1 {filtro_dias}
+        )
+        SELECT equipamento, date(dia, 'unixepoch'), SUM(minutos), SUM(comecou), {colunas_turno}
+        FROM minutos_por_dia
+        GROUP BY equipamento, dia
+    ''', params + params_dias)
+    conn.execute('DELETE FROM temp.paradas_arquivadas')
+
+    conn.execute(f'UPDATE metricas_diarias SET {_SET_DERIVADOS} WHERE 1' +
+                 (' AND data >= ?' if desde else '') + (' AND data <= ?' if ate else ''),
+                 [d.isoformat() for d in (desde, ate) if d])
+    return cursor.rowcount
+
+
+class DailyMetricsRepository(IDailyMetricsRepository):
+    """Leitura e manutenção do rollup diário (metricas_diarias)"""
+
+    def __init__(self, db: DatabaseConnection):
+        self.db = db
+
+    def comandos_parada(
+        self,
+        equipamento: str,
+        data_inicial: datetime,
+        data_final: datetime,
+        turno: str
+    ) -> List[Tuple[str, tuple]]:
+        """
+        Comandos (query, params) que somam uma parada encerrada ao rollup, para
+        serem executados na mesma transação que grava a parada
+        """
+        return self.comandos_paradas([(equipamento, data_inicial, data_final, turno)])
+
+    def comandos_paradas(self, paradas: Iterable[Tuple[str, datetime, datetime, str]]) -> List[Tuple[str, tuple]]:
+        """
+        Comandos para várias paradas (equipamento, início, fim, turno): todos os
+        upserts e depois um recálculo das colunas derivadas por máquina/dia
+        """
+        upserts = []
+        dias_afetados: Dict[Tuple[str, str], None] = {}
+        for equipamento, data_inicial, data_final, turno in paradas:
+            coluna_turno = COLUNAS_TURNO.get(turno)
+            for dia, minutos, comecou in dividir_por_dia(_epoch(data_inicial), _epoch(data_final)):
+                turnos = tuple(minutos if coluna == coluna_turno else 0.0 for coluna in COLUNAS_TURNO.values())
+                upserts.append((_SQL_UPSERT, (equipamento, dia, minutos, comecou) + turnos))
+                dias_afetados[(equipamento, dia)] = None
+
+        return upserts + [(_SQL_DERIVADOS, chave) for chave in dias_afetados]
+
+    def registrar_parada(self, equipamento: str, data_inicial: datetime, data_final: datetime, turno: str) -> None:
+        self.db.execute_batch(self.comandos_parada(equipamento, data_inicial, data_final, turno))
+
+    def recalcular(self, desde: Optional[date] = None, ate: Optional[date] = None, arquivo=None) -> int:
+        """
+        Refaz o rollup a partir do histórico (backfill). arquivo (ArchiveManager):
+        inclui as paradas já arquivadas pela retenção
+        """
+        arquivadas = self._paradas_arquivadas(arquivo, desde, ate) if arquivo is not None else []
+        with self.db.transaction() as conn:
+            return recalcular(conn, desde, ate, arquivadas)
+
+    def _paradas_arquivadas(self, arquivo, desde: Optional[date], ate: Optional[date]) -> List[tuple]:
+        """Paradas encerradas do arquivo que tocam [desde, ate] (o arquivo é particionado pelo início)"""
+        meses = arquivo.meses_arquivados('historico_paradas')
+        if not meses:
+            return []
+        inicio = datetime.strptime(meses[0], '%Y-%m')
+        fim = datetime.combine(ate + timedelta(days=1), datetime.min.time()) if ate else datetime.now() + timedelta(days=1)
+        df = arquivo.ler_paradas(inicio, fim, apenas_arquivo=True)
+        df = df[df['data_final_ts'].notna() & df['data_inicial_ts'].notna()]
+        if desde:
+            df = df[df['data_final_ts'] > _epoch(datetime.combine(desde, datetime.min.time()))]
+        return [
+            (uuid, equipamento, turno, int(inicio_ts), int(fim_ts))
+            for uuid, equipamento, turno, inicio_ts, fim_ts in zip(
+                df['uuid'], df['equipamento'], df['turno'], df['data_inicial_ts'], df['data_final_ts']
+            )
+        ]
+
+    def get_totais(self, data_inicio: date, data_fim: date, equipamento: str = None) -> Dict[str, Any]:
+        """Soma do período (dias inclusivos): minutos parados, paradas e minutos por turno"""
+        query = f'''
+            SELECT COALESCE(SUM(minutos_parado), 0) AS minutos_parado,
+                   COALESCE(SUM(numero_paradas), 0) AS numero_paradas,
+                   {', '.join(f'COALESCE(SUM({coluna}), 0) AS {coluna}' for coluna in COLUNAS_TURNO.values())}
+            FROM metricas_diarias
+            WHERE data >= ? AND data <= ?
+        '''
+        params = [data_inicio.isoformat(), data_fim.isoformat()]
+        if equipamento:
+            query += ' AND equipamento = ?'
+            params.append(equipamento)
+
+        row = self.db.fetch_one(query, tuple(params))
+        return {
+            'minutos_parado': row['minutos_parado'],
+            'numero_paradas': row['numero_paradas'],
+            'turnos': {turno: row[coluna] for turno, coluna in COLUNAS_TURNO.items()}
+        }
+
+    def get_por_equipamento(self, data_inicio: date, data_fim: date, limit: int = None) -> List[Dict[str, Any]]:
+        """Totais por equipamento no período, do que mais parou para o que menos parou"""
+        query = '''
+            SELECT equipamento, SUM(numero_paradas) AS total_paradas, SUM(minutos_parado) AS tempo_total
+            FROM metricas_diarias
+            WHERE data >= ? AND data <= ?
+            GROUP BY equipamento
+            HAVING SUM(numero_paradas) > 0
+            ORDER BY total_paradas DESC, tempo_total DESC
+        '''
+        params: Tuple = (data_inicio.isoformat(), data_fim.isoformat())
+        if limit:
+            query += ' LIMIT ?'
+            params += (limit,)
+
+        return [dict(row) for row in self.db.fetch_all(query, params)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Recalcula o rollup diário (metricas_diarias) a partir do histórico")
+    parser.add_argument('banco', nargs='?', default='monitoramento.db')
+    parser.add_argument('--desde', type=date.fromisoformat)
+    parser.add_argument('--ate', type=date.fromisoformat)
+    parser.add_argument('--arquivo', default='arquivo', help="pasta do arquivo morto da retenção (incluída se existir)")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    db = DatabaseConnection(args.banco)
+    db.init_schema()
+    arquivo = None
+    if os.path.isdir(args.arquivo):
+        from .retention import ArchiveManager, RetentionPolicy
+        arquivo = ArchiveManager(db, RetentionPolicy(pasta=args.arquivo))
+    linhas = DailyMetricsRepository(db).recalcular(args.desde, args.ate, arquivo)
+    db.close()
+    print(f"Rollup recalculado: {linhas} linhas ({time.perf_counter() - inicio:.1f}s)")
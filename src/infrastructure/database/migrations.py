@@ -0,0 +1,239 @@
+"""
+Migrações de schema do SQLite, versionadas por PRAGMA user_version.
+
+Uso avulso (ex: migrar o banco antes de subir uma nova versão do serviço):
+    python -m src.infrastructure.database.migrations monitoramento.db
+"""
+from typing import Callable, List, Optional, Tuple
+import sqlite3
+import sys
+import time
+
+
+# Texto de data (com ou sem microssegundos, ' ' ou 'T') -> segundos desde
+# 1970-01-01 no horário local gravado (sem conversão de fuso)
+_EXPR_EPOCH = "CAST(strftime('%s', replace(substr({coluna}, 1, 19), 'T', ' ')) AS INTEGER)"
+
+
+def _epoch(coluna: str) -> str:
+    return _EXPR_EPOCH.format(coluna=coluna)
+
+
+def _colunas(conn: sqlite3.Connection, tabela: str) -> List[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({tabela})')]
+
+
+# ============== v1: timestamps em epoch (INTEGER) ==============
+
+def _v1_schema(conn: sqlite3.Connection):
+    """
+    Colunas *_ts INTEGER ao lado das colunas TEXT (mantidas para compatibilidade),
+    índices nas novas colunas e triggers que preenchem o epoch quando quem grava
+    só informa o texto (código legado, scripts externos)
+    """
+    colunas_paradas = _colunas(conn, 'historico_paradas')
+    for coluna in ('data_inicial_ts', 'data_final_ts'):
+        if coluna not in colunas_paradas:
+            conn.execute(f'ALTER TABLE historico_paradas ADD COLUMN {coluna} INTEGER')
+
+    if 'timestamp_ts' not in _colunas(conn, 'eventos'):
+        conn.execute('ALTER TABLE eventos ADD COLUMN timestamp_ts INTEGER')
+
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_paradas_inicial_ts ON historico_paradas(data_inicial_ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_paradas_final_ts ON historico_paradas(data_final_ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_eventos_ts ON eventos(timestamp_ts)')
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_paradas_ts_insert
+        AFTER INSERT ON historico_paradas
+        WHEN NEW.data_inicial_ts IS NULL OR (NEW.data_final IS NOT NULL AND NEW.data_final_ts IS NULL)
+        BEGIN
+            UPDATE historico_paradas
+            SET data_inicial_ts = COALESCE(NEW.data_inicial_ts, {_epoch('NEW.data_inicial')}),
+                data_final_ts = COALESCE(NEW.data_final_ts, {_epoch('NEW.data_final')})
+            WHERE rowid = NEW.rowid;
+        END
+    ''')
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_paradas_ts_update
+        AFTER UPDATE OF data_inicial, data_final ON historico_paradas
+        WHEN (NEW.data_inicial IS NOT OLD.data_inicial AND NEW.data_inicial_ts IS OLD.data_inicial_ts)
+          OR (NEW.data_final IS NOT OLD.data_final AND NEW.data_final_ts IS OLD.data_final_ts)
+        BEGIN
+            UPDATE historico_paradas
+            SET data_inicial_ts = {_epoch('NEW.data_inicial')},
+                data_final_ts = {_epoch('NEW.data_final')}
+            WHERE rowid = NEW.rowid;
+        END
+    ''')
+
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_eventos_ts_insert
+        AFTER INSERT ON eventos
+        WHEN NEW.timestamp_ts IS NULL
+        BEGIN
+            UPDATE eventos SET timestamp_ts = {_epoch('NEW.timestamp')} WHERE rowid = NEW.rowid;
+        END
+    ''')
+
+
+def _v1_backfill(conn: sqlite3.Connection, tamanho_lote: int):
+    """Preenche o epoch das linhas antigas em lotes (uma transação curta por lote)"""
+    _backfill(conn, 'historico_paradas', 'data_inicial_ts', {
+        'data_inicial_ts': _epoch('data_inicial'),
+        'data_final_ts': _epoch('data_final')
+    }, tamanho_lote)
+    _backfill(conn, 'historico_paradas', 'data_final_ts', {
+        'data_final_ts': _epoch('data_final')
+    }, tamanho_lote, filtro='data_final IS NOT NULL')
+    _backfill(conn, 'eventos', 'timestamp_ts', {
+        'timestamp_ts': _epoch('timestamp')
+    }, tamanho_lote)
+
+
+def _backfill(
+    conn: sqlite3.Connection,
+    tabela: str,
+    coluna_nula: str,
+    atribuicoes: dict,
+    tamanho_lote: int,
+    filtro: str = '1'
+):
+    """
+    Percorre (pelo índice da coluna_nula) as linhas ainda sem epoch, em ordem de
+    rowid. Textos que não convertem ficam NULL e não são revisitados nesta execução
+    """
+    sets = ', '.join(f'{coluna} = {expressao}' for coluna, expressao in atribuicoes.items())
+    ultimo_rowid = 0
+    while True:
+        rowids = [row[0] for row in conn.execute(
+            f'SELECT rowid FROM {tabela} WHERE {coluna_nula} IS NULL AND {filtro} AND rowid > ? '
+            f'ORDER BY rowid LIMIT ?',
+            (ultimo_rowid, tamanho_lote)
+        )]
+        if not rowids:
+            return
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            marcadores = ','.join('?' * len(rowids))
+            conn.execute(f'UPDATE {tabela} SET {sets} WHERE rowid IN ({marcadores})', rowids)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        ultimo_rowid = rowids[-1]
+
+
+# ============== v2: rollup diário por turno ==============
+
+def _v2_schema(conn: sqlite3.Connection):
+    """Minutos parados por turno no rollup diário e carga inicial a partir do histórico"""
+    from .metrics_rollup import recalcular
+
+    colunas = _colunas(conn, 'metricas_diarias')
+    for coluna in ('minutos_turno1', 'minutos_turno2', 'minutos_turno3'):
+        if coluna not in colunas:
+            conn.execute(f'ALTER TABLE metricas_diarias ADD COLUMN {coluna} REAL DEFAULT 0')
+
+    recalcular(conn)
+
+
+# ============== v3: índices compostos, parcial e de cobertura ==============
+
+def _v3_schema(conn: sqlite3.Connection):
+    """
+    Índices casados com as consultas dos repositórios (conferidos por
+    test_query_plans.py). Saem os de coluna única que viraram prefixo de um
+    composto e os das colunas TEXT de data, que não são mais consultadas
+    """
+    # get_by_machine: igualdade em equipamento + faixa/ordenação no início
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_paradas_equip_inicial_ts
+        ON historico_paradas(equipamento, data_inicial_ts)
+    ''')
+    # get_active_downtimes: só as paradas abertas (poucas linhas). O índice do
+    # fim passa a cobrir só as encerradas (faixas do rollup e da retenção), senão
+    # o planejador o prefere para o IS NULL
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_paradas_ativas
+        ON historico_paradas(equipamento) WHERE data_final_ts IS NULL
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_paradas_encerradas_final_ts
+        ON historico_paradas(data_final_ts) WHERE data_final_ts IS NOT NULL
+    ''')
+    # get_recent por máquina
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_eventos_maquina_ts ON eventos(maquina, timestamp_ts)')
+    # Totais e Pareto por período respondidos só pelo índice, sem ler a tabela
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_metricas_data_cobertura
+        ON metricas_diarias(data, equipamento, numero_paradas, minutos_parado,
+                            minutos_turno1, minutos_turno2, minutos_turno3)
+    ''')
+
+    for indice in ('idx_equipamento', 'idx_data_inicial', 'idx_data_final', 'idx_paradas_final_ts',
+                   'idx_eventos_timestamp', 'idx_metricas_data'):
+        conn.execute(f'DROP INDEX IF EXISTS {indice}')
+
+
+# (versão, descrição, schema, backfill opcional)
+MIGRACOES: List[Tuple[int, str, Callable, Optional[Callable]]] = [
+    (1, 'timestamps em epoch (INTEGER) com índices', _v1_schema, _v1_backfill),
+    (2, 'rollup diário (metricas_diarias) por turno', _v2_schema, None),
+    (3, 'índices compostos, parcial (paradas ativas) e de cobertura', _v3_schema, None),
+]
+
+VERSAO_ATUAL = MIGRACOES[-1][0]
+
+
+def versao_schema(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def aplicar_migracoes(conn: sqlite3.Connection, tamanho_lote: int = 5000) -> int:
+    """
+    Aplica as migrações pendentes (cada uma em sua transação) e completa os
+    backfills. Seguro com vários processos abrindo o banco ao mesmo tempo.
+    Retorna a versão final do schema
+    """
+    # Transações explícitas abaixo: o modo implícito do sqlite3 atrapalharia o BEGIN IMMEDIATE
+    isolamento = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        for versao, descricao, schema, backfill in MIGRACOES:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Relida dentro da transação: outro processo pode ter migrado antes
+                if versao_schema(conn) >= versao:
+                    conn.execute('ROLLBACK')
+                else:
+                    schema(conn)
+                    conn.execute(f'PRAGMA user_version = {versao}')
+                    conn.execute('COMMIT')
+                    print(f"🗄️ Migração {versao} aplicada: {descricao}")
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+            # Backfills são idempotentes e rodam fora da transação do schema
+            # (o serviço continua gravando entre os lotes), antes da próxima
+            # migração, que pode depender dos dados convertidos
+            if backfill is not None:
+                backfill(conn, tamanho_lote)
+    finally:
+        conn.isolation_level = isolamento
+
+    return versao_schema(conn)
+
+
+if __name__ == '__main__':
+    from .connection import DatabaseConnection
+
+    banco = sys.argv[1] if len(sys.argv) > 1 else 'monitoramento.db'
+    inicio = time.perf_counter()
+    db = DatabaseConnection(banco)
+    db.init_schema()  # cria as tabelas que faltarem e aplica as migrações
+    print(f"Schema de {banco} na versão {versao_schema(db.connect())} ({time.perf_counter() - inicio:.1f}s)")
+    db.close()
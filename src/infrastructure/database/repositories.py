@@ -1,11 +1,18 @@
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from typing import List, Optional, Dict, Any, Iterator, Tuple
+from datetime import datetime, timedelta
+import calendar
 import uuid
 import json
 import os
+import tempfile
+import time
 from .connection import DatabaseConnection
-from ...domain.models import Machine, Downtime, Event, Hierarquia, CommunicationConfig
-from ...domain.enums import MachineStatus, CommunicationType, Turno
+from .write_behind import WriteBehindQueue
+from .live_state_store import LiveStateStore
+from .metrics_rollup import DailyMetricsRepository
+from .migrations import _EXPR_EPOCH as _EXPR_EPOCH_TEXTO
+from ...domain.models import Machine, Downtime, Event, Hierarquia, CommunicationConfig, HistoryFilter
+from ...domain.enums import MachineStatus, CommunicationType, Turno, AcquisitionMode
 from ...domain.interfaces import IMachineRepository, IDowntimeRepository, IEventRepository
 
 
@@ -32,15 +39,64 @@ def parse_datetime_safe(date_string: str) -> Optional[datetime]:
     return None
 
 
+_EPOCH = datetime(1970, 1, 1)
+
+
+def datetime_para_epoch(dt: Optional[datetime]) -> Optional[int]:
+    """
+    Segundos desde 1970-01-01 no horário local (sem fuso), mesma convenção das
+    colunas *_ts e de strftime('%s', ...) do SQLite
+    """
+    if dt is None:
+        return None
+    return calendar.timegm(dt.timetuple())
+
+
+def epoch_para_datetime(ts: Optional[int]) -> Optional[datetime]:
+    """Inverso de datetime_para_epoch"""
+    if ts is None:
+        return None
+    return _EPOCH + timedelta(seconds=ts)
+
+
 class MachineRepository(IMachineRepository):
-    """Repositório de máquinas usando JSON + Estado em memória"""
+    """
+    Repositório de máquinas usando JSON + Estado em memória
 
-    def __init__(self, config_file: str = "config.json", state_file: str = "estado_atual.json"):
+    update_status só altera a memória e marca a máquina como suja; o snapshot
+    do estado é gravado por flush() (uma vez por ciclo), apenas se a entrada
+    de alguma máquina mudou ou se passou intervalo_heartbeat desde a última
+    gravação (mantém o ultimo_sinal atualizado).
+
+    Com live_state, o estado também vai para a tabela em memória compartilhada:
+    o scanner (LiveStateStore de escrita) atualiza o slot a cada update_status
+    e o dashboard (LiveStateStore de leitura) aplica o estado ao vivo nas
+    máquinas a cada consulta.
+    """
+
+    def __init__(
+        self,
+        config_file: str = "config.json",
+        state_file: str = "estado_atual.json",
+        intervalo_heartbeat: float = 30.0,
+        live_state: Optional[LiveStateStore] = None
+    ):
         self.config_file = config_file
         self.state_file = state_file
+        self.intervalo_heartbeat = intervalo_heartbeat
+        self.live_state = live_state
         self._machines_cache: Dict[str, Machine] = {}
+        # Entradas já serializadas do snapshot; só as máquinas sujas são refeitas no flush
+        self._entradas: Dict[str, Dict[str, Any]] = {}
+        self._sujas: set = set()
+        self._ultima_gravacao: Optional[float] = None
         self._load_machines()
 
+        if live_state is not None and live_state.escrita:
+            live_state.registrar(self._machines_cache.keys())
+            for machine in self._machines_cache.values():
+                live_state.atualizar(machine)
+
     def _load_machines(self):
         """Carrega máquinas do arquivo de configuração"""
         if not os.path.exists(self.config_file):
@@ -57,11 +113,32 @@ class MachineRepository(IMachineRepository):
             )
 
             # Lê node_id do config.json (consolidado - Single Source of Truth)
+            tipo = self._parse_protocolo(item.get('protocolo'))
+            modo_aquisicao = self._parse_modo_aquisicao(item.get('modo_aquisicao'))
+            parametros = {chave: item[chave] for chave in ('unit_id', 'campo', 'timeout_silencio') if chave in item}
+            if tipo == CommunicationType.MODBUS_TCP:
+                porta = item.get('porta', 502)
+                endpoint = f"{item['ip']}:{porta}"
+            elif tipo == CommunicationType.MQTT:
+                # node_id é o tópico de estado; MQTT é sempre por push
+                porta = item.get('porta', 1883)
+                endpoint = f"mqtt://{item.get('broker', item['ip'])}:{porta}"
+                modo_aquisicao = AcquisitionMode.PUSH
+            elif tipo == CommunicationType.REST_API:
+                porta = item.get('porta', 80)
+                endpoint = item.get('url', f"http://{item['ip']}:{porta}")
+            else:
+                porta = item.get('porta', 4840)
+                endpoint = f"opc.tcp://{item['ip']}:{porta}"
+
             comunicacao = CommunicationConfig(
-                tipo=CommunicationType.OPC_UA,  # Padrão
-                endpoint=f"opc.tcp://{item['ip']}:{item.get('porta', 4840)}",
-                porta=item.get('porta', 4840),
-                node_id=item.get('node_id')  # Agora vem do config.json
+                tipo=tipo,
+                endpoint=endpoint,
+                porta=porta,
+                node_id=item.get('node_id'),  # Agora vem do config.json
+                tags=item.get('tags', {}),  # Tags extras (contadores, velocidade, alarmes...)
+                modo_aquisicao=modo_aquisicao,
+                parametros=parametros
             )
 
             machine = Machine(
@@ -77,6 +154,20 @@ class MachineRepository(IMachineRepository):
         # Carrega estado persistente
         self._load_state()
 
+    def _parse_protocolo(self, valor: Optional[str]) -> CommunicationType:
+        """Converte o protocolo do config.json (padrão: OPC UA)"""
+        try:
+            return CommunicationType(str(valor).upper())
+        except ValueError:
+            return CommunicationType.OPC_UA
+
+    def _parse_modo_aquisicao(self, valor: Optional[str]) -> AcquisitionMode:
+        """Converte o modo de aquisição do config.json (padrão: polling)"""
+        try:
+            return AcquisitionMode(str(valor).upper())
+        except ValueError:
+            return AcquisitionMode.POLLING
+
     def _load_state(self):
         """Carrega estado atual das máquinas"""
         if not os.path.exists(self.state_file):
@@ -110,23 +201,34 @@ class MachineRepository(IMachineRepository):
             print(f"Erro ao carregar estado: {e}")
 
     def save_state(self):
-        """Salva estado atual no arquivo JSON"""
-        maquinas_dict = {}
-
-        for api_id, machine in self._machines_cache.items():
-            # Remove microssegundos antes de salvar
-            desde_str = machine.desde.replace(microsecond=0).strftime('%Y-%m-%d %H:%M:%S') if machine.desde else ''
-
-            maquinas_dict[api_id] = {
-                'status': machine.status.value,
-                'cor': machine.cor,
-                'desde': desde_str,
-                'contador': machine.contador_falhas,
-                'ip': machine.ip,
-                'unidade': machine.hierarquia.unidade,
-                'planta': machine.hierarquia.planta,
-                'setor': machine.hierarquia.setor
-            }
+        """Salva o estado atual no arquivo JSON imediatamente"""
+        self.flush(forcar=True)
+
+    def flush(self, forcar: bool = False) -> bool:
+        """
+        Publica o snapshot do estado se alguma máquina mudou ou o heartbeat
+        venceu. Retorna True se o arquivo foi gravado
+        """
+        tocadas, self._sujas = self._sujas, set()
+        tocadas |= self._machines_cache.keys() - self._entradas.keys()
+
+        mudou = False
+        for api_id in tocadas:
+            machine = self._machines_cache.get(api_id)
+            if machine is None:
+                continue
+            entrada = self._serializar_maquina(machine)
+            if self._entradas.get(api_id) != entrada:
+                self._entradas[api_id] = entrada
+                mudou = True
+
+        agora = time.monotonic()
+        heartbeat_vencido = (
+            self._ultima_gravacao is None or
+            agora - self._ultima_gravacao >= self.intervalo_heartbeat
+        )
+        if not (forcar or mudou or heartbeat_vencido):
+            return False
 
         # Remove microssegundos do timestamp de metadata também
         ultimo_sinal = datetime.now().replace(microsecond=0).strftime('%Y-%m-%d %H:%M:%S')
@@ -137,16 +239,94 @@ class MachineRepository(IMachineRepository):
                 "status_servico": "RODANDO",
                 "versao": "2.0 (Clean Architecture)"
             },
-            "maquinas": maquinas_dict
+            "maquinas": self._entradas
+        }
+
+        try:
+            self._gravar_atomico(json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+        except OSError as e:
+            # Na próxima chamada o heartbeat (vencido) força nova tentativa
+            print(f"Erro ao salvar estado: {e}")
+            self._ultima_gravacao = None
+            return False
+
+        self._ultima_gravacao = agora
+        return True
+
+    def _serializar_maquina(self, machine: Machine) -> Dict[str, Any]:
+        # Remove microssegundos antes de salvar
+        desde_str = machine.desde.replace(microsecond=0).strftime('%Y-%m-%d %H:%M:%S') if machine.desde else ''
+
+        return {
+            'status': machine.status.value,
+            'cor': machine.cor,
+            'desde': desde_str,
+            'contador': machine.contador_falhas,
+            'ip': machine.ip,
+            'unidade': machine.hierarquia.unidade,
+            'planta': machine.hierarquia.planta,
+            'setor': machine.hierarquia.setor,
+            'desatualizado': machine.metadata.get('desatualizado', False)
         }
 
-        with open(self.state_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+    def _gravar_atomico(self, conteudo: str):
+        """
+        Grava em arquivo temporário na mesma pasta e troca com os.replace:
+        quem lê o estado vê o snapshot anterior ou o novo, nunca um arquivo pela metade
+        """
+        pasta = os.path.dirname(os.path.abspath(self.state_file))
+        fd, temporario = tempfile.mkstemp(prefix='.estado_', suffix='.tmp', dir=pasta)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(conteudo)
+
+            # No Windows o replace falha enquanto um leitor está com o arquivo aberto
+            for tentativa in range(5):
+                try:
+                    os.replace(temporario, self.state_file)
+                    return
+                except PermissionError:
+                    if tentativa == 4:
+                        raise
+                    time.sleep(0.05)
+        finally:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+
+    def _aplicar_estado_vivo(self, api_id: Optional[str] = None):
+        """Leitor: copia o estado ao vivo (memória compartilhada) para as máquinas"""
+        if self.live_state is None or self.live_state.escrita:
+            return
+
+        if api_id is not None:
+            estados = {api_id: self.live_state.ler(api_id)}
+        else:
+            estados = self.live_state.ler_todos()
+
+        for api_id, estado in estados.items():
+            machine = self._machines_cache.get(api_id)
+            if machine is None or estado is None:
+                continue
+            machine.status = estado['status']
+            machine.cor = estado['cor']
+            machine.desde = estado['desde']
+            machine.contador_falhas = estado['contador_falhas']
+            machine.metadata['desatualizado'] = estado['desatualizado']
+
+    def recarregar_estado(self):
+        """Leitor sem estado ao vivo: relê o snapshot de estado_atual.json"""
+        self._load_state()
+
+    def _publicar_estado_vivo(self, machine: Machine):
+        if self.live_state is not None and self.live_state.escrita:
+            self.live_state.atualizar(machine)
 
     def get_all(self) -> List[Machine]:
+        self._aplicar_estado_vivo()
         return list(self._machines_cache.values())
 
     def get_by_id(self, api_id: str) -> Optional[Machine]:
+        self._aplicar_estado_vivo(api_id)
         return self._machines_cache.get(api_id)
 
     def get_by_hierarquia(
@@ -157,6 +337,7 @@ class MachineRepository(IMachineRepository):
     ) -> List[Machine]:
         resultado = []
 
+        self._aplicar_estado_vivo()
         for machine in self._machines_cache.values():
             if unidade and machine.hierarquia.unidade != unidade:
                 continue
@@ -171,7 +352,8 @@ class MachineRepository(IMachineRepository):
 
     def save(self, machine: Machine) -> None:
         self._machines_cache[machine.api_id] = machine
-        self.save_state()
+        self._sujas.add(machine.api_id)
+        self._publicar_estado_vivo(machine)
 
     def update_status(self, api_id: str, status: Dict[str, Any]) -> None:
         if api_id in self._machines_cache:
@@ -192,27 +374,73 @@ class MachineRepository(IMachineRepository):
             if 'cor' in status:
                 machine.cor = status['cor']
 
-            self.save_state()
+            if 'desatualizado' in status:
+                machine.metadata['desatualizado'] = status['desatualizado']
+
+            # O snapshot compara com a última entrada gravada: só grava se mudou
+            self._sujas.add(api_id)
+            self._publicar_estado_vivo(machine)
 
 
 class DowntimeRepository(IDowntimeRepository):
-    """Repositório de paradas usando SQLite"""
+    """
+    Repositório de paradas usando SQLite
+
+    Com write_behind, as escritas vão para a fila e são gravadas em lote
+    (group commit); as leituras gravam a fila antes de consultar.
+
+    Cada parada encerrada também é somada ao rollup diário (metricas_diarias),
+    na mesma transação que grava a parada.
+    """
+
+    _INSERT = '''
+        INSERT INTO historico_paradas
+        (uuid, equipamento, planta, setor, data_inicial, data_final,
+         minutos_parado, tempo_formatado, motivo, turno,
+         data_inicial_ts, data_final_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
 
-    def __init__(self, db: DatabaseConnection):
+    def __init__(self, db: DatabaseConnection, write_behind: Optional[WriteBehindQueue] = None):
         self.db = db
+        self.write_behind = write_behind
+        self.metricas = DailyMetricsRepository(db)
+
+    def _escrever(self, comandos: List[tuple]) -> None:
+        """Grava os comandos (query, params) juntos: na fila ou em uma transação"""
+        if self.write_behind is not None:
+            self.write_behind.enqueue_grupo(comandos)
+        else:
+            self.db.execute_batch(comandos)
+
+    def _comandos_insert(self, downtimes: List[Downtime]) -> List[tuple]:
+        """INSERTs das paradas seguidos da atualização do rollup das encerradas"""
+        comandos = [(self._INSERT, self._params_insert(downtime)) for downtime in downtimes]
+        comandos.extend(self.metricas.comandos_paradas(
+            (downtime.equipamento, downtime.data_inicial, downtime.data_final, downtime.turno.value)
+            for downtime in downtimes if downtime.data_final
+        ))
+        return comandos
+
+    def flush(self) -> None:
+        """Grava as escritas pendentes da fila write-behind"""
+        if self.write_behind is not None:
+            self.write_behind.flush()
 
     def save(self, downtime: Downtime) -> str:
         """Salva uma parada e retorna UUID"""
+        self._escrever(self._comandos_insert([downtime]))
+        return downtime.uuid
+
+    def save_many(self, downtimes: List[Downtime]) -> List[str]:
+        """Salva várias paradas em uma única transação"""
+        self._escrever(self._comandos_insert(downtimes))
+        return [downtime.uuid for downtime in downtimes]
+
+    def _params_insert(self, downtime: Downtime) -> tuple:
         if not downtime.uuid:
             downtime.uuid = str(uuid.uuid4())
 
-        query = '''
-            INSERT INTO historico_paradas
-            (uuid, equipamento, planta, setor, data_inicial, data_final,
-             minutos_parado, tempo_formatado, motivo, turno)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        '''
-
         # Remove microssegundos antes de salvar
         data_inicial_str = downtime.data_inicial.replace(microsecond=0).strftime('%Y-%m-%d %H:%M:%S')
         data_final_str = downtime.data_final.replace(microsecond=0).strftime('%Y-%m-%d %H:%M:%S') if downtime.data_final else None
@@ -227,11 +455,11 @@ class DowntimeRepository(IDowntimeRepository):
             downtime.minutos_parado,
             downtime.tempo_formatado,
             downtime.motivo,
-            downtime.turno.value
+            downtime.turno.value,
+            datetime_para_epoch(downtime.data_inicial),
+            datetime_para_epoch(downtime.data_final)
         )
-
-        self.db.execute_query(query, params)
-        return downtime.uuid
+        return params
 
     def get_by_machine(
         self,
@@ -244,21 +472,23 @@ class DowntimeRepository(IDowntimeRepository):
         params = [equipamento]
 
         if data_inicio:
-            query += ' AND data_inicial >= ?'
-            params.append(data_inicio.replace(microsecond=0).strftime('%Y-%m-%d %H:%M:%S'))
+            query += ' AND data_inicial_ts >= ?'
+            params.append(datetime_para_epoch(data_inicio))
 
         if data_fim:
-            query += ' AND data_inicial <= ?'
-            params.append(data_fim.replace(microsecond=0).strftime('%Y-%m-%d %H:%M:%S'))
+            query += ' AND data_inicial_ts <= ?'
+            params.append(datetime_para_epoch(data_fim))
 
-        query += ' ORDER BY data_inicial DESC'
+        query += ' ORDER BY data_inicial_ts DESC'
 
+        self.flush()
         rows = self.db.fetch_all(query, tuple(params))
         return [self._row_to_downtime(row) for row in rows]
 
     def get_active_downtimes(self) -> List[Downtime]:
         """Retorna paradas ativas (sem data_final)"""
-        query = 'SELECT * FROM historico_paradas WHERE data_final IS NULL'
+        query = 'SELECT * FROM historico_paradas WHERE data_final_ts IS NULL'
+        self.flush()
         rows = self.db.fetch_all(query)
         return [self._row_to_downtime(row) for row in rows]
 
@@ -266,24 +496,224 @@ class DowntimeRepository(IDowntimeRepository):
         """Busca paradas em um período"""
         query = '''
             SELECT * FROM historico_paradas
-            WHERE data_inicial >= ? AND data_inicial <= ?
-            ORDER BY data_inicial DESC
+            WHERE data_inicial_ts >= ? AND data_inicial_ts <= ?
+            ORDER BY data_inicial_ts DESC
         '''
-        params = (
-            data_inicio.replace(microsecond=0).strftime('%Y-%m-%d %H:%M:%S'),
-            data_fim.replace(microsecond=0).strftime('%Y-%m-%d %H:%M:%S')
-        )
+        params = (datetime_para_epoch(data_inicio), datetime_para_epoch(data_fim))
 
+        self.flush()
         rows = self.db.fetch_all(query, params)
         return [self._row_to_downtime(row) for row in rows]
 
+    # Leitura colunar: nome -> (expressão SQL, dtype NumPy). Datas saem do epoch
+    # (texto só nas linhas que o backfill não converteu)
+    _COLUNAS_FETCH = {
+        'uuid': ('uuid', object),
+        'equipamento': ('equipamento', object),
+        'planta': ('planta', object),
+        'setor': ('setor', object),
+        'data_inicial': (f"COALESCE(data_inicial_ts, {_EXPR_EPOCH_TEXTO.format(coluna='data_inicial')})", 'datetime64[s]'),
+        'data_final': (f"COALESCE(data_final_ts, {_EXPR_EPOCH_TEXTO.format(coluna='data_final')})", 'datetime64[s]'),
+        'minutos_parado': ('minutos_parado', 'float64'),
+        'tempo_formatado': ('tempo_formatado', object),
+        'motivo': ('motivo', object),
+        'turno': ('turno', object),
+    }
+
+    def fetch_columns(
+        self,
+        colunas: List[str],
+        data_inicio: datetime = None,
+        data_fim: datetime = None,
+        equipamento: str = None,
+        apenas_encerradas: bool = False,
+        min_minutos: float = None
+    ) -> Dict[str, Any]:
+        """
+        Paradas como arrays NumPy tipados ({coluna: ndarray}), sem criar um
+        Downtime por linha. Projeta só as colunas pedidas; datas viram
+        datetime64 (NaT se vazias) e minutos float64 (NaN se vazios).
+        Mesmos filtros e ordem (mais recentes primeiro) de get_by_machine/get_by_period
+        """
+        filtro = HistoryFilter(
+            data_inicio=data_inicio,
+            data_fim=data_fim,
+            equipamentos=[equipamento] if equipamento else [],
+            apenas_encerradas=apenas_encerradas,
+            min_minutos=min_minutos
+        )
+        where, params = self._where_historico(filtro)
+        query = f'''
+            SELECT {self._select_colunas(colunas)}
+            FROM historico_paradas WHERE {where}
+            ORDER BY data_inicial_ts DESC
+        '''
+
+        self.flush()
+        return self._para_arrays(colunas, self._fetch_tuplas(query, params))
+
+    def fetch_dataframe(self, colunas: List[str], **filtros):
+        """fetch_columns em um pandas.DataFrame (mesmos filtros)"""
+        import pandas as pd
+
+        return pd.DataFrame(self.fetch_columns(colunas, **filtros), columns=colunas)
+
+    def count_history(self, filtro: HistoryFilter) -> int:
+        """Total de paradas que atendem aos filtros (para a paginação)"""
+        where, params = self._where_historico(filtro)
+        self.flush()
+        return self.db.fetch_one(
+            f'SELECT COUNT(*) FROM historico_paradas WHERE {where} AND data_inicial_ts IS NOT NULL',
+            tuple(params)
+        )[0]
+
+    def fetch_page(
+        self,
+        filtro: HistoryFilter,
+        colunas: List[str],
+        tamanho: int = 100,
+        cursor: Optional[Tuple[int, int]] = None
+    ) -> Tuple[Dict[str, Any], Optional[Tuple[int, int]]]:
+        """
+        Uma página do histórico (mais recentes primeiro) em colunas, como em
+        fetch_columns. Paginação por chave: cursor é o retornado pela página
+        anterior (None = primeira) e o custo de cada página não depende de quantas
+        vieram antes. Retorna (colunas, cursor da próxima página ou None)
+        """
+        # O cursor vira o limite superior da faixa no índice (um segundo limite
+        # superior, o data_fim, faria o SQLite ignorar um deles e varrer desde o topo)
+        where, params = self._where_historico(filtro, ate_ts=cursor[0] if cursor else None)
+        # Ordem estável (início, rowid): é a ordem dos índices de data_inicial_ts, sem sort.
+        # Paradas sem epoch (texto que não converteu) ficam fora da paginação
+        query = f'''
+            SELECT data_inicial_ts, rowid, {self._select_colunas(colunas)}
+            FROM historico_paradas WHERE {where} AND data_inicial_ts IS NOT NULL
+        '''
+        if cursor is not None:
+            query += ' AND (data_inicial_ts < ? OR rowid < ?)'
+            params += [cursor[0], cursor[1]]
+        query += ' ORDER BY data_inicial_ts DESC, rowid DESC LIMIT ?'
+        params.append(tamanho + 1)
+
+        self.flush()
+        rows = self._fetch_tuplas(query, params)
+        proximo = None
+        if len(rows) > tamanho:
+            rows = rows[:tamanho]
+            proximo = (rows[-1][0], rows[-1][1])
+        return self._para_arrays(colunas, [row[2:] for row in rows]), proximo
+
+    def iter_history(
+        self,
+        filtro: HistoryFilter,
+        colunas: List[str],
+        tamanho: int = 5000
+    ) -> Iterator[Dict[str, Any]]:
+        """Percorre o histórico página a página (memória de uma página por vez), ex: exportação"""
+        cursor = None
+        while True:
+            pagina, cursor = self.fetch_page(filtro, colunas, tamanho, cursor)
+            if len(pagina[colunas[0]]):
+                yield pagina
+            if cursor is None:
+                return
+
+    def fetch_by_uuids(self, uuids: List[str], colunas: List[str], tamanho: int = 500) -> Iterator[Dict[str, Any]]:
+        """Paradas pelo uuid (pela chave primária), em colunas, em lotes de até tamanho uuids"""
+        self.flush()
+        for inicio in range(0, len(uuids), tamanho):
+            lote = uuids[inicio:inicio + tamanho]
+            query = f'''
+                SELECT {self._select_colunas(colunas)}
+                FROM historico_paradas WHERE uuid IN ({", ".join("?" * len(lote))})
+            '''
+            rows = self._fetch_tuplas(query, lote)
+            if rows:
+                yield self._para_arrays(colunas, rows)
+
+    def _where_historico(self, filtro: HistoryFilter, ate_ts: Optional[int] = None) -> Tuple[str, List[Any]]:
+        """Condições SQL (e parâmetros) de um HistoryFilter; ate_ts restringe o fim do período"""
+        condicoes = ['1']
+        params: List[Any] = []
+        if len(filtro.equipamentos) == 1:
+            condicoes.append('equipamento = ?')
+            params.append(filtro.equipamentos[0])
+        elif filtro.equipamentos:
+            condicoes.append(f'equipamento IN ({", ".join("?" * len(filtro.equipamentos))})')
+            params.extend(filtro.equipamentos)
+        if filtro.data_inicio:
+            condicoes.append('data_inicial_ts >= ?')
+            params.append(datetime_para_epoch(filtro.data_inicio))
+        fim_ts = datetime_para_epoch(filtro.data_fim)
+        if ate_ts is not None:
+            fim_ts = ate_ts if fim_ts is None else min(fim_ts, ate_ts)
+        if fim_ts is not None:
+            condicoes.append('data_inicial_ts <= ?')
+            params.append(fim_ts)
+        if filtro.planta:
+            condicoes.append('planta = ?')
+            params.append(filtro.planta)
+        if filtro.setor:
+            condicoes.append('setor = ?')
+            params.append(filtro.setor)
+        if filtro.turno:
+            condicoes.append('turno = ?')
+            params.append(filtro.turno.value)
+        if filtro.motivo:
+            condicoes.append("motivo LIKE ? ESCAPE '\\'")
+            trecho = filtro.motivo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{trecho}%')
+        if filtro.min_minutos:
+            condicoes.append('minutos_parado >= ?')
+            params.append(filtro.min_minutos)
+        if filtro.apenas_encerradas:
+            condicoes.append('data_final_ts IS NOT NULL')
+        return ' AND '.join(condicoes), params
+
+    def _select_colunas(self, colunas: List[str]) -> str:
+        desconhecidas = [coluna for coluna in colunas if coluna not in self._COLUNAS_FETCH]
+        if desconhecidas:
+            raise ValueError(f"Colunas desconhecidas: {desconhecidas}")
+        return ", ".join(self._COLUNAS_FETCH[coluna][0] for coluna in colunas)
+
+    def _fetch_tuplas(self, query: str, params: List[Any]) -> List[tuple]:
+        """Tuplas puras (sem sqlite3.Row), na conexão de leitura da thread"""
+        cursor = self.db.reader().cursor()
+        cursor.row_factory = None
+        return cursor.execute(query, params).fetchall()
+
+    def _para_arrays(self, colunas: List[str], rows: List[tuple]) -> Dict[str, Any]:
+        """Transpõe as tuplas (em C) e tipa cada coluna"""
+        import numpy as np
+
+        valores = list(zip(*rows)) if rows else [()] * len(colunas)
+        return {
+            coluna: np.array(valores[i], dtype=self._COLUNAS_FETCH[coluna][1])
+            for i, coluna in enumerate(colunas)
+        }
+
     def finalize_downtime(self, uuid: str, data_final: datetime) -> None:
         """Finaliza uma parada"""
-        query = 'UPDATE historico_paradas SET data_final = ? WHERE uuid = ?'
+        self.flush()
+        row = self.db.fetch_one(
+            'SELECT equipamento, turno, data_inicial_ts FROM historico_paradas '
+            'WHERE uuid = ? AND data_final_ts IS NULL',
+            (uuid,)
+        )
+        if row is None:
+            return  # Inexistente ou já finalizada
+
+        query = 'UPDATE historico_paradas SET data_final = ?, data_final_ts = ? WHERE uuid = ?'
         # Remove microssegundos antes de salvar
         data_final_str = data_final.replace(microsecond=0).strftime('%Y-%m-%d %H:%M:%S')
-        params = (data_final_str, uuid)
-        self.db.execute_query(query, params)
+        params = (data_final_str, datetime_para_epoch(data_final), uuid)
+
+        comandos = [(query, params)]
+        if row['data_inicial_ts'] is not None:
+            comandos.extend(self.metricas.comandos_parada(
+                row['equipamento'], epoch_para_datetime(row['data_inicial_ts']), data_final, row['turno']
+            ))
+        self._escrever(comandos)
 
     def _row_to_downtime(self, row) -> Downtime:
         """Converte row do SQLite para Downtime"""
@@ -292,8 +722,10 @@ class DowntimeRepository(IDowntimeRepository):
             setor=row['setor'] or 'Geral'
         )
 
-        data_final = None
-        if row['data_final']:
+        # Epoch inteiro; o texto só é usado em linhas que o backfill não converteu
+        if row['data_final_ts'] is not None:
+            data_final = epoch_para_datetime(row['data_final_ts'])
+        else:
             data_final = parse_datetime_safe(row['data_final'])
 
         turno = Turno.T1
@@ -302,7 +734,10 @@ class DowntimeRepository(IDowntimeRepository):
         except:
             pass
 
-        data_inicial = parse_datetime_safe(row['data_inicial']) or datetime.now()
+        if row['data_inicial_ts'] is not None:
+            data_inicial = epoch_para_datetime(row['data_inicial_ts'])
+        else:
+            data_inicial = parse_datetime_safe(row['data_inicial']) or datetime.now()
 
         return Downtime(
             uuid=row['uuid'],
@@ -318,35 +753,71 @@ class DowntimeRepository(IDowntimeRepository):
 
 
 class EventRepository(IEventRepository):
-    """Repositório de eventos usando SQLite"""
+    """
+    Repositório de eventos usando SQLite
+
+    Com write_behind, os eventos vão para a fila e são gravados em lote
+    (group commit); as leituras gravam a fila antes de consultar.
+    """
+
+    _INSERT = '''
+        INSERT INTO eventos (timestamp, maquina, status_anterior, status_novo, timestamp_ts)
+        VALUES (?, ?, ?, ?, ?)
+    '''
 
-    def __init__(self, db: DatabaseConnection):
+    def __init__(self, db: DatabaseConnection, write_behind: Optional[WriteBehindQueue] = None):
         self.db = db
+        self.write_behind = write_behind
+
+    def flush(self) -> None:
+        """Grava os eventos pendentes da fila write-behind"""
+        if self.write_behind is not None:
+            self.write_behind.flush()
 
     def save(self, event: Event) -> None:
         """Salva um evento"""
-        query = '''
-            INSERT INTO eventos (timestamp, maquina, status_anterior, status_novo)
-            VALUES (?, ?, ?, ?)
-        '''
+        params = self._params_insert(event)
+        if self.write_behind is not None:
+            self.write_behind.enqueue(self._INSERT, params)
+        else:
+            self.db.execute_query(self._INSERT, params)
+
+    def save_many(self, events: List[Event]) -> None:
+        """Salva vários eventos em uma única transação"""
+        params_list = [self._params_insert(event) for event in events]
+        if self.write_behind is not None:
+            self.write_behind.enqueue_many(self._INSERT, params_list)
+        else:
+            self.db.execute_many(self._INSERT, params_list)
+
+    def _params_insert(self, event: Event) -> tuple:
         # Remove microssegundos antes de salvar
         timestamp_str = event.timestamp.replace(microsecond=0).strftime('%Y-%m-%d %H:%M:%S')
-        params = (
+        return (
             timestamp_str,
             event.maquina,
             event.status_anterior,
-            event.status_novo
+            event.status_novo,
+            datetime_para_epoch(event.timestamp)
         )
-        self.db.execute_query(query, params)
 
-    def get_recent(self, limit: int = 100) -> List[Event]:
-        """Retorna eventos recentes"""
-        query = 'SELECT * FROM eventos ORDER BY timestamp DESC LIMIT ?'
-        rows = self.db.fetch_all(query, (limit,))
+    def get_recent(self, limit: int = 100, maquina: str = None) -> List[Event]:
+        """Retorna eventos recentes (de todas as máquinas ou de uma)"""
+        if maquina:
+            query = 'SELECT * FROM eventos WHERE maquina = ? ORDER BY timestamp_ts DESC LIMIT ?'
+            params = (maquina, limit)
+        else:
+            query = 'SELECT * FROM eventos ORDER BY timestamp_ts DESC LIMIT ?'
+            params = (limit,)
+        self.flush()
+        rows = self.db.fetch_all(query, params)
 
         eventos = []
         for row in rows:
-            timestamp = parse_datetime_safe(row['timestamp']) or datetime.now()
+            if row['timestamp_ts'] is not None:
+                timestamp = epoch_para_datetime(row['timestamp_ts'])
+            else:
+                timestamp = parse_datetime_safe(row['timestamp']) or datetime.now()
             evento = Event(
                 timestamp=timestamp,
                 maquina=row['maquina'],
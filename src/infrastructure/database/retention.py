@@ -0,0 +1,341 @@
+"""
+Retenção do banco quente: move eventos e paradas antigos para arquivos por mês
+e compacta o SQLite usado pelo serviço.
+
+Destino do arquivo morto (pasta/<tabela>/...):
+    - Parquet (mes=YYYY-MM/parte-*.parquet), quando o pyarrow está instalado
+    - SQLite (YYYY-MM.db, mesmo schema da tabela), sem dependências extras
+
+O rollup diário (metricas_diarias) continua no banco quente, então os KPIs
+de longo prazo não dependem do arquivo. Execução (ex: agendada 1x por dia):
+    python -m src.infrastructure.database.retention monitoramento.db --dias-eventos 90 --dias-paradas 365
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import argparse
+import calendar
+import os
+import sqlite3
+import time
+from .connection import DatabaseConnection
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# tabela: (coluna de corte, coluna de partição por mês, chave, filtro extra)
+# Paradas saem pelo fim (nunca as ativas) e são arquivadas no mês em que começaram
+_TABELAS: Dict[str, Tuple[str, str, str, str]] = {
+    'eventos': ('timestamp_ts', 'timestamp_ts', 'id', '1'),
+    'historico_paradas': ('data_final_ts', 'data_inicial_ts', 'uuid', 'data_inicial_ts IS NOT NULL'),
+}
+
+_TIPOS_PARQUET = {'INTEGER': 'int64', 'REAL': 'float64'}
+
+
+def _epoch(dt: datetime) -> int:
+    """Mesma convenção das colunas *_ts (horário local, sem fuso)"""
+    return calendar.timegm(dt.timetuple())
+
+
+def _mes(epoch: int) -> str:
+    return time.strftime('%Y-%m', time.gmtime(epoch))
+
+
+def _meses_entre(inicio_ts: int, fim_ts: int) -> List[str]:
+    """Meses 'YYYY-MM' que o intervalo [inicio_ts, fim_ts) toca"""
+    ano, mes = map(int, _mes(inicio_ts).split('-'))
+    ultimo = _mes(max(inicio_ts, fim_ts - 1))
+    meses = []
+    while True:
+        atual = f'{ano:04d}-{mes:02d}'
+        meses.append(atual)
+        if atual >= ultimo:
+            return meses
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    Janelas quentes (dias mantidos no banco do serviço) e destino do arquivo.
+    formato: 'parquet', 'sqlite' ou 'auto' (parquet se o pyarrow estiver instalado)
+    compactacao: 'incremental' (libera só as páginas vazias; a primeira execução
+    converte o banco com um VACUUM), 'vacuum' (VACUUM completo) ou None
+    """
+    dias_eventos: int = 90
+    dias_paradas: int = 365
+    pasta: str = 'arquivo'
+    formato: str = 'auto'
+    tamanho_lote: int = 20000
+    compactacao: Optional[str] = 'incremental'
+
+    def janela(self, tabela: str) -> int:
+        return self.dias_eventos if tabela == 'eventos' else self.dias_paradas
+
+
+class ArchiveManager:
+    """Aplica a política de retenção e lê o histórico (quente + arquivo) para relatórios longos"""
+
+    def __init__(self, db: DatabaseConnection, politica: RetentionPolicy = None):
+        self.db = db
+        self.politica = politica or RetentionPolicy()
+        formato = self.politica.formato
+        if formato == 'auto':
+            formato = 'parquet' if pa is not None else 'sqlite'
+        elif formato == 'parquet' and pa is None:
+            print("⚠️ pyarrow não instalado: arquivando em SQLite")
+            formato = 'sqlite'
+        self.formato = formato
+
+    # ============== ARQUIVAMENTO ==============
+
+    def executar(self, agora: datetime = None) -> Dict[str, int]:
+        """Arquiva o que passou da janela de cada tabela e compacta o banco se algo saiu"""
+        movidas = self.arquivar(agora)
+        if any(movidas.values()):
+            self.compactar()
+        return movidas
+
+    def arquivar(self, agora: datetime = None) -> Dict[str, int]:
+        """Move as linhas fora da janela quente para o arquivo. Retorna linhas movidas por tabela"""
+        agora = agora or datetime.now()
+        self._limpar_temporarios()
+        movidas = {}
+        for tabela in _TABELAS:
+            corte_ts = _epoch(agora - timedelta(days=self.politica.janela(tabela)))
+            total = 0
+            while True:
+                n = self._mover_lote(tabela, corte_ts)
+                total += n
+                if n < self.politica.tamanho_lote:
+                    break
+            movidas[tabela] = total
+            if total:
+                print(f"📦 {total} linha(s) de {tabela} arquivadas ({self.formato})")
+        return movidas
+
+    def _mover_lote(self, tabela: str, corte_ts: int) -> int:
+        """
+        Um lote em uma transação IMMEDIATE: lê, grava no arquivo e apaga do banco
+        quente. O arquivo é gravado antes do commit; se o processo cair entre os
+        dois, a próxima execução regrava as mesmas linhas (deduplicadas na leitura)
+        """
+        coluna_corte, coluna_mes, _, filtro = _TABELAS[tabela]
+        colunas = self._colunas(tabela)
+
+        with self.db.transaction() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            linhas = conn.execute(
+                f'SELECT rowid, {", ".join(colunas)} FROM {tabela} '
+                f'WHERE {coluna_corte} < ? AND {filtro} ORDER BY {coluna_corte} LIMIT ?',
+                (corte_ts, self.politica.tamanho_lote)
+            ).fetchall()
+            if not linhas:
+                return 0
+
+            indice_mes = colunas.index(coluna_mes) + 1
+            por_mes: Dict[str, List[tuple]] = {}
+            for linha in linhas:
+                por_mes.setdefault(_mes(linha[indice_mes]), []).append(tuple(linha)[1:])
+
+            for mes, valores in por_mes.items():
+                if self.formato == 'parquet':
+                    self._gravar_parquet(tabela, mes, colunas, valores)
+                else:
+                    self._gravar_sqlite(conn, tabela, mes, colunas, valores)
+
+            conn.executemany(f'DELETE FROM {tabela} WHERE rowid = ?', [(linha[0],) for linha in linhas])
+            return len(linhas)
+
+    def _gravar_parquet(self, tabela: str, mes: str, colunas: List[str], valores: List[tuple]):
+        pasta = os.path.join(self.politica.pasta, tabela, f'mes={mes}')
+        os.makedirs(pasta, exist_ok=True)
+
+        tipos = self._tipos(tabela)
+        tabela_pa = pa.table({
+            coluna: pa.array([linha[i] for linha in valores], type=getattr(pa, tipos[coluna])())
+            for i, coluna in enumerate(colunas)
+        })
+
+        # Nome único por execução; gravado em temporário + replace (nunca fica pela metade).
+        # O temporário começa com '_': a leitura do dataset (pyarrow) ignora esse prefixo
+        nome = f'parte-{time.time_ns()}.parquet'
+        temporario = os.path.join(pasta, f'_{nome}.tmp')
+        pq.write_table(tabela_pa, temporario, compression='zstd')
+        os.replace(temporario, os.path.join(pasta, nome))
+
+    def _limpar_temporarios(self) -> int:
+        """Remove temporários deixados por um arquivamento interrompido (as linhas continuam no banco quente)"""
+        removidos = 0
+        for tabela in _TABELAS:
+            pasta_tabela = os.path.join(self.politica.pasta, tabela)
+            if not os.path.isdir(pasta_tabela):
+                continue
+            for particao in os.scandir(pasta_tabela):
+                if not (particao.is_dir() and particao.name.startswith('mes=')):
+                    continue
+                for arquivo in os.scandir(particao.path):
+                    if arquivo.name.endswith('.tmp'):
+                        os.remove(arquivo.path)
+                        removidos += 1
+        if removidos:
+            print(f"🧹 {removidos} temporário(s) de arquivamento interrompido removido(s)")
+        return removidos
+
+    def _gravar_sqlite(self, conn: sqlite3.Connection, tabela: str, mes: str, colunas: List[str], valores: List[tuple]):
+        pasta = os.path.join(self.politica.pasta, tabela)
+        os.makedirs(pasta, exist_ok=True)
+
+        # Mesmo CREATE TABLE do banco quente (chave primária evita duplicatas ao regravar)
+        sql_tabela = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (tabela,)
+        ).fetchone()[0]
+        coluna_mes = _TABELAS[tabela][1]
+
+        arquivo = sqlite3.connect(os.path.join(pasta, f'{mes}.db'))
+        try:
+            arquivo.execute(sql_tabela.replace('CREATE TABLE', 'CREATE TABLE IF NOT EXISTS', 1))
+            arquivo.execute(f'CREATE INDEX IF NOT EXISTS idx_{tabela}_{coluna_mes} ON {tabela}({coluna_mes})')
+            arquivo.executemany(
+                f'INSERT OR IGNORE INTO {tabela} ({", ".join(colunas)}) VALUES ({", ".join("?" * len(colunas))})',
+                valores
+            )
+            arquivo.commit()
+        finally:
+            arquivo.close()
+
+    def compactar(self) -> None:
+        """Checkpoint do WAL e devolução do espaço liberado ao sistema de arquivos"""
+        modo = self.politica.compactacao
+        if not modo:
+            return
+
+        inicio = time.perf_counter()
+        # Fora de transação (VACUUM não roda dentro de uma), mas com o lock de escrita
+        with self.db.transaction() as conn:
+            try:
+                if modo == 'incremental' and conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+                    conn.execute('PRAGMA incremental_vacuum')
+                else:
+                    if modo == 'incremental':
+                        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                    conn.execute('VACUUM')
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            except sqlite3.OperationalError as e:
+                print(f"Erro ao compactar o banco: {e}")
+                return
+        print(f"🧹 Banco compactado ({modo}, {time.perf_counter() - inicio:.1f}s)")
+
+    # ============== LEITURA (RELATÓRIOS LONGOS) ==============
+
+    def ler_paradas(self, data_inicio: datetime, data_fim: datetime, equipamento: str = None, apenas_arquivo: bool = False):
+        """Paradas iniciadas em [data_inicio, data_fim), do banco quente e do arquivo (DataFrame)"""
+        return self._ler('historico_paradas', data_inicio, data_fim, ('equipamento', equipamento), apenas_arquivo)
+
+    def ler_eventos(self, data_inicio: datetime, data_fim: datetime, maquina: str = None):
+        """Eventos em [data_inicio, data_fim), do banco quente e do arquivo (DataFrame)"""
+        return self._ler('eventos', data_inicio, data_fim, ('maquina', maquina))
+
+    def meses_arquivados(self, tabela: str) -> List[str]:
+        """Meses 'YYYY-MM' com linhas da tabela no arquivo (Parquet ou SQLite), em ordem"""
+        pasta = os.path.join(self.politica.pasta, tabela)
+        if not os.path.isdir(pasta):
+            return []
+        meses = set()
+        for nome in os.listdir(pasta):
+            if nome.startswith('mes=') and self._tem_partes(os.path.join(pasta, nome)):
+                meses.add(nome[4:])
+            elif nome.endswith('.db'):
+                meses.add(nome[:-3])
+        return sorted(meses)
+
+    def _ler(
+        self,
+        tabela: str,
+        data_inicio: datetime,
+        data_fim: datetime,
+        filtro: Tuple[str, Optional[str]],
+        apenas_arquivo: bool = False
+    ):
+        import pandas as pd
+
+        _, coluna_mes, chave, _ = _TABELAS[tabela]
+        inicio_ts, fim_ts = _epoch(data_inicio), _epoch(data_fim)
+        coluna_filtro, valor_filtro = filtro
+
+        query = f'SELECT * FROM {tabela} WHERE {coluna_mes} >= ? AND {coluna_mes} < ?'
+        params: List[Any] = [inicio_ts, fim_ts]
+        if valor_filtro is not None:
+            query += f' AND {coluna_filtro} = ?'
+            params.append(valor_filtro)
+
+        # Banco quente primeiro: em duplicatas (arquivamento interrompido) ele prevalece
+        partes = [pd.read_sql_query(query + (' AND 0' if apenas_arquivo else ''), self.db.reader(), params=params)]
+        for mes in _meses_entre(inicio_ts, fim_ts):
+            pasta_parquet = os.path.join(self.politica.pasta, tabela, f'mes={mes}')
+            arquivo_sqlite = os.path.join(self.politica.pasta, tabela, f'{mes}.db')
+
+            if self._tem_partes(pasta_parquet) and pq is not None:
+                filtros = [(coluna_mes, '>=', inicio_ts), (coluna_mes, '<', fim_ts)]
+                if valor_filtro is not None:
+                    filtros.append((coluna_filtro, '=', valor_filtro))
+                partes.append(pq.read_table(pasta_parquet, filters=filtros).to_pandas())
+
+            if os.path.exists(arquivo_sqlite):
+                arquivo = sqlite3.connect(arquivo_sqlite)
+                try:
+                    partes.append(pd.read_sql_query(query, arquivo, params=params))
+                finally:
+                    arquivo.close()
+
+        partes = [parte for parte in partes if not parte.empty] or partes[:1]
+        df = pd.concat(partes, ignore_index=True).drop_duplicates(subset=chave, keep='first')
+        return df.sort_values(coluna_mes, kind='stable').reset_index(drop=True)
+
+    # ============== AUXILIARES ==============
+
+    @staticmethod
+    def _tem_partes(pasta: str) -> bool:
+        """Partição com algum arquivo visível ao pyarrow (ignora '_' e '.', ex: temporário interrompido)"""
+        return os.path.isdir(pasta) and any(not nome.startswith(('_', '.')) for nome in os.listdir(pasta))
+
+    def _colunas(self, tabela: str) -> List[str]:
+        return [row[1] for row in self.db.fetch_all(f'PRAGMA table_info({tabela})')]
+
+    def _tipos(self, tabela: str) -> Dict[str, str]:
+        """Tipo Arrow por coluna, a partir do tipo declarado no SQLite (TEXT e demais viram string)"""
+        return {
+            row[1]: _TIPOS_PARQUET.get((row[2] or '').upper(), 'string')
+            for row in self.db.fetch_all(f'PRAGMA table_info({tabela})')
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Arquiva eventos e paradas antigos e compacta o banco do serviço")
+    parser.add_argument('banco', nargs='?', default='monitoramento.db')
+    parser.add_argument('--dias-eventos', type=int, default=90)
+    parser.add_argument('--dias-paradas', type=int, default=365)
+    parser.add_argument('--pasta', default='arquivo')
+    parser.add_argument('--formato', choices=('auto', 'parquet', 'sqlite'), default='auto')
+    parser.add_argument('--compactacao', choices=('incremental', 'vacuum', 'nenhuma'), default='incremental')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    db = DatabaseConnection(args.banco)
+    db.init_schema()
+    politica = RetentionPolicy(
+        dias_eventos=args.dias_eventos,
+        dias_paradas=args.dias_paradas,
+        pasta=args.pasta,
+        formato=args.formato,
+        compactacao=None if args.compactacao == 'nenhuma' else args.compactacao
+    )
+    movidas = ArchiveManager(db, politica).executar()
+    db.close()
+    print(f"Retenção aplicada: {movidas} ({time.perf_counter() - inicio:.1f}s)")
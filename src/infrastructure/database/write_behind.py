@@ -0,0 +1,183 @@
+from typing import List, Tuple, Optional
+from collections import deque
+from datetime import datetime
+import atexit
+import json
+import sqlite3
+import threading
+from .connection import DatabaseConnection
+
+
+Comando = Tuple[str, tuple]
+
+
+def erro_transitorio(erro: Exception) -> bool:
+    """Banco ocupado por outro processo: vale tentar de novo. O resto (UNIQUE, schema...) não"""
+    mensagem = str(erro).lower()
+    return isinstance(erro, sqlite3.OperationalError) and ('locked' in mensagem or 'busy' in mensagem)
+
+
+class WriteBehindQueue:
+    """
+    Fila de escrita com group commit para os repositórios SQLite
+
+    As escritas ficam em memória em grupos (um ou mais comandos (query, params)
+    que precisam ir juntos, ex: parada + rollup) e são gravadas em uma única
+    transação: no flush explícito (fim de cada ciclo de scan), a cada
+    intervalo_flush segundos pela thread de fundo, quando a fila atinge
+    max_itens (o chamador grava na hora) e no encerramento do processo
+    (atexit). A ordem das escritas é preservada.
+
+    Se a transação falha com o banco ocupado, tudo volta para a fila. Com
+    outro erro (ex: uuid duplicado), os grupos são regravados um a um e só o
+    grupo com erro vai para os rejeitados (memória e, com arquivo_rejeitados,
+    uma linha JSON por grupo), sem travar as escritas seguintes. Acima de
+    max_pendentes (banco ocupado por muito tempo), os grupos mais antigos
+    também vão para os rejeitados: a memória da fila é limitada.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseConnection,
+        max_itens: int = 5000,
+        intervalo_flush: Optional[float] = 2.0,
+        max_pendentes: int = 100000,
+        arquivo_rejeitados: Optional[str] = None
+    ):
+        self.db = db
+        self.max_itens = max_itens
+        self.intervalo_flush = intervalo_flush
+        self.max_pendentes = max(max_pendentes, max_itens)
+        self.arquivo_rejeitados = arquivo_rejeitados
+
+        self._pendentes: deque = deque()
+        self._n_pendentes = 0  # Comandos (não grupos) na fila
+        self._lock = threading.Lock()
+        # Garante uma transação de flush por vez (e na ordem de enfileiramento)
+        self._flush_lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Após um "banco ocupado", a fila cheia não força novo flush a cada
+        # escrita (cada tentativa esperaria o busy_timeout): fica para o próximo flush
+        self._ocupado = False
+
+        # Últimos grupos rejeitados: (grupo, erro)
+        self.rejeitados: deque = deque(maxlen=1000)
+        self.estatisticas = {
+            'enfileirados': 0, 'flushes': 0, 'gravados': 0, 'flushes_por_limite': 0,
+            'rejeitados': 0, 'descartados_por_limite': 0
+        }
+
+        if intervalo_flush:
+            self._thread = threading.Thread(target=self._loop, name="write-behind", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, query: str, params: tuple) -> None:
+        """Enfileira uma escrita; com a fila cheia, grava tudo antes de retornar"""
+        self.enqueue_grupo([(query, params)])
+
+    def enqueue_grupo(self, comandos: List[Comando]) -> None:
+        """Enfileira comandos que são gravados (ou rejeitados) juntos"""
+        if not comandos:
+            return
+
+        excedentes = []
+        with self._lock:
+            self._pendentes.append(list(comandos))
+            self._n_pendentes += len(comandos)
+            self.estatisticas['enfileirados'] += len(comandos)
+            cheia = self._n_pendentes >= self.max_itens
+            while self._n_pendentes > self.max_pendentes and len(self._pendentes) > 1:
+                grupo = self._pendentes.popleft()
+                self._n_pendentes -= len(grupo)
+                excedentes.append(grupo)
+
+        for grupo in excedentes:
+            self.estatisticas['descartados_por_limite'] += len(grupo)
+            self._rejeitar(grupo, 'fila acima de max_pendentes')
+
+        if cheia and not self._ocupado:
+            self.estatisticas['flushes_por_limite'] += 1
+            self.flush()
+
+    def enqueue_many(self, query: str, params_list: List[tuple]) -> None:
+        for params in params_list:
+            self.enqueue(query, params)
+
+    def pending(self) -> int:
+        """Quantidade de escritas ainda não gravadas"""
+        with self._lock:
+            return self._n_pendentes
+
+    def flush(self) -> int:
+        """Grava as escritas pendentes em uma única transação. Retorna quantas foram gravadas"""
+        with self._flush_lock:
+            with self._lock:
+                grupos = list(self._pendentes)
+                self._pendentes.clear()
+                self._n_pendentes = 0
+            if not grupos:
+                return 0
+
+            try:
+                gravados = self.db.execute_batch([comando for grupo in grupos for comando in grupo])
+                self._ocupado = False
+            except Exception as e:
+                if erro_transitorio(e):
+                    print(f"⚠️ Banco ocupado, {sum(map(len, grupos))} escrita(s) ficam na fila: {e}")
+                    self._devolver(grupos)
+                    self._ocupado = True
+                    return 0
+                self._ocupado = False
+                gravados = self._gravar_um_a_um(grupos)
+
+            self.estatisticas['flushes'] += 1
+            self.estatisticas['gravados'] += gravados
+            return gravados
+
+    def _gravar_um_a_um(self, grupos: List[List[Comando]]) -> int:
+        """Regrava cada grupo em sua transação, separando os que falham de novo"""
+        gravados = 0
+        for i, grupo in enumerate(grupos):
+            try:
+                gravados += self.db.execute_batch(grupo)
+            except Exception as e:
+                if erro_transitorio(e):
+                    self._devolver(grupos[i:])
+                    self._ocupado = True
+                    break
+                self._rejeitar(grupo, str(e))
+        return gravados
+
+    def _devolver(self, grupos: List[List[Comando]]):
+        """Volta os grupos para o início da fila, na ordem, para a próxima tentativa"""
+        with self._lock:
+            self._pendentes.extendleft(reversed(grupos))
+            self._n_pendentes += sum(map(len, grupos))
+
+    def _rejeitar(self, grupo: List[Comando], erro: str):
+        self.rejeitados.append((grupo, erro))
+        self.estatisticas['rejeitados'] += len(grupo)
+        print(f"❌ Escrita rejeitada ({len(grupo)} comando(s)): {erro}")
+        if self.arquivo_rejeitados:
+            try:
+                with open(self.arquivo_rejeitados, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({
+                        'quando': datetime.now().isoformat(timespec='seconds'),
+                        'erro': erro,
+                        'comandos': [{'query': ' '.join(query.split()), 'params': list(params)} for query, params in grupo]
+                    }, ensure_ascii=False, default=str) + '\n')
+            except OSError as e:
+                print(f"Erro ao registrar escrita rejeitada: {e}")
+
+    def close(self) -> None:
+        """Para a thread de fundo e grava o que restou"""
+        self._parar.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _loop(self):
+        while not self._parar.wait(self.intervalo_flush):
+            self.flush()
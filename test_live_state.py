@@ -0,0 +1,65 @@
+"""
+Confere o estado ao vivo (memória compartilhada) entre escritor e leitor.
+
+	- todo MachineStatus tem código fixo no arquivo (e o código não depende da
+	  ordem do enum)
+	- frota maior que a capacidade: o arquivo cresce no lugar (mesmo inode) e o
+	  leitor já aberto enxerga os slots novos sem reabrir
+	- reinício do escritor mantém os slots e o estado
+
+	python -m pytest test_live_state.py
+"""
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.domain.enums import MachineStatus
+from src.infrastructure.database import live_state_store
+from src.infrastructure.database.live_state_store import LiveStateStore
+
+
+def test_codigos_de_status_fixos() :
+	codigos = live_state_store._CODIGO_POR_STATUS
+	assert set(codigos) == set(MachineStatus), "status sem código no estado ao vivo"
+	assert len(set(codigos.values())) == len(codigos)
+	# Códigos já gravados em arquivos existentes
+	assert codigos[MachineStatus.PRODUZINDO] == 0 and codigos[MachineStatus.PARADA] == 1
+	assert codigos[MachineStatus.SEM_REDE] == 2 and codigos[MachineStatus.AGUARDANDO] == 6
+
+
+def test_arquivo_cresce_no_lugar(tmp_path) :
+	caminho = os.path.join(tmp_path, "estado_vivo.bin")
+	escritor = LiveStateStore(caminho, escrita=True, capacidade=2)
+	escritor.registrar(["M01", "M02"])
+	escritor.atualizar_estado("M01", MachineStatus.PARADA, "#dc3545", datetime(2025, 6, 15, 8, 0), 0)
+
+	leitor = LiveStateStore(caminho)
+	assert leitor.ler("M01")["status"] == MachineStatus.PARADA
+	inode = os.stat(caminho).st_ino
+
+	ids = [f"M{i:02d}" for i in range(1, 11)]
+	escritor.registrar(ids)
+	for api_id in ids[1:] :
+		escritor.atualizar_estado(api_id, MachineStatus.PRODUZINDO, "#28a745")
+	assert escritor.capacidade >= 10
+	assert os.stat(caminho).st_ino == inode, "arquivo substituído em vez de aumentado"
+
+	estados = leitor.ler_todos()
+	assert set(estados) == set(ids)
+	assert estados["M01"]["status"] == MachineStatus.PARADA
+	assert estados["M01"]["desde"] == datetime(2025, 6, 15, 8, 0)
+	assert estados["M10"]["status"] == MachineStatus.PRODUZINDO
+
+	# Reinício do escritor: mesmos slots, estado preservado
+	escritor.close()
+	escritor = LiveStateStore(caminho, escrita=True, capacidade=2)
+	escritor.registrar(ids)
+	escritor.atualizar_estado("M05", MachineStatus.SEM_REDE, "#dc3545", contador_falhas=3)
+	assert leitor.ler("M01")["status"] == MachineStatus.PARADA
+	assert leitor.ler("M05")["status"] == MachineStatus.SEM_REDE
+	assert leitor.ler("M05")["contador_falhas"] == 3
+
+	leitor.close()
+	escritor.close()
@@ -0,0 +1,60 @@
+"""
+Confere a revalidação do cache do feed Metris.
+
+	- recurso que saiu do feed (e campo que deixou de vir) envelhece e fica
+	  marcado como expirado, mas não dispara revalidação a cada snapshot
+	- feed mais velho que o TTL dispara a revalidação
+	- a revalidação não acontece antes de um intervalo desde o último sucesso
+
+	python -m pytest test_metris_cache.py
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("requests")
+from integration_api import MetrisFeedCache
+
+
+class FeedFalso :
+	def __init__(self, *feeds) :
+		self.feeds = list(feeds)
+
+	def __call__(self) :
+		return self.feeds.pop(0) if len(self.feeds) > 1 else self.feeds[0]
+
+
+def test_recurso_fora_do_feed_nao_revalida() :
+	feed = FeedFalso(
+		{ "LOOM01" : { "descricao" : "OPERANDO", "cor" : "#007B38" }, "LOOM02" : { "descricao" : "SETUP" } },
+		{ "LOOM01" : { "descricao" : "OPERANDO" } }  # LOOM02 saiu do feed, LOOM01 sem cor
+	)
+	cache = MetrisFeedCache(intervalo=0.05, ttl=0.2, buscar=feed)
+	assert cache.atualizar()
+	time.sleep(0.3)
+	assert cache.atualizar()
+
+	mapa = cache.snapshot()
+	assert mapa["LOOM02"]["expirado"] and mapa["LOOM01"]["expirado"]  # valores antigos continuam servidos
+	assert mapa["LOOM02"]["descricao"] == "SETUP" and mapa["LOOM01"]["cor"] == "#007B38"
+	assert not cache._revalidar.is_set(), "recurso fora do feed disparou revalidação"
+
+	# O feed em si envelheceu: agora revalida
+	time.sleep(0.3)
+	cache.snapshot()
+	assert cache._revalidar.is_set()
+
+
+def test_revalidacao_limitada_ao_intervalo() :
+	cache = MetrisFeedCache(intervalo=0.5, ttl=0.05, buscar=FeedFalso({ "LOOM01" : { "descricao" : "OPERANDO" } }))
+	assert cache.atualizar()
+	time.sleep(0.1)
+	assert cache.snapshot()["LOOM01"]["expirado"]
+	assert not cache._revalidar.is_set(), "revalidação antes do intervalo"
+	time.sleep(0.5)
+	cache.snapshot()
+	assert cache._revalidar.is_set()
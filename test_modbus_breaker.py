@@ -0,0 +1,115 @@
+"""
+Confere o circuit breaker do cliente Modbus TCP nas leituras.
+
+	- dispositivo que não aceita conexão: após limite_falhas leituras o circuito
+	  abre e as leituras seguintes retornam sem tentar conectar
+	- dispositivo que responde: a leitura fecha o circuito
+	- resposta com PDU truncada (exceção sem código ou byte count diferente do
+	  pedido): conta como falha e a conexão é fechada
+
+	python -m pytest test_modbus_breaker.py
+"""
+import os
+import sys
+import socket
+import struct
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.domain.models import Machine, Hierarquia, CommunicationConfig
+from src.domain.enums import CommunicationType
+from src.infrastructure.communication.circuit_breaker import CircuitBreaker, CircuitState
+from src.infrastructure.communication.modbus_client import ModbusTCPClient
+
+
+def maquina(porta) :
+	return Machine(nome="Tear 12", api_id="T12", ip="127.0.0.1", hierarquia=Hierarquia(),
+		comunicacao=CommunicationConfig(tipo=CommunicationType.MODBUS_TCP, endpoint=f"127.0.0.1:{porta}", porta=porta))
+
+
+def porta_fechada() :
+	sock = socket.socket()
+	sock.bind(("127.0.0.1", 0))
+	porta = sock.getsockname()[1]
+	sock.close()
+	return porta
+
+
+def servidor_resposta(servidor, pdu) :
+	"""Responde toda requisição com a mesma PDU"""
+	conexao, _ = servidor.accept()
+	with conexao :
+		while True :
+			cabecalho = conexao.recv(7)
+			if len(cabecalho) < 7 :
+				return
+			transacao, _, tamanho, unit_id = struct.unpack(">HHHB", cabecalho)
+			conexao.recv(tamanho - 1)
+			conexao.sendall(struct.pack(">HHHB", transacao, 0, len(pdu) + 1, unit_id) + pdu)
+
+
+def iniciar_servidor(pdu) :
+	servidor = socket.socket()
+	servidor.bind(("127.0.0.1", 0))
+	servidor.listen()
+	threading.Thread(target=servidor_resposta, args=(servidor, pdu), daemon=True).start()
+	return servidor
+
+
+def test_leituras_com_falha_abrem_o_circuito() :
+	porta = porta_fechada()
+	breaker = CircuitBreaker(limite_falhas=3, janela_abertura=60)
+	cliente = ModbusTCPClient(timeout=0.5, circuit_breaker=breaker)
+	m = maquina(porta)
+
+	for _ in range(3) :
+		assert cliente.read_values(m, ["coil:0"]) == { "coil:0" : None }
+	assert breaker.estado(m.comunicacao.endpoint) == CircuitState.OPEN, "leituras com falha não abriram o circuito"
+
+	# Circuito aberto: nem tenta conectar
+	def conectar_proibido(conexao) :
+		raise AssertionError("conectou com o circuito aberto")
+	cliente._conectar = conectar_proibido
+	assert cliente.read_values(m, ["coil:0"]) == { "coil:0" : None }
+
+
+def test_leitura_com_resposta_fecha_o_circuito() :
+	# Leitura de coils (função 1) respondida com o bit 1
+	servidor = iniciar_servidor(bytes([1, 1, 1]))
+
+	breaker = CircuitBreaker(limite_falhas=3)
+	cliente = ModbusTCPClient(timeout=2.0, circuit_breaker=breaker)
+	m = maquina(servidor.getsockname()[1])
+	breaker.registrar_falha(m.comunicacao.endpoint)
+	breaker.registrar_falha(m.comunicacao.endpoint)
+
+	assert cliente.read_values(m, ["coil:0"]) == { "coil:0" : True }
+	# Falhas anteriores zeradas: mais duas não abrem o circuito
+	breaker.registrar_falha(m.comunicacao.endpoint)
+	breaker.registrar_falha(m.comunicacao.endpoint)
+	assert breaker.estado(m.comunicacao.endpoint) == CircuitState.CLOSED
+
+	cliente.disconnect_all()
+	servidor.close()
+
+
+@pytest.mark.parametrize("pdu, tag", [
+	(bytes([0x81]), "coil:0"),  # Exceção Modbus sem o código (PDU de 1 byte)
+	(bytes([3, 4, 0, 1]), "hr:0:u32"),  # 0x03 pedindo 2 registradores, byte count 4 e só 1 registrador
+], ids=["excecao_sem_codigo", "registradores_truncados"])
+def test_pdu_invalida_registra_falha(pdu, tag) :
+	servidor = iniciar_servidor(pdu)
+
+	breaker = CircuitBreaker(limite_falhas=1, janela_abertura=60)
+	cliente = ModbusTCPClient(timeout=2.0, circuit_breaker=breaker)
+	m = maquina(servidor.getsockname()[1])
+
+	assert cliente.read_values(m, [tag]) == { tag : None }
+	assert breaker.estado(m.comunicacao.endpoint) == CircuitState.OPEN, "PDU inválida não contou como falha"
+	assert cliente._get_conexao(m.comunicacao.endpoint).sock is None, "conexão não foi fechada"
+
+	cliente.disconnect_all()
+	servidor.close()
@@ -0,0 +1,69 @@
+"""
+Confere o backoff de reconexão do pool de sessões OPC UA.
+
+	- endpoint que nunca conecta: a espera entre tentativas dobra até backoff_max
+	- a limpeza de sessões ociosas não descarta a sessão em backoff (o que
+	  zerava as falhas e recomeçava o backoff em backoff_inicial)
+	- só erros de transporte e status codes de sessão descartam a sessão (tag
+	  mal formada não)
+
+	python -m pytest test_opc_session_pool.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("opcua")
+from src.infrastructure.communication import opc_session_pool
+from src.infrastructure.communication.opc_session_pool import OPCSessionPool, is_session_error
+
+
+ENDPOINT = "opc.tcp://10.0.0.1:4840"
+
+
+class RelogioFalso :
+	def __init__(self) :
+		self.agora = 100000.0
+
+	def monotonic(self) :
+		return self.agora
+
+
+class ClientRecusado :
+	"""Client cuja conexão sempre falha"""
+	tentativas = 0
+
+	def __init__(self, endpoint, timeout=2) :
+		self.endpoint = endpoint
+
+	def connect(self) :
+		ClientRecusado.tentativas += 1
+		raise ConnectionRefusedError("recusado")
+
+
+def test_backoff_sobrevive_a_limpeza(monkeypatch) :
+	relogio = RelogioFalso()
+	monkeypatch.setattr(opc_session_pool, "time", relogio)
+	monkeypatch.setattr(opc_session_pool, "Client", ClientRecusado)
+	ClientRecusado.tentativas = 0
+
+	pool = OPCSessionPool(tempo_ocioso_max=300.0, backoff_inicial=1.0, backoff_max=60.0)
+	esperas = []
+	for _ in range(8) :
+		assert pool.acquire(ENDPOINT) is None
+		sessao = pool._sessoes[ENDPOINT]
+		esperas.append(sessao.proxima_tentativa - relogio.agora)
+		# Avança até a próxima tentativa, sempre passando do intervalo de limpeza
+		relogio.agora = sessao.proxima_tentativa + 61.0
+
+	assert ClientRecusado.tentativas == 8
+	assert esperas == [1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 60.0, 60.0], f"backoff recomeçou: {esperas}"
+
+
+def test_erros_de_sessao() :
+	assert is_session_error(ConnectionResetError("reset"))
+	assert is_session_error(TimeoutError())
+	assert not is_session_error(ValueError("ns=2;s running"))
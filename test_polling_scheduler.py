@@ -0,0 +1,80 @@
+"""
+Confere o intervalo do agendador adaptativo na janela de recuperação.
+
+	- máquina PARADA que volta a produzir: polling rápido durante a janela de
+	  estabilidade
+	- a recuperação falha (volta a PARADA antes de confirmar): sai da janela e
+	  volta ao intervalo padrão, em vez de ficar no polling rápido para sempre
+	- a janela recomeça do zero na próxima leitura PRODUZINDO
+
+	python -m pytest test_polling_scheduler.py
+"""
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.application.services.monitor_service import MonitorService
+from src.application.services.polling_scheduler import AdaptivePollingScheduler
+from src.domain.enums import CommunicationType, MachineStatus
+from src.domain.interfaces import ICommunicationProtocol
+from src.infrastructure.database.connection import DatabaseConnection
+from src.infrastructure.database.repositories import MachineRepository, DowntimeRepository, EventRepository
+
+
+class ProtocoloFixo(ICommunicationProtocol) :
+	"""Responde sempre o valor atual de running (trocado pelo teste)"""
+
+	def __init__(self) :
+		self.valor = False
+
+	def read_value(self, machine, tag) :
+		return self.valor
+
+	def write_value(self, machine, tag, value) :
+		return False
+
+	def check_connection(self, machine) :
+		return True
+
+
+def test_recuperacao_que_falha_sai_do_polling_rapido(tmp_path) :
+	config = os.path.join(tmp_path, "config.json")
+	with open(config, "w", encoding="utf-8") as f :
+		json.dump([{ "nome" : "Tear 01", "api_id" : "T01", "ip" : "10.0.0.1", "node_id" : "ns=2;s=running" }], f)
+
+	db = DatabaseConnection(os.path.join(tmp_path, "polling.db"))
+	db.init_schema()
+	machine_repo = MachineRepository(config, os.path.join(tmp_path, "estado_atual.json"))
+	protocolo = ProtocoloFixo()
+	monitor = MonitorService(machine_repo, DowntimeRepository(db), EventRepository(db),
+		{ CommunicationType.OPC_UA.value : protocolo }, tempo_estabilidade=60)
+	agendador = AdaptivePollingScheduler(monitor, intervalo_padrao=5, intervalo_rapido=1)
+
+	agendador.agendar_todas()
+	maquina = agendador.executar_ciclo()[0]
+	assert maquina.status == MachineStatus.PARADA
+	assert agendador.intervalo_para(maquina) == 5
+
+	# Voltou a produzir: aguarda a estabilidade com polling rápido
+	protocolo.valor = True
+	monitor.scan_machines([maquina])
+	assert maquina.status == MachineStatus.PARADA and monitor.is_em_recuperacao("T01")
+	assert agendador.intervalo_para(maquina) == 1
+
+	# Parou de novo antes de confirmar: a recuperação acabou
+	protocolo.valor = False
+	monitor.scan_machines([maquina])
+	assert not monitor.is_em_recuperacao("T01"), "recuperação ficou aberta após voltar a PARADA"
+	assert agendador.intervalo_para(maquina) == 5
+
+	# A próxima leitura PRODUZINDO abre uma janela nova
+	antes = time.time()
+	protocolo.valor = True
+	monitor.scan_machines([maquina])
+	assert monitor.estabilidade_recuperacao["T01"] >= antes
+
+	monitor.shutdown()
+	db.close()
@@ -0,0 +1,108 @@
+"""
+Confere o timeout de silêncio das máquinas em push (MQTT).
+
+	- publicador que para de publicar sem Last Will: a máquina vai a SEM REDE
+	  depois do timeout_silencio, em vez de ficar no último estado para sempre
+	- máquina que nunca publicou: SEM REDE depois do timeout, contado da assinatura
+	- nova publicação: a máquina volta ao estado publicado
+	- Last Will "offline": a máquina fica sem comunicação na hora
+
+	python -m pytest test_push_silencio.py
+"""
+import os
+import sys
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.application.services.monitor_service import MonitorService
+from src.domain.enums import CommunicationType, MachineStatus
+from src.domain.interfaces import ISubscriptionProtocol
+from src.infrastructure.database.connection import DatabaseConnection
+from src.infrastructure.database.repositories import MachineRepository, DowntimeRepository, EventRepository
+
+TIMEOUT = 0.3
+
+
+class PushManual(ISubscriptionProtocol) :
+	"""Subscription em que o teste publica chamando publicar()"""
+
+	def __init__(self) :
+		self.callback = None
+		self.maquinas = { }
+
+	def subscribe(self, machines, callback) :
+		self.callback = callback
+		self.maquinas.update({ m.api_id : m for m in machines })
+		return machines
+
+	def check_subscriptions(self) :
+		pass
+
+	def unsubscribe_all(self) :
+		pass
+
+	def timeout_silencio(self, machine) :
+		return machine.comunicacao.parametros.get("timeout_silencio", TIMEOUT)
+
+	def publicar(self, api_id, valor) :
+		self.callback(self.maquinas[api_id], valor, True)
+
+
+def test_publicador_silencioso_vai_a_sem_rede(tmp_path) :
+	config = os.path.join(tmp_path, "config.json")
+	with open(config, "w", encoding="utf-8") as f :
+		json.dump([{ "nome" : f"Tear {i}", "api_id" : f"T{i}", "ip" : "10.0.0.5", "protocolo" : "MQTT",
+			"node_id" : f"fabrica/T{i}/estado" } for i in (1, 2)]
+			+ [{ "nome" : "Tear 3", "api_id" : "T3", "ip" : "10.0.0.5", "protocolo" : "MQTT",
+			"node_id" : "fabrica/T3/estado", "timeout_silencio" : 60 }], f)
+
+	db = DatabaseConnection(os.path.join(tmp_path, "push.db"))
+	db.init_schema()
+	machine_repo = MachineRepository(config, os.path.join(tmp_path, "estado_atual.json"))
+	push = PushManual()
+	monitor = MonitorService(machine_repo, DowntimeRepository(db), EventRepository(db), { },
+		limite_falhas=1, tempo_estabilidade=0, subscription_protocols={ CommunicationType.MQTT.value : push })
+	assert len(monitor.iniciar_push()) == 3
+	t1, t2, t3 = (machine_repo.get_by_id(api_id) for api_id in ("T1", "T2", "T3"))
+
+	push.publicar("T1", True)
+	push.publicar("T3", True)
+	monitor.tick_push()
+	assert t1.status == MachineStatus.PRODUZINDO
+	assert t2.status == MachineStatus.DESCONHECIDO  # dentro do prazo, sem dado ainda
+
+	# Ninguém publica além do timeout: T1 (publicador morto) e T2 (nunca publicou) caem
+	time.sleep(TIMEOUT + 0.1)
+	monitor.tick_push()
+	assert t1.status == MachineStatus.SEM_REDE, t1.status
+	assert t2.status == MachineStatus.SEM_REDE, t2.status
+	assert t3.status == MachineStatus.PRODUZINDO  # timeout próprio (config.json)
+
+	# Publicou de novo: volta
+	push.publicar("T1", True)
+	monitor.tick_push()
+	assert t1.status == MachineStatus.PRODUZINDO
+
+	monitor.shutdown()
+	db.close()
+
+
+def test_last_will_offline() :
+	pytest.importorskip("paho.mqtt")
+	from src.infrastructure.communication.mqtt_subscriber import MQTTSubscriber, _Broker
+
+	recebidos = []
+	subscriber = MQTTSubscriber()
+	subscriber._callback = lambda maquina, valor, conectado : recebidos.append((maquina, valor, conectado))
+	maquina = SimpleNamespace(api_id="T1", comunicacao=SimpleNamespace(parametros={ }))
+	broker = _Broker("mqtt://10.0.0.5:1883", client=None)
+	broker.por_topico["fabrica/T1/estado"] = [maquina]
+
+	subscriber._on_message(broker, SimpleNamespace(topic="fabrica/T1/estado", payload=b"offline"))
+	subscriber._on_message(broker, SimpleNamespace(topic="fabrica/T1/estado", payload=b'{"running": true}'))
+	assert recebidos == [(maquina, None, False), (maquina, True, True)], recebidos
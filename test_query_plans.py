@@ -0,0 +1,174 @@
+"""
+Confere o EXPLAIN QUERY PLAN de cada consulta dos repositórios SQLite.
+
+Roda os métodos reais dos repositórios num banco temporário, captura o SQL
+executado e falha se alguma consulta fizer varredura completa de tabela ou
+deixar de usar o índice esperado. Rodar depois de mexer em consultas ou
+migrações:
+	python test_query_plans.py
+"""
+import os
+import re
+import sys
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.domain.models import Downtime, Event, Hierarquia, HistoryFilter
+from src.domain.enums import Turno
+from src.infrastructure.database.connection import DatabaseConnection
+from src.infrastructure.database.repositories import DowntimeRepository, EventRepository
+from src.infrastructure.database.metrics_rollup import DailyMetricsRepository
+
+AGORA = datetime(2025, 6, 15, 12, 0, 0)
+INICIO = AGORA - timedelta(days=30)
+TABELAS = ("historico_paradas", "eventos", "metricas_diarias")
+
+# Varredura completa: "SCAN tabela" sem índice (SQLite >= 3.36) ou "SCAN TABLE tabela" (versões antigas)
+RE_SCAN_COMPLETO = re.compile(r"^SCAN (TABLE )?(%s)\b(?!.*USING)" % "|".join(TABELAS))
+
+
+def popular(db) :
+	"""Frota pequena com histórico, paradas ativas, eventos e rollup"""
+	paradas = DowntimeRepository(db)
+	eventos = EventRepository(db)
+	lista_paradas = []
+	lista_eventos = []
+	for m in range(20) :
+		maquina = f"M{m:02d}"
+		for i in range(150) :
+			inicio = AGORA - timedelta(hours=i * 5 + m)
+			lista_paradas.append(Downtime(
+				uuid=str(uuid.uuid4()), equipamento=maquina, hierarquia=Hierarquia(),
+				data_inicial=inicio, data_final=inicio + timedelta(minutes=20 + i % 40),
+				minutos_parado=20 + i % 40, turno=Turno.T1
+			))
+			lista_eventos.append(Event(timestamp=inicio, maquina=maquina, status_anterior="PRODUZINDO", status_novo="PARADA"))
+		lista_paradas.append(Downtime(
+			uuid=f"ativa-{maquina}", equipamento=maquina, hierarquia=Hierarquia(),
+			data_inicial=AGORA - timedelta(minutes=m + 1), turno=Turno.T1
+		))
+	paradas.save_many(lista_paradas)
+	eventos.save_many(lista_eventos)
+
+
+def pagina(paradas, filtro) :
+	"""Primeira página e a seguinte (consulta com cursor)"""
+	_, cursor = paradas.fetch_page(filtro, ["equipamento", "data_inicial"], 20)
+	paradas.fetch_page(filtro, ["equipamento", "data_inicial"], 20, cursor)
+
+
+def consultas(db) :
+	"""(descrição, chamada, índices aceitos, pode ordenar em árvore temporária)"""
+	paradas = DowntimeRepository(db)
+	eventos = EventRepository(db)
+	metricas = DailyMetricsRepository(db)
+	return [
+		("DowntimeRepository.get_by_machine (período)", lambda : paradas.get_by_machine("M03", INICIO, AGORA),
+			("idx_paradas_equip_inicial_ts",), False),
+		("DowntimeRepository.get_by_machine", lambda : paradas.get_by_machine("M03"),
+			("idx_paradas_equip_inicial_ts",), False),
+		("DowntimeRepository.get_by_period", lambda : paradas.get_by_period(INICIO, AGORA),
+			("idx_paradas_inicial_ts",), False),
+		("DowntimeRepository.get_active_downtimes", lambda : paradas.get_active_downtimes(),
+			("idx_paradas_ativas",), False),
+		("DowntimeRepository.finalize_downtime", lambda : paradas.finalize_downtime("ativa-M05", AGORA),
+			("sqlite_autoindex_historico_paradas_1",), False),
+		("DowntimeRepository.fetch_page", lambda : pagina(paradas, HistoryFilter(data_inicio=INICIO, data_fim=AGORA, apenas_encerradas=True)),
+			("idx_paradas_inicial_ts",), False),
+		("DowntimeRepository.fetch_page (máquina)", lambda : pagina(paradas, HistoryFilter(equipamentos=["M03"], min_minutos=30)),
+			("idx_paradas_equip_inicial_ts",), False),
+		("DowntimeRepository.fetch_by_uuids", lambda : list(paradas.fetch_by_uuids(["ativa-M03", "ativa-M07"], ["equipamento", "data_final"])),
+			("sqlite_autoindex_historico_paradas_1",), False),
+		("DowntimeRepository.count_history", lambda : paradas.count_history(HistoryFilter(data_inicio=INICIO, data_fim=AGORA)),
+			("idx_paradas_inicial_ts",), False),
+		("EventRepository.get_recent", lambda : eventos.get_recent(50),
+			("idx_eventos_ts",), False),
+		("EventRepository.get_recent (máquina)", lambda : eventos.get_recent(50, maquina="M03"),
+			("idx_eventos_maquina_ts",), False),
+		("DailyMetricsRepository.get_totais", lambda : metricas.get_totais(INICIO.date(), AGORA.date()),
+			("idx_metricas_data_cobertura",), False),
+		("DailyMetricsRepository.get_totais (máquina)", lambda : metricas.get_totais(INICIO.date(), AGORA.date(), "M03"),
+			("sqlite_autoindex_metricas_diarias_1", "idx_metricas_data_cobertura"), False),
+		("DailyMetricsRepository.get_por_equipamento", lambda : metricas.get_por_equipamento(INICIO.date(), AGORA.date(), 10),
+			("idx_metricas_data_cobertura",), True),
+	]
+
+
+def capturar_sql(db, chamada) :
+	"""SQL (com os parâmetros já expandidos) executado pela chamada, nas conexões de leitura e escrita"""
+	capturados = []
+	def registrar(sql) :
+		comando = sql.strip()
+		if comando.split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE") and any(t in comando for t in TABELAS) :
+			capturados.append(comando)
+	conexoes = (db.connect(), db.reader())
+	for conn in conexoes :
+		conn.set_trace_callback(registrar)
+	try :
+		chamada()
+	finally :
+		for conn in conexoes :
+			conn.set_trace_callback(None)
+	return list(dict.fromkeys(capturados))
+
+
+def verificar(db, rotulo) :
+	falhas = []
+	for descricao, chamada, indices, pode_ordenar in consultas(db) :
+		comandos = capturar_sql(db, chamada)
+		if not comandos :
+			falhas.append(f"{descricao}: nenhuma consulta capturada")
+			continue
+
+		planos = []
+		for sql in comandos :
+			planos.extend(row[3] for row in db.connect().execute("EXPLAIN QUERY PLAN " + sql))
+
+		problemas = [p for p in planos if RE_SCAN_COMPLETO.search(p)]
+		if not any(indice in p for p in planos for indice in indices) :
+			problemas.append(f"índice esperado {' ou '.join(indices)} não usado")
+		if not pode_ordenar and any("TEMP B-TREE" in p for p in planos) :
+			problemas.append("ordenação em árvore temporária")
+
+		if problemas :
+			falhas.append(f"{descricao}: {'; '.join(problemas)} | plano: {planos}")
+			print(f"❌ [{rotulo}] {descricao}")
+		else :
+			print(f"✅ [{rotulo}] {descricao}: {' / '.join(planos)}")
+	return falhas
+
+
+def executar() :
+	"""Confere os planos sem estatísticas (banco recém-migrado) e depois do ANALYZE"""
+	pasta = tempfile.mkdtemp(prefix="planos_")
+	try :
+		db = DatabaseConnection(os.path.join(pasta, "planos.db"))
+		db.init_schema()
+		popular(db)
+
+		falhas = verificar(db, "sem estatísticas")
+		db.execute_query("ANALYZE")
+		falhas += verificar(db, "com ANALYZE")
+		db.close()
+		return falhas
+	finally :
+		shutil.rmtree(pasta, ignore_errors=True)
+
+
+def test_planos_de_consulta() :
+	falhas = executar()
+	assert not falhas, "\n".join(falhas)
+
+
+if __name__ == "__main__" :
+	falhas = executar()
+	if falhas :
+		print("\n❌ Consultas com plano inesperado:")
+		for falha in falhas :
+			print(f"  - {falha}")
+		sys.exit(1)
+	print("\n✅ Todos os planos usam os índices esperados")
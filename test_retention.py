@@ -0,0 +1,69 @@
+"""
+Confere o arquivamento em Parquet interrompido no meio da gravação.
+
+	- o temporário que ficou na partição não quebra a leitura do arquivo
+	  (as linhas continuam no banco quente)
+	- o próximo arquivamento remove o temporário e arquiva as linhas
+
+	python -m pytest test_retention.py
+"""
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip("pyarrow")
+from src.domain.models import Downtime, Hierarquia
+from src.domain.enums import Turno
+from src.infrastructure.database import retention
+from src.infrastructure.database.connection import DatabaseConnection
+from src.infrastructure.database.repositories import DowntimeRepository
+from src.infrastructure.database.retention import ArchiveManager, RetentionPolicy
+
+AGORA = datetime(2025, 6, 15, 12, 0, 0)
+
+
+def temporarios(pasta) :
+	return [nome for _, _, arquivos in os.walk(pasta) for nome in arquivos if nome.endswith(".tmp")]
+
+
+def test_gravacao_interrompida_nao_quebra_a_leitura(tmp_path, monkeypatch) :
+	db = DatabaseConnection(os.path.join(tmp_path, "retencao.db"))
+	db.init_schema()
+	paradas = DowntimeRepository(db)
+	inicio = AGORA - timedelta(days=400)
+	paradas.save_many([Downtime(
+		uuid=str(uuid.uuid4()), equipamento="Tear 01", hierarquia=Hierarquia(),
+		data_inicial=inicio + timedelta(hours=i), data_final=inicio + timedelta(hours=i, minutes=10),
+		minutos_parado=10, turno=Turno.T1
+	) for i in range(5)])
+	paradas.flush()
+
+	arquivo = ArchiveManager(db, RetentionPolicy(pasta=os.path.join(tmp_path, "arquivo"), formato="parquet", compactacao=None))
+
+	# Gravação interrompida (disco cheio, processo morto): temporário pela metade na partição
+	def gravar_pela_metade(tabela, destino, **kwargs) :
+		with open(destino, "wb") as f :
+			f.write(b"PAR1\x00\x00")
+		raise OSError("disco cheio")
+	with monkeypatch.context() as m :
+		m.setattr(retention.pq, "write_table", gravar_pela_metade)
+		with pytest.raises(OSError) :
+			arquivo.arquivar(AGORA)
+	assert temporarios(arquivo.politica.pasta)
+	assert arquivo.meses_arquivados("historico_paradas") == []
+
+	fim = inicio + timedelta(days=1)
+	assert len(arquivo.ler_paradas(inicio, fim)) == 5, "temporário quebrou a leitura"
+	assert len(arquivo.ler_paradas(inicio, fim, apenas_arquivo=True)) == 0
+
+	# Próxima execução limpa o temporário e arquiva
+	assert arquivo.arquivar(AGORA)["historico_paradas"] == 5
+	assert not temporarios(arquivo.politica.pasta)
+	assert len(arquivo.ler_paradas(inicio, fim, apenas_arquivo=True)) == 5
+
+	db.close()
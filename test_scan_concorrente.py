@@ -0,0 +1,63 @@
+"""
+Confere o scan concorrente com todas as threads presas em leituras bloqueantes.
+
+	- sem orçamento de ciclo, as máquinas que esperam uma thread livre estouram
+	  o timeout_maquina em vez de travar o ciclo
+	- a espera conta como timeout da coleta (passa pelo debounce como SEM_REDE)
+
+	python -m pytest test_scan_concorrente.py
+"""
+import os
+import sys
+import json
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.application.services.monitor_service import MonitorService
+from src.domain.enums import CommunicationType
+from src.domain.interfaces import ICommunicationProtocol
+from src.infrastructure.database.connection import DatabaseConnection
+from src.infrastructure.database.repositories import MachineRepository, DowntimeRepository, EventRepository
+
+
+class ProtocoloTravado(ICommunicationProtocol) :
+	"""check_connection bloqueia até o teste liberar"""
+
+	def __init__(self) :
+		self.liberar = threading.Event()
+
+	def read_value(self, machine, tag) :
+		return True
+
+	def write_value(self, machine, tag, value) :
+		return False
+
+	def check_connection(self, machine) :
+		self.liberar.wait(10)
+		return True
+
+
+def test_fila_de_threads_respeita_timeout_maquina(tmp_path) :
+	config = tmp_path / "config.json"
+	config.write_text(json.dumps([{ "nome" : f"Tear {i:02d}", "api_id" : f"T{i:02d}", "ip" : f"10.0.0.{i}",
+		"node_id" : "ns=2;s=running" } for i in range(1, 4)]), encoding="utf-8")
+
+	db = DatabaseConnection(str(tmp_path / "scan.db"))
+	db.init_schema()
+	machine_repo = MachineRepository(str(config), str(tmp_path / "estado_atual.json"))
+	protocolo = ProtocoloTravado()
+	monitor = MonitorService(machine_repo, DowntimeRepository(db), EventRepository(db),
+		{ CommunicationType.OPC_UA.value : protocolo },
+		scan_concorrente=True, max_concorrencia=1, timeout_maquina=0.3, orcamento_ciclo=None)
+
+	try :
+		inicio = time.monotonic()
+		monitor.scan_machines()
+		assert time.monotonic() - inicio < 2, "ciclo ficou esperando uma thread livre"
+		assert monitor.ultimo_ciclo["timeouts"] == 3
+	finally :
+		protocolo.liberar.set()
+		monitor.shutdown()
+		db.close()
@@ -0,0 +1,110 @@
+"""
+Confere o scanner multi-processo com um worker que morre no meio de uma parada.
+
+	- o worker reiniciado parte do estado atual do shard (não do estado da
+	  primeira partida)
+	- a parada em aberto continua: quando a máquina volta a produzir, a parada
+	  é gravada com o início registrado pelo worker que morreu
+
+	python -m pytest test_sharded_scanner.py
+"""
+import os
+import sys
+import json
+import time
+import functools
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.application.services.sharded_scanner import ShardedScanCoordinator, shard_for
+from src.domain.enums import CommunicationType, MachineStatus
+from src.domain.interfaces import ICommunicationProtocol
+from src.infrastructure.database.connection import DatabaseConnection
+from src.infrastructure.database.repositories import MachineRepository, DowntimeRepository, EventRepository
+
+
+class ProtocoloArquivo(ICommunicationProtocol) :
+	"""Valor de running lido de um JSON {api_id: valor} (o teste troca de outro processo)"""
+
+	def __init__(self, caminho) :
+		self.caminho = caminho
+
+	def read_value(self, machine, tag) :
+		with open(self.caminho, encoding="utf-8") as f :
+			return json.load(f).get(machine.api_id)
+
+	def write_value(self, machine, tag, value) :
+		return False
+
+	def check_connection(self, machine) :
+		return True
+
+
+def criar_protocolos(caminho) :
+	return { CommunicationType.OPC_UA.value : ProtocoloArquivo(caminho) }
+
+
+def definir_valores(caminho, valores) :
+	temporario = caminho + ".tmp"
+	with open(temporario, "w", encoding="utf-8") as f :
+		json.dump(valores, f)
+	os.replace(temporario, caminho)
+
+
+def aguardar(coordenador, condicao, timeout=30.0) :
+	limite = time.monotonic() + timeout
+	while time.monotonic() < limite :
+		coordenador.processar_atualizacoes(timeout=0.2)
+		coordenador.verificar_workers()
+		if condicao() :
+			return
+	raise AssertionError("tempo esgotado aguardando o coordenador")
+
+
+def test_worker_reiniciado_continua_a_parada(tmp_path) :
+	config = os.path.join(tmp_path, "config.json")
+	with open(config, "w", encoding="utf-8") as f :
+		json.dump([{ "nome" : f"Tear {i:02d}", "api_id" : f"T{i:02d}", "ip" : f"10.0.0.{i}", "node_id" : "ns=2;s=running" }
+			for i in range(1, 5)], f)
+	valores = os.path.join(tmp_path, "valores.json")
+	definir_valores(valores, { f"T{i:02d}" : True for i in range(1, 5) })
+
+	db = DatabaseConnection(os.path.join(tmp_path, "shard.db"))
+	db.init_schema()
+	machine_repo = MachineRepository(config, os.path.join(tmp_path, "estado_atual.json"))
+	downtime_repo = DowntimeRepository(db)
+	coordenador = ShardedScanCoordinator(
+		machine_repo, downtime_repo, EventRepository(db),
+		fabrica_protocolos=functools.partial(criar_protocolos, valores),
+		num_workers=2,
+		intervalo_scan=0.2,
+		opcoes_monitor={ "tempo_estabilidade" : 0 }
+	)
+	t01 = machine_repo.get_by_id("T01")
+	try :
+		coordenador.iniciar()
+		aguardar(coordenador, lambda : all(m.status == MachineStatus.PRODUZINDO for m in machine_repo.get_all()))
+
+		# T01 para; o worker do shard dela morre com a parada em aberto
+		definir_valores(valores, { f"T{i:02d}" : i != 1 for i in range(1, 5) })
+		aguardar(coordenador, lambda : t01.status == MachineStatus.PARADA and "T01" in coordenador._inicio_paradas)
+		inicio_parada = coordenador._inicio_paradas["T01"]
+
+		indice = shard_for(t01, coordenador.num_workers)
+		coordenador._workers[indice].kill()
+		coordenador._workers[indice].join()
+		coordenador.verificar_workers()
+		assert coordenador._workers[indice].is_alive()
+
+		# Volta a produzir no worker novo: a parada é gravada desde o início original
+		time.sleep(0.5)
+		definir_valores(valores, { f"T{i:02d}" : True for i in range(1, 5) })
+		aguardar(coordenador, lambda : t01.status == MachineStatus.PRODUZINDO)
+		downtime_repo.flush()
+		paradas = downtime_repo.get_by_machine("Tear 01")
+		assert len(paradas) == 1, f"{len(paradas)} parada(s) gravada(s) após reiniciar o worker"
+		assert abs(paradas[0].data_inicial.timestamp() - inicio_parada) < 1
+		assert "T01" not in coordenador._inicio_paradas
+	finally :
+		coordenador.encerrar()
+		db.close()
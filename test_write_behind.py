@@ -0,0 +1,110 @@
+"""
+Confere a fila write-behind com escritas que falham.
+
+	- erro permanente (uuid duplicado): só a parada com erro é rejeitada, as
+	  outras escritas do mesmo lote e as seguintes são gravadas
+	- banco ocupado por outro processo: nada se perde, tudo é gravado quando
+	  o lock é liberado
+	- fila limitada: com o banco ocupado, a fila não passa de max_pendentes
+
+	python -m pytest test_write_behind.py
+"""
+import os
+import sys
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.domain.models import Downtime, Event, Hierarquia
+from src.domain.enums import Turno
+from src.infrastructure.database.connection import DatabaseConnection
+from src.infrastructure.database.repositories import DowntimeRepository, EventRepository
+from src.infrastructure.database.write_behind import WriteBehindQueue
+
+AGORA = datetime(2025, 6, 15, 12, 0, 0)
+
+
+def parada(uuid, minutos=10) :
+	inicio = AGORA - timedelta(minutes=minutos)
+	return Downtime(uuid=uuid, equipamento="M01", hierarquia=Hierarquia(), data_inicial=inicio,
+		data_final=AGORA, minutos_parado=minutos, turno=Turno.T1)
+
+
+def evento(i) :
+	return Event(timestamp=AGORA + timedelta(seconds=i), maquina="M01", status_anterior="PRODUZINDO", status_novo="PARADA")
+
+
+def banco(pasta) :
+	# busy_timeout=0: o lock do outro processo falha na hora em vez de esperar
+	db = DatabaseConnection(os.path.join(pasta, "fila.db"), pragmas={"busy_timeout" : 0})
+	db.init_schema()
+	return db
+
+
+def contar(db, tabela) :
+	return db.fetch_one(f"SELECT COUNT(*) FROM {tabela}")[0]
+
+
+def test_erro_permanente_nao_trava_a_fila(tmp_path) :
+	db = banco(tmp_path)
+	rejeitados = os.path.join(tmp_path, "rejeitados.jsonl")
+	fila = WriteBehindQueue(db, intervalo_flush=None, arquivo_rejeitados=rejeitados)
+	paradas = DowntimeRepository(db, write_behind=fila)
+	eventos = EventRepository(db, write_behind=fila)
+
+	paradas.save(parada("p1"))
+	paradas.flush()
+	for i in range(8) :
+		eventos.save(evento(i))
+	paradas.save(parada("p1", 30))  # uuid duplicado
+	paradas.save(parada("p2"))
+	for i in range(8, 16) :
+		eventos.save(evento(i))
+	fila.flush()
+
+	assert fila.pending() == 0, f"{fila.pending()} escrita(s) presas na fila"
+	assert contar(db, "eventos") == 16
+	assert contar(db, "historico_paradas") == 2
+	# O rollup da parada rejeitada não é somado (mesmo grupo do INSERT)
+	assert db.fetch_one("SELECT SUM(numero_paradas) FROM metricas_diarias")[0] == 2
+	assert len(fila.rejeitados) == 1 and "UNIQUE" in fila.rejeitados[0][1]
+	with open(rejeitados, encoding="utf-8") as f :
+		linhas = [json.loads(linha) for linha in f]
+	assert len(linhas) == 1 and linhas[0]["comandos"][0]["params"][0] == "p1"
+
+	# As escritas seguintes continuam sendo gravadas
+	eventos.save(evento(99))
+	fila.flush()
+	assert contar(db, "eventos") == 17
+	fila.close()
+	db.close()
+
+
+def test_banco_ocupado_e_fila_limitada(tmp_path) :
+	db = banco(tmp_path)
+	fila = WriteBehindQueue(db, max_itens=10, intervalo_flush=None, max_pendentes=50)
+	eventos = EventRepository(db, write_behind=fila)
+
+	outro = sqlite3.connect(db.db_name, isolation_level=None)
+	outro.execute("BEGIN EXCLUSIVE")
+	try :
+		for i in range(200) :
+			eventos.save(evento(i))
+		assert fila.pending() <= 50, f"fila sem limite: {fila.pending()}"
+		assert fila.estatisticas["descartados_por_limite"] == 200 - fila.pending()
+		assert fila.estatisticas["gravados"] == 0
+	finally :
+		outro.execute("ROLLBACK")
+		outro.close()
+
+	pendentes = fila.pending()
+	fila.flush()
+	assert fila.pending() == 0
+	assert contar(db, "eventos") == pendentes
+	# Os descartados pelo limite são os mais antigos: ficam os últimos eventos
+	ultimo = db.fetch_one("SELECT MAX(timestamp_ts) - MIN(timestamp_ts) FROM eventos")[0]
+	assert ultimo == pendentes - 1
+	fila.close()
+	db.close()